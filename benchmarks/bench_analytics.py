@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+'''Compare loading numeric responses into NumPy arrays through the ORM and
+with datums.analytics.load_series.
+
+Fills the tables with --rows numeric responses to ten questions (see
+bench_indexes.py), then loads every response as a time series, once by
+walking the reports and their responses from models.iter_reports, and once
+with load_series. DATABASE_URI should point to a scratch database that has
+been set up; the rows are deleted afterwards.
+
+    $ python benchmarks/bench_analytics.py --rows 1000000
+'''
+
+import argparse
+import time
+import numpy
+from datums import analytics, models
+
+import bench_indexes
+
+
+def orm(prompts):
+    '''Build the arrays from Report and Response instances.
+    '''
+    question_ids = dict(models.session.query(
+        models.Question.id, models.Question.prompt).filter(
+            models.Question.prompt.in_(prompts)))
+    timestamps, values = [], dict((prompt, []) for prompt in prompts)
+    for report in models.iter_reports(include=['responses']):
+        timestamps.append(report.created_at)
+        answered = dict((question_ids[response.question_id],
+                         response.numeric_response)
+                        for response in report.responses
+                        if response.question_id in question_ids)
+        for prompt in prompts:
+            values[prompt].append(answered.get(prompt))
+    models.session.expunge_all()
+    return numpy.array(timestamps, dtype='datetime64[us]'), dict(
+        (prompt, numpy.array(values[prompt], dtype=numpy.float64))
+        for prompt in prompts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    args = parser.parse_args()
+
+    question_ids = bench_indexes.seed(args.rows)
+    prompts = ['bench_indexes question {0}'.format(i)
+               for i in xrange(len(question_ids))]
+    try:
+        print '{0:<12} {1:>9} {2:>12}'.format('loader', 'seconds', 'rows/s')
+        results = []
+        for label, load in [('orm', orm), ('load_series', lambda prompts:
+                            analytics.load_series(prompts=prompts))]:
+            start = time.time()
+            results.append(load(prompts))
+            seconds = time.time() - start
+            print '{0:<12} {1:>9.2f} {2:>12.0f}'.format(
+                label, seconds, args.rows / seconds)
+        (orm_timestamps, orm_values), (timestamps, values) = results
+        numpy.testing.assert_array_equal(orm_timestamps, timestamps)
+        for prompt in prompts:
+            numpy.testing.assert_array_equal(orm_values[prompt],
+                                             values[prompt])
+    finally:
+        bench_indexes.cleanup(args.rows, question_ids)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+'''Compare the time it takes datums --add to load synthetic Reporter exports
+one snapshot at a time, with --bulk, and with --copy.
+
+The exports are written by benchmarks/synthetic.py; the default is 100,000
+snapshots. Every loader starts from an empty set of reports, and the reports
+it added are deleted before the next loader runs. DATABASE_URI should point
+to a scratch PostgreSQL database. The one-at-a-time path is by far the
+slowest, so leave it out with --loaders for quick runs.
+
+    $ python benchmarks/bench_copy.py --days 1000 --snapshots-per-day 100
+    $ python benchmarks/bench_copy.py --days 50 --loaders bulk copy
+'''
+
+import argparse
+import imp
+import os
+import shutil
+import tempfile
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+import bench_load
+import synthetic
+
+
+_loaders = {'orm': [], 'bulk': ['--bulk'], 'copy': ['--copy']}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=1000)
+    parser.add_argument('--snapshots-per-day', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=5000,
+                        help='Snapshots per INSERT or COPY batch')
+    parser.add_argument('--loaders', nargs='+', choices=sorted(_loaders),
+                        default=['orm', 'bulk', 'copy'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    cli = imp.load_source('datums_cli', bench_load._datums)
+    from datums import models
+    counter = bench_load.StatementCounter()
+    event.listen(Engine, 'before_cursor_execute', counter)
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = synthetic.write_exports(
+            directory, args.days, args.snapshots_per_day, seed=args.seed)
+        pattern = os.path.join(directory, '*.json')
+        snapshots = len(paths) * args.snapshots_per_day
+        print '{0} files, {1} snapshots, {2:.1f} MB'.format(
+            len(paths), snapshots, sum(os.path.getsize(p)
+                                       for p in paths) / 1024.0 / 1024.0)
+        bench_load.run(cli, counter, ['--setup'])
+        print '{0:<8} {1:>9} {2:>12} {3:>10} {4:>12} {5:>10}'.format(
+            'loader', 'seconds', 'snapshots/s', 'rows', 'rows/s', 'queries')
+        for loader in args.loaders:
+            options = list(_loaders[loader])
+            if loader != 'orm':
+                options += ['--batch-size', str(args.batch_size)]
+            before = bench_load.count_rows(models)
+            seconds, queries = bench_load.run(
+                cli, counter, ['--add', pattern, '--force'] + options)
+            rows = bench_load.count_rows(models) - before
+            print '{0:<8} {1:>9.2f} {2:>12.0f} {3:>10} {4:>12.0f} ' \
+                '{5:>10}'.format(loader, seconds, snapshots / seconds, rows,
+                                 rows / seconds, queries)
+            bench_load.run(cli, counter, ['--delete', pattern])
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+'''Compare the latency of the pipeline's lookups with and without the indexes
+on the lookup columns.
+
+Fills the tables with --rows responses (and a tenth as many reports, each
+with an altitude report) using INSERT ... SELECT, then times --lookups of
+each kind of query the pipeline makes. The indexes are then dropped inside
+a transaction, the lookups are timed again, and the transaction is rolled
+back. DATABASE_URI should point to a scratch database that has been set up;
+the rows are deleted afterwards.
+
+    $ python benchmarks/bench_indexes.py --rows 1000000
+'''
+
+import argparse
+import random
+import time
+import uuid
+from sqlalchemy import text
+from datums import models
+
+
+_questions = 10
+
+_indexes = ['ix_questions_prompt', 'ix_responses_report_id_question_id',
+            'ix_reports_created_at', 'ix_altitude_reports_report_id']
+
+
+def _report_id(i):
+    return uuid.UUID(int=i + 1)
+
+
+def seed(rows):
+    '''Insert the questions, reports, altitude reports, and responses, and
+    return the ids of the questions.
+    '''
+    reports = rows // _questions
+    question_ids = [models.Question.get_or_create(
+        type=5, prompt='bench_indexes question {0}'.format(i)).id
+        for i in xrange(_questions)]
+    session = models.session
+    session.execute(text('''
+        INSERT INTO reports (id, created_at, steps)
+        SELECT lpad(to_hex(i + 1), 32, '0')::uuid,
+               timestamp '2015-01-01' + i * interval '1 hour', i
+        FROM generate_series(0, :reports - 1) AS i'''), {'reports': reports})
+    session.execute(text('''
+        INSERT INTO altitude_reports (id, report_id, floors_ascended)
+        SELECT md5(i::text)::uuid, lpad(to_hex(i + 1), 32, '0')::uuid, 1
+        FROM generate_series(0, :reports - 1) AS i'''), {'reports': reports})
+    session.execute(text('''
+        INSERT INTO responses (report_id, question_id, type, numeric_response)
+        SELECT lpad(to_hex(i + 1), 32, '0')::uuid, q, 'numeric', 1
+        FROM generate_series(0, :reports - 1) AS i,
+             unnest(CAST(:questions AS integer[])) AS q'''),
+        {'reports': reports, 'questions': question_ids})
+    session.commit()
+    session.execute('ANALYZE')
+    return question_ids
+
+
+def cleanup(rows, question_ids):
+    '''Delete the rows inserted by seed().
+    '''
+    models.session.rollback()
+    models.Report.delete_many(
+        _report_id(i) for i in xrange(rows // _questions))
+    models.session.query(models.Question).filter(
+        models.Question.id.in_(question_ids)).delete(
+            synchronize_session=False)
+    models.session.commit()
+
+
+def lookups(reports, question_ids, n, rng):
+    '''Return the mean milliseconds per lookup of each kind.
+    '''
+    session = models.session
+    queries = [
+        ('question by prompt', lambda: session.query(models.Question).filter(
+            models.Question.prompt == 'bench_indexes question {0}'.format(
+                rng.randrange(_questions))).first()),
+        ('response by report and question', lambda: session.query(
+            models.Response).filter_by(
+                report_id=_report_id(rng.randrange(reports)),
+                question_id=rng.choice(question_ids)).first()),
+        ('altitude report by report', lambda: session.query(
+            models.AltitudeReport).filter_by(
+                report_id=_report_id(rng.randrange(reports))).first()),
+        ('reports in a day', lambda: session.query(models.Report).filter(
+            models.Report.created_at.between(
+                '2015-01-01', '2015-01-02')).all())]
+    results = []
+    for label, query in queries:
+        start = time.time()
+        for _ in xrange(n):
+            query()
+            session.expunge_all()
+        results.append((label, (time.time() - start) * 1000 / n))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    reports = args.rows // _questions
+    question_ids = seed(args.rows)
+    try:
+        indexed = lookups(reports, question_ids, args.lookups,
+                          random.Random(args.seed))
+        # DDL is transactional in PostgreSQL, so the rollback restores them
+        for index in _indexes:
+            models.session.execute('DROP INDEX {0}'.format(index))
+        unindexed = lookups(reports, question_ids, max(args.lookups // 20, 1),
+                            random.Random(args.seed))
+        models.session.rollback()
+        print '{0:<32} {1:>14} {2:>14}'.format(
+            'lookup ({0} rows)'.format(args.rows), 'indexed ms',
+            'unindexed ms')
+        for (label, with_index), (_, without_index) in zip(
+                indexed, unindexed):
+            print '{0:<32} {1:>14.3f} {2:>14.3f}'.format(
+                label, with_index, without_index)
+    finally:
+        cleanup(args.rows, question_ids)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+'''Load synthetic Reporter exports through bin/datums and report throughput
+for add, update, and delete.
+
+The exports are written by benchmarks/synthetic.py. bin/datums runs in this
+process so that every query can be counted; with --workers, the queries made
+in worker processes aren't counted. DATABASE_URI should point to a scratch
+database: the benchmark sets it up and deletes the reports it added, but
+leaves the synthetic questions behind.
+
+    $ python benchmarks/bench_load.py --days 30 --snapshots-per-day 12
+    $ python benchmarks/bench_load.py --add-args="--bulk"
+'''
+
+import argparse
+import contextlib
+import imp
+import os
+import shlex
+import shutil
+import sys
+import tempfile
+import time
+import warnings
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+import synthetic
+
+
+_datums = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin',
+    'datums')
+
+
+class StatementCounter(object):
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+@contextlib.contextmanager
+def quiet():
+    '''Hide the output and warnings of bin/datums.
+    '''
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            yield
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+
+
+def count_rows(models):
+    return sum(models.session.query(func.count()).select_from(table).scalar()
+               for table in models.base.metadata.sorted_tables)
+
+
+def run(cli, counter, argv):
+    '''Run bin/datums with argv and return the elapsed time and the number of
+    queries it made.
+    '''
+    sys.argv = ['datums'] + argv
+    queries = counter.count
+    start = time.time()
+    with quiet():
+        cli.main()
+    return time.time() - start, counter.count - queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--snapshots-per-day', type=int, default=12)
+    parser.add_argument('--changed', type=float, default=0.1,
+                        help='Fraction of snapshots to change before updating')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--add-args', default='',
+                        help='Extra options for datums --add')
+    parser.add_argument('--update-args', default='',
+                        help='Extra options for datums --update')
+    parser.add_argument('--delete-args', default='',
+                        help='Extra options for datums --delete')
+    args = parser.parse_args()
+
+    cli = imp.load_source('datums_cli', _datums)
+    from datums import models
+    counter = StatementCounter()
+    event.listen(Engine, 'before_cursor_execute', counter)
+
+    directory = tempfile.mkdtemp()
+    try:
+        paths = synthetic.write_exports(
+            directory, args.days, args.snapshots_per_day, seed=args.seed)
+        pattern = os.path.join(directory, '*.json')
+        snapshots = len(paths) * args.snapshots_per_day
+        print '{0} files, {1} snapshots, {2:.1f} MB'.format(
+            len(paths), snapshots, sum(os.path.getsize(p)
+                                       for p in paths) / 1024.0 / 1024.0)
+        run(cli, counter, ['--setup'])
+        print '{0:<8} {1:>9} {2:>12} {3:>10} {4:>12} {5:>18}'.format(
+            'action', 'seconds', 'snapshots/s', 'rows', 'rows/s',
+            'queries/snapshot')
+
+        def report(action, seconds, queries, rows):
+            print '{0:<8} {1:>9.2f} {2:>12.0f} {3:>10} {4:>12.0f} ' \
+                '{5:>18.1f}'.format(action, seconds, snapshots / seconds,
+                                    rows, rows / seconds,
+                                    queries / float(snapshots))
+
+        before = count_rows(models)
+        seconds, queries = run(
+            cli, counter, ['--add', pattern] + shlex.split(args.add_args))
+        added = count_rows(models) - before
+        report('add', seconds, queries, added)
+
+        changed = sum(synthetic.mutate(path, args.changed, args.seed + i)
+                      for i, path in enumerate(paths))
+        seconds, queries = run(cli, counter, ['--update', pattern] +
+                               shlex.split(args.update_args))
+        # Roughly one report and its responses are rewritten per snapshot
+        report('update', seconds, queries,
+               changed * added // max(snapshots, 1))
+
+        before = count_rows(models)
+        seconds, queries = run(cli, counter, ['--delete', pattern] +
+                               shlex.split(args.delete_args))
+        report('delete', seconds, queries, before - count_rows(models))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+'''Compare peak memory and throughput of json.load against the streaming
+reader in datums.pipeline.reader.
+
+Each mode runs in its own process so that peak RSS is measured independently.
+
+    $ python benchmarks/bench_reader.py --snapshots 200000
+'''
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+
+def write_export(path, n):
+    '''Write a Reporter-like export file with n snapshots to path.
+    '''
+    with open(path, 'w') as f:
+        f.write('{"questions": [{"questionType": 5, '
+                '"prompt": "How anxious are you?"}], "snapshots": [')
+        for i in xrange(n):
+            if i:
+                f.write(', ')
+            json.dump({
+                'uniqueIdentifier': str(uuid.uuid4()).upper(),
+                'date': '2016-01-01T10:46:47-0500', 'battery': 0.89,
+                'connection': 0, 'steps': i, 'draft': False,
+                'audio': {'uniqueIdentifier': str(uuid.uuid4()).upper(),
+                          'avg': -59.8, 'peak': -57},
+                'location': {'uniqueIdentifier': str(uuid.uuid4()).upper(),
+                             'latitude': 40.8, 'longitude': -73.9,
+                             'timestamp': '2016-01-01T10:46:40-0500',
+                             'placemark': {'country': 'United States',
+                                           'locality': 'New York'}},
+                'responses': [{'questionPrompt': 'How anxious are you?',
+                               'numericResponse': str(i % 10)}]}, f)
+        f.write(']}')
+
+
+def run(mode, path):
+    '''Iterate over every snapshot in path using mode, and print the elapsed
+    time, number of snapshots, and peak RSS as JSON.
+    '''
+    start = time.time()
+    if mode == 'json.load':
+        with open(path, 'r') as f:
+            snapshots = json.load(f)['snapshots']
+        count = sum(1 for _ in snapshots)
+    else:
+        from datums.pipeline import reader
+        count = sum(1 for _ in reader.iter_snapshots(path))
+    elapsed = time.time() - start
+    # ru_maxrss is in kilobytes on Linux and bytes on OS X
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        maxrss //= 1024
+    print json.dumps({'mode': mode, 'snapshots': count,
+                      'seconds': elapsed, 'maxrss_kb': maxrss})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--snapshots', type=int, default=100000)
+    parser.add_argument('--file', help='Use an existing export file')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        return run(args.run, args.file)
+
+    path = args.file
+    if path is None:
+        path = tempfile.mkstemp(suffix='.json')[1]
+        write_export(path, args.snapshots)
+    try:
+        size = os.path.getsize(path) / 1024.0 / 1024.0
+        print '{0}: {1:.1f} MB'.format(path, size)
+        print '{0:<10} {1:>10} {2:>9} {3:>13} {4:>12}'.format(
+            'mode', 'snapshots', 'seconds', 'snapshots/s', 'peak RSS MB')
+        for mode in ('json.load', 'reader'):
+            result = json.loads(subprocess.check_output(
+                [sys.executable, __file__, '--run', mode, '--file', path]))
+            print '{0:<10} {1:>10} {2:>9.2f} {3:>13.0f} {4:>12.1f}'.format(
+                mode, result['snapshots'], result['seconds'],
+                result['snapshots'] / result['seconds'],
+                result['maxrss_kb'] / 1024.0)
+    finally:
+        if args.file is None:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
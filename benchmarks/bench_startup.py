@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+'''Time datums --version against a bare Python interpreter, and fail if it
+takes longer than the budget.
+
+Each command is run --repeat times in a fresh process, and the median is
+reported. DATABASE_URI is unset for datums --version, which must not need
+it.
+
+    $ python benchmarks/bench_startup.py --budget 0.1
+'''
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+_datums = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bin',
+    'datums')
+
+
+def median_time(command, repeat, env=None):
+    times = []
+    for _ in xrange(repeat):
+        start = time.time()
+        subprocess.check_call(command, env=env, stdout=open(os.devnull, 'w'))
+        times.append(time.time() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=11)
+    parser.add_argument('--budget', type=float, default=0.1,
+                        help='Maximum seconds for datums --version over a '
+                             'bare interpreter')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.pop('DATABASE_URI', None)
+    commands = [
+        ('python', [sys.executable, '-c', 'pass']),
+        ('datums --version', [sys.executable, _datums, '--version']),
+        ('import pipeline', [sys.executable, '-c',
+                             'from datums import pipeline'])]
+    print '{0:<18} {1:>9}'.format('command', 'seconds')
+    times = {}
+    for label, command in commands:
+        times[label] = median_time(command, args.repeat, env)
+        print '{0:<18} {1:>9.3f}'.format(label, times[label])
+    overhead = times['datums --version'] - times['python']
+    print 'datums --version overhead: {0:.3f}s (budget {1:.3f}s)'.format(
+        overhead, args.budget)
+    if overhead > args.budget:
+        sys.exit('datums --version is over budget')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+'''Compare dateutil.parser.parse against mappers.parse_timestamp on a year of
+Reporter date and timestamp strings.
+
+    $ python benchmarks/bench_timestamps.py --snapshots-per-day 12
+'''
+
+import argparse
+import datetime
+import random
+import time
+from dateutil.parser import parse
+from datums.pipeline import mappers
+
+
+def timestamps(days, per_day):
+    '''Return the date and location timestamp strings for per_day snapshots a
+    day over days days.
+    '''
+    start = datetime.datetime(2015, 1, 1)
+    values = []
+    for day in xrange(days):
+        for _ in xrange(per_day):
+            date = start + datetime.timedelta(
+                days=day, seconds=random.randint(0, 86399))
+            offset = random.choice(['-0500', '-0400', '+0000', '+0100'])
+            values.append(date.strftime('%Y-%m-%dT%H:%M:%S') + offset)
+            values.append((date - datetime.timedelta(seconds=7)).strftime(
+                '%Y-%m-%dT%H:%M:%S') + offset)
+    return values
+
+
+def bench(label, function, values, repeat):
+    best = None
+    for _ in xrange(repeat):
+        start = time.time()
+        for value in values:
+            function(value)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print '{0:<16} {1:>9.3f} {2:>12.2f}'.format(
+        label, best, best / len(values) * 1e6)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--snapshots-per-day', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    values = timestamps(args.days, args.snapshots_per_day)
+    for value in values:
+        assert mappers.parse_timestamp(value) == parse(value, ignoretz=True)
+    print '{0} timestamps, identical results'.format(len(values))
+    print '{0:<16} {1:>9} {2:>12}'.format('parser', 'seconds', 'us/value')
+    slow = bench('dateutil', (lambda v: parse(v, ignoretz=True)), values,
+                 args.repeat)
+    fast = bench('parse_timestamp', mappers.parse_timestamp, values,
+                 args.repeat)
+    print 'speedup: {0:.1f}x'.format(slow / fast)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+'''Compare round trips and elapsed time of the ORM get_or_create/update path
+against the native PostgreSQL INSERT ... ON CONFLICT path.
+
+Requires DATABASE_URI to point to a datums database that has been set up.
+The reports written by the benchmark are deleted afterwards.
+
+    $ python benchmarks/bench_upsert.py --reports 1000
+'''
+
+import argparse
+import mock
+import time
+import uuid
+from sqlalchemy import event
+from datums import models
+from datums.pipeline import codec
+
+
+class StatementCounter(object):
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def run(label, ids, question_id, native):
+    counter = StatementCounter()
+    # Commits are round trips too
+    event.listen(models.get_engine(), 'before_cursor_execute', counter)
+    event.listen(models.get_engine(), 'commit', counter)
+    start = time.time()
+    with mock.patch.object(models.base, '_is_postgresql', new=(
+            lambda: native)):
+        for i, id_ in enumerate(ids):
+            kwargs = {'id': id_, 'steps': i, 'battery': 0.5}
+            models.Report.get_or_create(**kwargs)
+            kwargs['steps'] += 1
+            models.Report.update(**kwargs)
+            response_ids = {'question_id': question_id, 'report_id': id_}
+            codec.numeric_accessor.get_or_create_from_legacy_response(
+                {'numericResponse': '1'}, **response_ids)
+            codec.numeric_accessor.update(
+                {'numericResponse': '2'}, **response_ids)
+    elapsed = time.time() - start
+    event.remove(models.get_engine(), 'before_cursor_execute', counter)
+    event.remove(models.get_engine(), 'commit', counter)
+    print '{0:<8} {1:>11} {2:>14.1f} {3:>9.2f}'.format(
+        label, counter.count, counter.count / float(len(ids) or 1), elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reports', type=int, default=1000)
+    args = parser.parse_args()
+
+    question = models.Question.get_or_create(
+        type=5, prompt='bench_upsert numeric question')
+    runs = [('orm', False, [uuid.uuid4() for _ in xrange(args.reports)]),
+            ('native', True, [uuid.uuid4() for _ in xrange(args.reports)])]
+    print '{0:<8} {1:>11} {2:>14} {3:>9}'.format(
+        'path', 'round trips', 'per report', 'seconds')
+    try:
+        for label, native, ids in runs:
+            run(label, ids, question.id, native)
+    finally:
+        for _, _, ids in runs:
+            models.session.query(models.Report).filter(
+                models.Report.id.in_(ids)).delete(synchronize_session=False)
+        models.session.delete(question)
+        models.session.commit()
+
+
+if __name__ == '__main__':
+    main()
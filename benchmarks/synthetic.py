@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+'''Write synthetic Reporter export files for benchmarks.
+
+Every file has one question of each of the seven questionType codes and a
+day's worth of snapshots with audio, location, placemark, and weather reports,
+altitude reports (without a uniqueIdentifier before May 2015, as Reporter
+used to write them), drafts, and a response to every question. The same seed
+always produces the same files.
+
+    $ python benchmarks/synthetic.py /tmp/exports --days 365 --snapshots-per-day 12
+'''
+
+import argparse
+import datetime
+import json
+import os
+import random
+import uuid
+
+
+# One question of each questionType, in codec.response_mapper order
+QUESTIONS = [
+    {'questionType': 0, 'prompt': 'What are you doing?'},
+    {'questionType': 1, 'prompt': 'What did you eat?'},
+    {'questionType': 2, 'prompt': 'Are you working?'},
+    {'questionType': 3, 'prompt': 'Where are you?'},
+    {'questionType': 4, 'prompt': 'Who are you with?'},
+    {'questionType': 5, 'prompt': 'How anxious are you?'},
+    {'questionType': 6, 'prompt': 'Notes'}]
+
+_TOKENS = ['coding', 'reading', 'running', 'cooking', 'tea', 'meeting']
+_FOODS = ['Toast', 'Eggs', 'Salad', 'Rice', 'Coffee']
+_PEOPLE = ['Ann', 'Ben', 'Cat', 'Dan']
+_PLACES = [('Home', '4a1b'), ('Work', '4c2d'), ('Cafe', '4e3f'),
+           ('Park', None)]
+_WEATHER = ['Clear', 'Cloudy', 'Rain', 'Snow', 'Overcast']
+# Reporter only started writing a uniqueIdentifier for altitude reports then
+_ALTITUDE_UUIDS_SINCE = datetime.date(2015, 5, 1)
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4)).upper()
+
+
+def _timestamp(date):
+    return date.strftime('%Y-%m-%dT%H:%M:%S-0500')
+
+
+def _response(rng, question):
+    response = {'questionPrompt': question['prompt'],
+                'uniqueIdentifier': _uuid(rng)}
+    type_ = question['questionType']
+    if type_ == 0:
+        response['tokens'] = [{'text': t} for t in rng.sample(_TOKENS, 2)]
+    elif type_ == 1:
+        response['answeredOptions'] = rng.sample(_FOODS, rng.randint(1, 3))
+    elif type_ == 2:
+        response['answeredOptions'] = [rng.choice(['Yes', 'No'])]
+    elif type_ == 3:
+        text, venue = rng.choice(_PLACES)
+        response['locationResponse'] = {
+            'text': text, 'uniqueIdentifier': _uuid(rng),
+            'latitude': 40.7 + rng.random() / 10,
+            'longitude': -74.0 + rng.random() / 10}
+        if venue:
+            response['locationResponse']['foursquareVenueId'] = venue
+    elif type_ == 4:
+        response['tokens'] = [{'text': t} for t in rng.sample(_PEOPLE, 1)]
+    elif type_ == 5:
+        response['numericResponse'] = str(rng.randint(0, 10))
+    else:
+        response['textResponses'] = [{'text': 'note {0}'.format(
+            rng.randint(0, 1000))}]
+    return response
+
+
+def snapshot(rng, date, questions=QUESTIONS):
+    '''Return a synthetic snapshot made at the datetime date.
+    '''
+    altitude = {'floorsAscended': rng.randint(0, 3),
+                'floorsDescended': rng.randint(0, 3),
+                'pressure': round(100 + rng.random() * 3, 2),
+                'adjustedPressure': round(100 + rng.random() * 3, 2),
+                'gpsAltitudeFromLocation': round(rng.random() * 50, 1),
+                'gpsRawAltitude': round(rng.random() * 50, 1)}
+    if date.date() >= _ALTITUDE_UUIDS_SINCE:
+        altitude['uniqueIdentifier'] = _uuid(rng)
+    latitude = 40.7 + rng.random() / 10
+    longitude = -74.0 + rng.random() / 10
+    temp_c = round(rng.uniform(-10, 35), 1)
+    return {
+        'uniqueIdentifier': _uuid(rng),
+        'date': _timestamp(date),
+        'battery': round(rng.random(), 2),
+        'background': rng.randint(0, 1),
+        'connection': rng.randint(0, 2),
+        'draft': rng.random() < 0.05,
+        'reportImpetus': rng.randint(0, 4),
+        'sectionIdentifier': 's-{0}'.format(rng.randint(1, 4)),
+        'steps': rng.randint(0, 20000),
+        'altitude': altitude,
+        'audio': {'uniqueIdentifier': _uuid(rng),
+                  'avg': round(rng.uniform(-70, -20), 1),
+                  'peak': round(rng.uniform(-60, -10), 1)},
+        'location': {
+            'uniqueIdentifier': _uuid(rng),
+            'latitude': latitude, 'longitude': longitude,
+            'altitude': round(rng.random() * 50, 1),
+            'course': -1, 'speed': round(rng.random() * 2, 2),
+            'horizontalAccuracy': 65, 'verticalAccuracy': 10,
+            'timestamp': _timestamp(
+                date - datetime.timedelta(seconds=rng.randint(1, 60))),
+            'placemark': {
+                'uniqueIdentifier': _uuid(rng),
+                'name': '{0} Broadway'.format(rng.randint(1, 3000)),
+                'country': 'United States', 'administrativeArea': 'NY',
+                'subAdministrativeArea': 'New York', 'locality': 'New York',
+                'subLocality': 'Manhattan', 'thoroughfare': 'Broadway',
+                'subThoroughfare': str(rng.randint(1, 3000)),
+                'postalCode': '100{0:02d}'.format(rng.randint(1, 99)),
+                'region': '<+40.8,-73.9> radius 141.7'}},
+        'weather': {
+            'uniqueIdentifier': _uuid(rng),
+            'latitude': latitude, 'longitude': longitude,
+            'stationID': 'KNYC', 'weather': rng.choice(_WEATHER),
+            'tempC': temp_c, 'tempF': round(temp_c * 9 / 5 + 32, 1),
+            'feelslikeC': temp_c, 'feelslikeF': round(temp_c * 9 / 5 + 32, 1),
+            'dewpointC': round(temp_c - 5, 1),
+            'relativeHumidity': '{0}%'.format(rng.randint(20, 90)),
+            'pressureIn': round(rng.uniform(29, 31), 2),
+            'pressureMb': rng.randint(990, 1040),
+            'precipTodayIn': 0.0, 'precipTodayMetric': 0.0,
+            'uv': rng.randint(0, 10), 'visibilityKM': 16.1,
+            'visibilityMi': 10.0, 'windDegrees': rng.randint(0, 359),
+            'windDirection': rng.choice(['N', 'E', 'S', 'W']),
+            'windKPH': rng.randint(0, 40), 'windMPH': rng.randint(0, 25),
+            'windGustKPH': 0, 'windGustMPH': 0},
+        'responses': [_response(rng, question) for question in questions]}
+
+
+def export(rng, day, snapshots_per_day, questions=QUESTIONS):
+    '''Return a synthetic export for the date day.
+    '''
+    start = datetime.datetime.combine(day, datetime.time(8))
+    times = sorted(rng.randint(0, 14 * 3600) for _ in xrange(snapshots_per_day))
+    return {'questions': questions, 'snapshots': [
+        snapshot(rng, start + datetime.timedelta(seconds=t), questions)
+        for t in times]}
+
+
+def write_exports(directory, days, snapshots_per_day,
+                  start=datetime.date(2015, 1, 1), seed=0):
+    '''Write days export files to directory, named the way Reporter names
+    them, and return their paths. The directory is created if it doesn't
+    exist.
+    '''
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    rng = random.Random(seed)
+    paths = []
+    for i in xrange(days):
+        day = start + datetime.timedelta(days=i)
+        path = os.path.join(directory, '{0}-reporter-export.json'.format(
+            day.isoformat()))
+        with open(path, 'w') as f:
+            json.dump(export(rng, day, snapshots_per_day), f)
+        paths.append(path)
+    return paths
+
+
+def mutate(path, fraction, seed=0):
+    '''Change the steps and a numeric response of a fraction of the snapshots
+    in the export file at path, as if they had been edited in Reporter, and
+    return the number of snapshots changed.
+    '''
+    rng = random.Random(seed)
+    with open(path, 'r') as f:
+        day = json.load(f)
+    changed = 0
+    for s in day['snapshots']:
+        if rng.random() >= fraction:
+            continue
+        s['steps'] += 1
+        for response in s['responses']:
+            if 'numericResponse' in response:
+                response['numericResponse'] = str(rng.randint(0, 10))
+        changed += 1
+    with open(path, 'w') as f:
+        json.dump(day, f)
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--snapshots-per-day', type=int, default=12)
+    parser.add_argument('--start', default='2015-01-01',
+                        help='Date of the first file, as YYYY-MM-DD')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = datetime.datetime.strptime(args.start, '%Y-%m-%d').date()
+    paths = write_exports(args.directory, args.days, args.snapshots_per_day,
+                          start, args.seed)
+    print 'wrote {0} files with {1} snapshots'.format(
+        len(paths), len(paths) * args.snapshots_per_day)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+
+'''Read responses and reports for analysis.
+
+load_series() reads report columns and responses straight from a Core query
+into float64 arrays, one value per report, aligned with a datetime64 array
+of the reports' creation times. No ORM objects or Decimals are built along
+the way, and the rows are read through a server-side cursor in chunks.
+
+summarize() and count_answers() aggregate the responses to a question by
+day, week, or month in PostgreSQL, so only one row per period (or per answer
+in each period) is read.
+
+NumPy is an optional dependency of datums, needed only for load_series();
+install it with
+
+    $ pip install datums[analytics]
+'''
+
+from datums import models
+from datums.pipeline import codec
+from sqlalchemy import Float, Integer, and_, cast, extract, func, select
+from sqlalchemy.sql import literal_column
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+# Report levels whose columns can be loaded, e.g. 'audio.average'
+_levels = {
+    'report': models.Report,
+    'altitude': models.AltitudeReport,
+    'audio': models.AudioReport,
+    'location': models.LocationReport,
+    'weather': models.WeatherReport
+}
+
+# Value columns for the response types that have numeric values
+_response_columns = {
+    'numeric': 'numeric_response',
+    'boolean': 'boolean_response'
+}
+
+# Value columns for the response types whose answers can be counted
+_answer_columns = {
+    'boolean': 'boolean_response',
+    'multi': 'multi_response',
+    'people': 'people_response',
+    'tokens': 'tokens_response'
+}
+
+# Periods that responses can be aggregated by, as date_trunc() fields
+INTERVALS = ['day', 'week', 'month']
+
+
+def _report_column(name):
+    '''Return the level and column for a name like 'steps' or
+    'weather.temperature_celsius'.
+    '''
+    level, _, column = name.rpartition('.')
+    try:
+        table = _levels[level or 'report'].__table__
+        return level or 'report', table.c[column]
+    except KeyError:
+        raise ValueError('Unknown report column {0}'.format(name))
+
+
+def _questions(prompts, columns):
+    '''Return a dictionary mapping each prompt to its question id and the
+    column in columns that holds the value of its responses. The column is
+    found from the question's type, without reading its responses.
+    '''
+    questions = models.Question.__table__
+    found = {}
+    for question_id, prompt, question_type in models.session.execute(select(
+            [questions.c.id, questions.c.prompt, questions.c.type]).where(
+                questions.c.prompt.in_(prompts))):
+        accessor = codec.response_mapper.get(question_type)
+        response_type = (accessor.response_class.__mapper__
+                         .polymorphic_identity if accessor else question_type)
+        if response_type not in columns:
+            raise ValueError('Cannot aggregate {0} responses to {1}'.format(
+                response_type, prompt))
+        found[prompt] = (question_id, columns[response_type])
+    for prompt in prompts:
+        if prompt not in found:
+            raise ValueError('No question {0}'.format(prompt))
+    return found
+
+
+def _periods(prompt, columns, interval, start, end):
+    '''Return the value column of the responses to prompt, the start of the
+    period each response's report was created in, and the FROM clause and
+    WHERE criteria that select the responses to prompt in the range.
+    '''
+    if interval not in INTERVALS:
+        raise ValueError('Unknown interval {0}'.format(interval))
+    question_id, column = _questions([prompt], columns)[prompt]
+    reports = models.Report.__table__
+    responses = models.Response.__table__
+    period = func.date_trunc(interval, reports.c.created_at).label('period')
+    criteria = [responses.c.question_id == question_id,
+                responses.c[column].isnot(None)]
+    if start is not None:
+        criteria.append(reports.c.created_at >= start)
+    if end is not None:
+        criteria.append(reports.c.created_at < end)
+    return (responses.c[column], period,
+            responses.join(reports, responses.c.report_id == reports.c.id),
+            and_(*criteria))
+
+
+def summarize(prompt, interval='day', start=None, end=None,
+              percentiles=(0.25, 0.5, 0.75)):
+    '''
+    Return the count, mean, minimum, maximum, and percentiles of the numeric
+    responses to prompt in each day, week, or month, computed in PostgreSQL.
+
+    PARAMETERS
+    ----------
+    prompt      : str
+                  the prompt of a question with numeric responses.
+    interval    : str
+                  'day', 'week', or 'month'; the period to aggregate by.
+    start       : datetime
+                  the earliest report creation time to include, or None for
+                  no limit.
+    end         : datetime
+                  the report creation time to stop before, or None for no
+                  limit.
+    percentiles : iterable
+                  the percentiles to interpolate, as fractions between 0 and
+                  1.
+
+    RETURNS
+    -------
+    A list of dictionaries, one for each period with responses in order,
+    with the period's start and the count, mean, min, and max of the
+    responses, and a dictionary mapping each percentile to its value.
+    '''
+    percentiles = list(percentiles)
+    value, period, joined, criteria = _periods(
+        prompt, {'numeric': 'numeric_response'}, interval, start, end)
+    query = select([period, func.count(value), func.avg(value),
+                    func.min(value), func.max(value)] + [
+        func.percentile_cont(p).within_group(value) for p in percentiles]
+    ).select_from(joined).where(criteria).group_by(period).order_by(period)
+    return [{'period': row[0], 'count': row[1], 'mean': row[2],
+             'min': row[3], 'max': row[4],
+             'percentiles': dict(zip(percentiles, row[5:]))}
+            for row in models.session.execute(query)]
+
+
+def count_answers(prompt, interval='day', start=None, end=None):
+    '''
+    Return how many times each answer was given to prompt in each day, week,
+    or month, counted in PostgreSQL. Every person, token, or option in a
+    people, tokens, or multiple-choice response counts as an answer.
+
+    PARAMETERS
+    ----------
+    prompt      : str
+                  the prompt of a question with boolean, multi, people, or
+                  tokens responses.
+    interval    : str
+                  'day', 'week', or 'month'; the period to count by.
+    start       : datetime
+                  the earliest report creation time to include, or None for
+                  no limit.
+    end         : datetime
+                  the report creation time to stop before, or None for no
+                  limit.
+
+    RETURNS
+    -------
+    A list of dictionaries, one for each period with responses in order,
+    with the period's start and a dictionary mapping each answer to the
+    number of times it was given.
+    '''
+    value, period, joined, criteria = _periods(
+        prompt, _answer_columns, interval, start, end)
+    if value.name != 'boolean_response':
+        # A function in FROM can refer to the tables before it, so this
+        # is one row per element of each response's array
+        joined = joined.join(func.unnest(value).alias('answer'),
+                             literal_column('true'))
+        value = literal_column('answer')
+    query = select([period, value, func.count()]).select_from(joined).where(
+        criteria).group_by(period, value).order_by(period, value)
+    periods = []
+    for row_period, answer, count in models.session.execute(query):
+        if not periods or periods[-1]['period'] != row_period:
+            periods.append({'period': row_period, 'counts': {}})
+        periods[-1]['counts'][answer] = count
+    return periods
+
+
+def load_series(columns=(), prompts=(), start=None, end=None,
+                chunk_size=10000):
+    '''
+    Return the creation time of every report created at or after start and
+    before end, in order of creation, and the values of columns and the
+    responses to prompts for those reports.
+
+    PARAMETERS
+    ----------
+    columns     : iterable
+                  report columns, e.g. 'steps', 'battery', 'audio.average',
+                  or 'weather.temperature_celsius'. Columns of nested reports
+                  are named level.column.
+    prompts     : iterable
+                  prompts of questions with numeric or boolean responses.
+                  Boolean responses are loaded as 1.0 and 0.0.
+    start       : datetime
+                  the earliest creation time to include, or None for no limit.
+    end         : datetime
+                  the creation time to stop before, or None for no limit.
+    chunk_size  : int
+                  the number of rows to read from the cursor at a time.
+
+    RETURNS
+    -------
+    A (timestamps, values) tuple. timestamps is a datetime64[us] array, and
+    values is a dictionary mapping each column and prompt to a float64 array
+    with one value per timestamp, NaN where a report has no value.
+    '''
+    if numpy is None:
+        raise ImportError(
+            'datums.analytics requires NumPy; pip install datums[analytics]')
+    columns, prompts = list(columns), list(prompts)
+    reports = models.Report.__table__
+    joined = reports
+    selected = [extract('epoch', reports.c.created_at)]
+    nested = {}
+    for name in columns:
+        level, column = _report_column(name)
+        if level != 'report' and level not in nested:
+            nested[level] = column.table.alias(level)
+            joined = joined.outerjoin(
+                nested[level], nested[level].c.report_id == reports.c.id)
+        table = nested.get(level, reports)
+        selected.append(cast(table.c[column.name], Float))
+    questions = _questions(prompts, _response_columns)
+    for i, prompt in enumerate(prompts):
+        question_id, column = questions[prompt]
+        responses = models.Response.__table__.alias('responses_{0}'.format(i))
+        joined = joined.outerjoin(responses, and_(
+            responses.c.report_id == reports.c.id,
+            responses.c.question_id == question_id))
+        value = responses.c[column]
+        if column == 'boolean_response':
+            # PostgreSQL only casts booleans to integers
+            value = cast(value, Integer)
+        selected.append(cast(value, Float))
+
+    query = select(selected).select_from(joined).where(
+        reports.c.created_at.isnot(None))
+    if start is not None:
+        query = query.where(reports.c.created_at >= start)
+    if end is not None:
+        query = query.where(reports.c.created_at < end)
+    result = models.session.connection().execution_options(
+        stream_results=True).execute(
+            query.order_by(reports.c.created_at, reports.c.id))
+    chunks = []
+    while True:
+        rows = result.fetchmany(chunk_size)
+        if not rows:
+            break
+        # None becomes NaN
+        chunks.append(numpy.array(rows, dtype=numpy.float64))
+    data = numpy.concatenate(chunks) if chunks else numpy.empty(
+        (0, len(selected)), dtype=numpy.float64)
+    timestamps = numpy.round(data[:, 0] * 1e6).astype(numpy.int64).view(
+        'datetime64[us]')
+    names = columns + prompts
+    return timestamps, dict(
+        (name, data[:, i + 1]) for i, name in enumerate(names))
@@ -0,0 +1,30 @@
+"""Add ingested_files table
+
+Revision ID: 5b1e0c7d9a43
+Revises: 2698789ba4a4
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '5b1e0c7d9a43'
+down_revision = '2698789ba4a4'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+from sqlalchemy import BigInteger, Column, DateTime, Float, String
+
+
+def upgrade():
+    op.create_table(
+        'ingested_files',
+        Column('path', String, primary_key=True),
+        Column('size', BigInteger, nullable=False),
+        Column('mtime', Float, nullable=False),
+        Column('sha1', String(40), nullable=False),
+        Column('ingested_at', DateTime(timezone=False), nullable=False))
+
+
+def downgrade():
+    op.drop_table('ingested_files')
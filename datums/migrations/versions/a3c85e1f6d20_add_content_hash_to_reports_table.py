@@ -0,0 +1,24 @@
+"""Add content_hash to reports table
+
+Revision ID: a3c85e1f6d20
+Revises: 5b1e0c7d9a43
+Create Date: 2026-10-18 11:02:19.740362
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a3c85e1f6d20'
+down_revision = '5b1e0c7d9a43'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+from sqlalchemy import Column, String
+
+
+def upgrade():
+    op.add_column('reports', Column('content_hash', String(40)))
+
+
+def downgrade():
+    op.drop_column('reports', 'content_hash')
@@ -0,0 +1,60 @@
+"""Add indexes for lookup columns
+
+Revision ID: c2f8d0a7b913
+Revises: a3c85e1f6d20
+Create Date: 2026-10-18 16:24:51.380217
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c2f8d0a7b913'
+down_revision = 'a3c85e1f6d20'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+
+
+# (index name, table, columns) for the foreign keys to parent reports
+_report_id_indexes = [
+    ('ix_altitude_reports_report_id', 'altitude_reports', ['report_id']),
+    ('ix_audio_reports_report_id', 'audio_reports', ['report_id']),
+    ('ix_location_reports_report_id', 'location_reports', ['report_id']),
+    ('ix_placemark_reports_location_report_id', 'placemark_reports',
+     ['location_report_id']),
+    ('ix_weather_reports_report_id', 'weather_reports', ['report_id'])]
+
+
+def upgrade():
+    # Point the responses to duplicate questions at the first question with
+    # the same prompt, then remove the duplicate questions
+    op.execute('''
+        UPDATE responses SET question_id = questions.first_id
+        FROM (SELECT id, min(id) OVER (PARTITION BY prompt) AS first_id
+              FROM questions) AS questions
+        WHERE responses.question_id = questions.id
+            AND questions.id <> questions.first_id''')
+    op.execute('''
+        DELETE FROM questions USING questions AS first
+        WHERE questions.prompt = first.prompt AND questions.id > first.id''')
+    # Keep the first response to each question in each report
+    op.execute('''
+        DELETE FROM responses USING responses AS first
+        WHERE responses.report_id = first.report_id
+            AND responses.question_id = first.question_id
+            AND responses.id > first.id''')
+    op.create_index('ix_questions_prompt', 'questions', ['prompt'],
+                    unique=True)
+    op.create_index('ix_responses_report_id_question_id', 'responses',
+                    ['report_id', 'question_id'], unique=True)
+    op.create_index('ix_reports_created_at', 'reports', ['created_at'])
+    for name, table, columns in _report_id_indexes:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in _report_id_indexes:
+        op.drop_index(name, table)
+    op.drop_index('ix_reports_created_at', 'reports')
+    op.drop_index('ix_responses_report_id_question_id', 'responses')
+    op.drop_index('ix_questions_prompt', 'questions')
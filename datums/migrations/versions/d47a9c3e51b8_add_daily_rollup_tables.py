@@ -0,0 +1,54 @@
+"""Add daily rollup tables
+
+Revision ID: d47a9c3e51b8
+Revises: c2f8d0a7b913
+Create Date: 2026-10-18 19:02:17.640385
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd47a9c3e51b8'
+down_revision = 'c2f8d0a7b913'
+branch_labels = None
+depends_on = None
+
+from alembic import op
+from sqlalchemy import Column, Date, Float, ForeignKey, Integer, String
+
+
+def upgrade():
+    op.create_table(
+        'daily_reports',
+        Column('day', Date, primary_key=True),
+        Column('reports', Integer, nullable=False),
+        Column('steps', Integer),
+        Column('average_audio', Float),
+        Column('peak_audio', Float),
+        Column('min_temperature_celsius', Float),
+        Column('mean_temperature_celsius', Float),
+        Column('max_temperature_celsius', Float),
+        Column('min_temperature_fahrenheit', Float),
+        Column('mean_temperature_fahrenheit', Float),
+        Column('max_temperature_fahrenheit', Float))
+    op.create_table(
+        'daily_responses',
+        Column('day', Date, primary_key=True),
+        Column('question_id', Integer, ForeignKey(
+            'questions.id', ondelete='CASCADE'), primary_key=True),
+        Column('responses', Integer, nullable=False),
+        Column('mean', Float),
+        Column('min', Float),
+        Column('max', Float))
+    op.create_table(
+        'daily_answers',
+        Column('day', Date, primary_key=True),
+        Column('question_id', Integer, ForeignKey(
+            'questions.id', ondelete='CASCADE'), primary_key=True),
+        Column('answer', String, primary_key=True),
+        Column('count', Integer, nullable=False))
+
+
+def downgrade():
+    op.drop_table('daily_answers')
+    op.drop_table('daily_responses')
+    op.drop_table('daily_reports')
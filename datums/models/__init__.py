@@ -1,8 +1,10 @@
 from questions import *
 from responses import *
 from reports import *
+from files import *
+from rollups import *
 
 '''SQLAlchemy models for this application.'''
 
 import base
-from base import session, engine
+from base import session, get_engine
@@ -1,39 +1,137 @@
 # -*- coding: utf-8 -*-
 
+import collections
 import os
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import any_, cast, create_engine, func, literal, select
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm import Session, sessionmaker, scoped_session
 
 
 # Initialize Base class
 Base = declarative_base()
 metadata = Base.metadata
 
-session_maker = sessionmaker()
+
+class _LazySession(Session):
+
+    '''A Session that creates the engine the first time it's needed, so
+    that importing the models doesn't require DATABASE_URI or a database
+    driver.'''
+
+    def get_bind(self, mapper=None, clause=None):
+        if self.bind is None:
+            self.bind = get_engine()
+        return super(_LazySession, self).get_bind(mapper, clause)
+
+
+session_maker = sessionmaker(class_=_LazySession)
 session = scoped_session(session_maker)
 
-engine = create_engine(os.environ['DATABASE_URI'])
-session.configure(bind=engine)
+# Created on first use by get_engine(), or explicitly by bind_engine()
+engine = None
+
+
+def bind_engine(uri=None):
+    '''Create a new engine for uri, or DATABASE_URI if no uri is specified, and
+    bind the session to it. The session's existing connections are abandoned
+    without being closed, so this is safe to call in a forked process.
+    '''
+    global engine
+    engine = create_engine(uri or os.environ['DATABASE_URI'])
+    session.registry.clear()
+    session.configure(bind=engine)
+    return engine
+
+
+def get_engine():
+    '''Return the engine, creating it for DATABASE_URI if it hasn't been
+    created yet. Sessions without a bind are bound to it when they first need
+    a connection, and unlike bind_engine(), existing sessions are kept.
+    '''
+    global engine
+    if engine is None:
+        engine = create_engine(os.environ['DATABASE_URI'])
+    return engine
 
 
-def database_setup(engine):
+def database_setup(engine=None):
     '''Set up the database.
     '''
-    metadata.create_all(engine)
+    metadata.create_all(engine or get_engine())
 
 
-def database_teardown(engine):
+def database_teardown(engine=None):
     '''BURN IT ALL DOWN (╯°□°）╯︵ ┻━┻
     '''
-    metadata.drop_all(engine)
+    metadata.drop_all(engine or get_engine())
+
+
+def _is_postgresql():
+    '''Return True if the session is bound to a PostgreSQL database.
+    '''
+    return session.get_bind().dialect.name == 'postgresql'
+
+
+def _commit():
+    '''Commits the session, or only flushes it inside a unit_of_work().
+    '''
+    if session.info.get('unit_of_work'):
+        session.flush()
+    else:
+        session.commit()
 
 
 def _action_and_commit(obj, action):
     '''Adds/deletes the instance obj to/from the session based on the action.
+    Inside a unit_of_work(), the session is flushed instead of committed.
     '''
     action(obj)
-    session.commit()
+    _commit()
+
+
+def _execute_and_commit(statement):
+    '''Executes the statement, commits the session, and returns the result.
+    '''
+    result = session.execute(statement)
+    _commit()
+    return result
+
+
+@contextmanager
+def unit_of_work():
+    '''Defer the commits made by the models until the end of the block, then
+    commit everything at once. If the block raises, everything is rolled back.
+    A unit_of_work() inside another one is part of the outer one, and leaves
+    committing or rolling back to it.
+    '''
+    if session.info.get('unit_of_work'):
+        yield
+        return
+    session.info['unit_of_work'] = True
+    try:
+        yield
+        session.commit()
+    except:
+        session.rollback()
+        raise
+    finally:
+        session.info.pop('unit_of_work', None)
+
+
+@contextmanager
+def savepoint():
+    '''Run the block inside a SAVEPOINT. If the block raises, only the changes
+    made inside the block are rolled back.
+    '''
+    session.begin_nested()
+    try:
+        yield
+        session.commit()  # releases the savepoint
+    except:
+        session.rollback()  # rolls back to the savepoint
+        raise
 
 
 class GhostBase(Base):
@@ -52,12 +150,36 @@ class GhostBase(Base):
         '''
         return session.query(cls).filter_by(**kwargs).first()
 
+    @classmethod
+    def _upsert(cls, overwrite, **kwargs):
+        '''Insert a record with a single INSERT ... ON CONFLICT (id) statement.
+        If a record with the same id already exists, update it if overwrite is
+        True, otherwise leave it as it is.
+        '''
+        statement = postgresql.insert(cls.__table__).values(**kwargs)
+        columns = [k for k in kwargs if k != 'id']
+        if overwrite and columns:
+            statement = statement.on_conflict_do_update(
+                index_elements=['id'], set_=dict(
+                    (k, getattr(statement.excluded, k)) for k in columns))
+        else:
+            statement = statement.on_conflict_do_nothing(
+                index_elements=['id'])
+        _execute_and_commit(statement)
+
     @classmethod
     def get_or_create(cls, **kwargs):
         '''
         If a record matching the instance already exists in the database, then
         return it, otherwise create a new record.
+
+        On PostgreSQL, if an id is specified, the record is created with a
+        single INSERT ... ON CONFLICT DO NOTHING statement, and a new instance
+        built from **kwargs is returned instead of the stored record.
         '''
+        if 'id' in kwargs and _is_postgresql():
+            cls._upsert(False, **kwargs)
+            return cls(**kwargs)
         q = cls._get_instance(**kwargs)
         if q:
             return q
@@ -72,7 +194,12 @@ class GhostBase(Base):
         If a record matching the instance id already exists in the database, 
         update it. If a record matching the instance id does not already exist,
         create a new record.
+
+        On PostgreSQL, this is a single INSERT ... ON CONFLICT DO UPDATE
+        statement.
         '''
+        if _is_postgresql():
+            return cls._upsert(True, **kwargs)
         q = cls._get_instance(**{'id': kwargs['id']})
         if q:
             for k, v in kwargs.items():
@@ -90,6 +217,96 @@ class GhostBase(Base):
         if q:
             _action_and_commit(q, session.delete)
 
+    @classmethod
+    def delete_many(cls, ids, returning=None):
+        '''
+        Delete every record whose id is in ids with a single DELETE statement,
+        and return the number of records deleted. Dependent records are removed
+        by the database's ON DELETE CASCADE foreign keys.
+
+        On PostgreSQL, the ids are sent as a single array parameter,
+        DELETE ... WHERE id = ANY(...), instead of one parameter per id.
+
+        If returning is the name of a column, return the list of its values
+        for the deleted records instead of their number. On PostgreSQL, they
+        come back from the same DELETE ... RETURNING statement.
+        '''
+        ids = list(ids)
+        if not ids:
+            return 0 if returning is None else []
+        id_column = cls.__table__.c.id
+        if _is_postgresql():
+            id_array = postgresql.ARRAY(id_column.type)
+            condition = id_column == any_(cast(literal(ids, id_array), id_array))
+        else:
+            condition = id_column.in_(ids)
+        statement = cls.__table__.delete().where(condition)
+        if returning is None:
+            return _execute_and_commit(statement).rowcount
+        column = cls.__table__.c[returning]
+        if _is_postgresql():
+            values = [row[0] for row in session.execute(
+                statement.returning(column))]
+        else:
+            values = [row[0] for row in session.execute(
+                select([column]).where(condition))]
+            session.execute(statement)
+        _commit()
+        return values
+
+
+def upsert_responses(rows, overwrite=False):
+    '''Write the response rows with a single INSERT ... ON CONFLICT (report_id,
+    question_id) statement, and return the result.
+
+    If overwrite is True, existing responses are rewritten from the rows,
+    including their type, and the value columns of any other type are
+    cleared, so a response to a question whose type has changed becomes a
+    response of the new type. Otherwise, only the empty value columns of
+    existing responses of the same type are filled in, and existing
+    responses of another type are left as they are.
+
+    rows are dictionaries of column values, e.g. from
+    ResponseClassLegacyAccessor.row_from_legacy_response(). Only the first row
+    for each question and report is written, or the last if overwrite is True.
+    '''
+    table = metadata.tables['responses']
+    unique = collections.OrderedDict()
+    for row in (reversed(rows) if overwrite else rows):
+        unique.setdefault((row['report_id'], row['question_id']), row)
+    rows = unique.values()
+    if not rows:
+        return None
+    # Every row in a multi-row INSERT must have the same columns
+    columns = set()
+    for row in rows:
+        columns.update(row)
+    if overwrite:
+        columns.update(column.name for column in table.c
+                       if column.name != 'id')
+    statement = postgresql.insert(table).values(
+        [dict((column, row.get(column)) for column in columns)
+         for row in rows])
+    if overwrite:
+        statement = statement.on_conflict_do_update(
+            index_elements=['report_id', 'question_id'], set_=dict(
+                (column, getattr(statement.excluded, column))
+                for column in columns
+                if column not in ('report_id', 'question_id')))
+        return _execute_and_commit(statement)
+    values = dict((column, func.coalesce(
+        table.c[column], getattr(statement.excluded, column)))
+        for column in columns
+        if column not in ('report_id', 'question_id', 'type'))
+    if values:
+        statement = statement.on_conflict_do_update(
+            index_elements=['report_id', 'question_id'], set_=values,
+            where=(table.c.type == statement.excluded.type))
+    else:
+        statement = statement.on_conflict_do_nothing(
+            index_elements=['report_id', 'question_id'])
+    return _execute_and_commit(statement)
+
 
 class ResponseClassLegacyAccessor(object):
 
@@ -103,13 +320,37 @@ class ResponseClassLegacyAccessor(object):
         '''
         return session.query(self.response_class).filter_by(**kwargs).first()
 
+    def row_from_legacy_response(self, response, **kwargs):
+        '''Return the row for the response as a dictionary of column values that
+        can be inserted directly into the responses table.
+        '''
+        row = dict(kwargs)
+        row['type'] = self.response_class.__mapper__.polymorphic_identity
+        row[self.column] = self.accessor(response)
+        return row
+
+    def _upsert(self, response, overwrite, **kwargs):
+        '''Write the response with a single INSERT ... ON CONFLICT statement.
+        '''
+        upsert_responses(
+            [self.row_from_legacy_response(response, **kwargs)], overwrite)
+
     def get_or_create_from_legacy_response(self, response, **kwargs):
         '''
         If a record matching the instance already does not already exist in the
         database, then create a new record.
+
+        On PostgreSQL, this is a single statement.
         '''
-        response_cls = self.response_class(**kwargs).get_or_create(**kwargs)
-        if not getattr(response_cls, self.column):
+        if _is_postgresql():
+            return self._upsert(response, False, **kwargs)
+        response_cls = self._get_instance(**kwargs)
+        if response_cls is None:
+            # Set the value columns before the record is first committed
+            row = self.row_from_legacy_response(response, **kwargs)
+            del row['type']
+            _action_and_commit(self.response_class(**row), session.add)
+        elif not getattr(response_cls, self.column):
             setattr(response_cls, self.column, self.accessor(response))
             _action_and_commit(response_cls, session.add)
 
@@ -117,7 +358,11 @@ class ResponseClassLegacyAccessor(object):
         '''
         If a record matching the instance already exists in the database, update
         it, else create a new record.
+
+        On PostgreSQL, this is a single statement.
         '''
+        if _is_postgresql():
+            return self._upsert(response, True, **kwargs)
         response_cls = self._get_instance(**kwargs)
         if response_cls:
             setattr(response_cls, self.column, self.accessor(response))
@@ -144,25 +389,50 @@ class LocationResponseClassLegacyAccessor(ResponseClassLegacyAccessor):
         self.venue_column = venue_column
         self.venue_accessor = venue_accessor
 
+    def row_from_legacy_response(self, response, **kwargs):
+        '''Return the row for the response, including the venue column, as a
+        dictionary of column values.
+        '''
+        row = super(LocationResponseClassLegacyAccessor,
+                    self).row_from_legacy_response(response, **kwargs)
+        row[self.venue_column] = self.venue_accessor(response)
+        return row
+
     def get_or_create_from_legacy_response(self, response, **kwargs):
         '''
         If a record matching the instance already does not already exist in the
         database, then create a new record.
+
+        On PostgreSQL, this is a single statement.
         '''
-        response_cls = self.response_class(**kwargs).get_or_create(**kwargs)
+        if _is_postgresql():
+            return self._upsert(response, False, **kwargs)
+        response_cls = self._get_instance(**kwargs)
+        if response_cls is None:
+            row = self.row_from_legacy_response(response, **kwargs)
+            del row['type']
+            _action_and_commit(self.response_class(**row), session.add)
+            return
+        changed = False
         if not getattr(response_cls, self.column):
             setattr(response_cls, self.column, self.accessor(response))
-            _action_and_commit(response_cls, session.add)
+            changed = True
         if not getattr(response_cls, self.venue_column):
             setattr(
                 response_cls, self.venue_column, self.venue_accessor(response))
+            changed = True
+        if changed:
             _action_and_commit(response_cls, session.add)
 
     def update(self, response, **kwargs):
         '''
         If a record matching the instance already exists in the database, update
         both the column and venue column attributes, else create a new record.
+
+        On PostgreSQL, this is a single statement.
         '''
+        if _is_postgresql():
+            return self._upsert(response, True, **kwargs)
         response_cls = super(
             LocationResponseClassLegacyAccessor, self)._get_instance(**kwargs)
         if response_cls:
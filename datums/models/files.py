@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+
+from base import GhostBase
+from sqlalchemy import Column
+from sqlalchemy import BigInteger, DateTime, Float, String
+
+
+__all__ = ['IngestedFile']
+
+
+class IngestedFile(GhostBase):
+
+    '''A Reporter export file that has been ingested successfully.'''
+
+    __tablename__ = 'ingested_files'
+
+    path = Column(String, primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    mtime = Column(Float, nullable=False)
+    sha1 = Column(String(40), nullable=False)
+    ingested_at = Column(DateTime(timezone=False), nullable=False)
+
+    def __str__(self):
+        attrs = ['path', 'size', 'mtime', 'sha1', 'ingested_at']
+        super(IngestedFile, self).__str__(attrs)
@@ -1,8 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import base
+import warnings
 from base import GhostBase, session
 from sqlalchemy import Column, ForeignKey
 from sqlalchemy import Integer, String
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import relationship
 
 
@@ -15,10 +18,69 @@ class Question(GhostBase):
 
     id = Column(Integer, primary_key=True, unique=True)
     type = Column(Integer, nullable=False)  # questionType
-    prompt = Column(String, nullable=False)  # questionPrompt
+    prompt = Column(
+        String, nullable=False, unique=True, index=True)  # questionPrompt
 
     responses = relationship('Response', cascade='save-update, merge, delete')
 
     def __str__(self):
         attrs = ['id', 'type', 'prompt']
         super(Question, self).__str__(attrs)
+
+    @classmethod
+    def _get_or_create_by_prompt(cls, **kwargs):
+        '''Return the question with the prompt in kwargs, creating it if it
+        doesn't exist. On PostgreSQL, the question is created with a single
+        INSERT ... ON CONFLICT (prompt) DO NOTHING statement, so that
+        concurrent imports of the same prompt don't collide.
+        '''
+        if base._is_postgresql():
+            base._execute_and_commit(postgresql.insert(cls.__table__).values(
+                **kwargs).on_conflict_do_nothing(index_elements=['prompt']))
+            return cls._get_instance(prompt=kwargs['prompt'])
+        q = cls._get_instance(prompt=kwargs['prompt'])
+        if q:
+            return q
+        q = cls(**kwargs)
+        base._action_and_commit(q, session.add)
+        return q
+
+    @classmethod
+    def get_or_create(cls, **kwargs):
+        '''
+        Return the question with the prompt in kwargs, creating it if it
+        doesn't exist.
+
+        Prompts are unique, so a question whose type has changed since it was
+        stored is still the same question. Its type is replaced with the new
+        one, with a warning, so that the responses being imported are read as
+        the new type; the responses already stored keep their own type.
+        '''
+        q = cls._get_or_create_by_prompt(**kwargs)
+        if 'type' in kwargs and q.type != kwargs['type']:
+            warnings.warn('''
+                The type of {0!r} has changed from {1} to {2}.
+                The question's type will be replaced.
+                '''.format(kwargs['prompt'], q.type, kwargs['type']))
+            q.type = kwargs['type']
+            base._action_and_commit(q, session.add)
+        return q
+
+    @classmethod
+    def update(cls, **kwargs):
+        '''
+        Set the type of the question with the prompt in kwargs, creating the
+        question if it doesn't exist.
+        '''
+        q = cls._get_or_create_by_prompt(**kwargs)
+        for k, v in kwargs.items():
+            setattr(q, k, v)
+        base._action_and_commit(q, session.add)
+
+    @classmethod
+    def delete(cls, **kwargs):
+        '''
+        If a question with the prompt in kwargs exists in the database, delete
+        it, whatever its type.
+        '''
+        super(Question, cls).delete(prompt=kwargs['prompt'])
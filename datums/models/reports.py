@@ -1,14 +1,15 @@
 # -*- coding: utf-8 -*-
 
-from base import GhostBase
+from base import GhostBase, _execute_and_commit, session
 from sqlalchemy import Column, ForeignKey
 from sqlalchemy import Integer, Numeric, String, DateTime, Boolean
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy.orm import relationship, backref, selectinload
 from sqlalchemy_utils import UUIDType
 
 
 __all__ = ['Report', 'AltitudeReport', 'AudioReport',
-           'LocationReport', 'PlacemarkReport', 'WeatherReport']
+           'LocationReport', 'PlacemarkReport', 'WeatherReport',
+           'iter_reports']
 
 
 class Report(GhostBase):
@@ -19,7 +20,8 @@ class Report(GhostBase):
     background = Column(Numeric)
     battery = Column(Numeric)
     connection = Column(Numeric)
-    created_at = Column(DateTime(timezone=False))
+    content_hash = Column(String(40))  # SHA-1 of the raw snapshot
+    created_at = Column(DateTime(timezone=False), index=True)
     draft = Column(Boolean)
     report_impetus = Column(Integer)
     section_identifier = Column(String)
@@ -36,6 +38,17 @@ class Report(GhostBase):
     weather_report = relationship(
         'WeatherReport', backref=backref('Report'), passive_deletes=True)
 
+    @classmethod
+    def delete_range(cls, start, end):
+        '''
+        Delete every report created at or after start and before end with a
+        single DELETE statement, and return the number of reports deleted.
+        Dependent reports and responses are removed by the database's ON
+        DELETE CASCADE foreign keys.
+        '''
+        return _execute_and_commit(cls.__table__.delete().where(
+            (cls.created_at >= start) & (cls.created_at < end))).rowcount
+
     def __str__(self):
         attrs = ['id', 'created_at', 'report_impetus', 'battery', 'steps',
             'section_identifier', 'background', 'connection', 'draft']
@@ -53,7 +66,8 @@ class AltitudeReport(GhostBase):
     pressure = Column(Numeric)
     pressure_adjusted = Column(Numeric)
     report_id = Column(
-        UUIDType, ForeignKey('reports.id', ondelete='CASCADE'), nullable=False)
+        UUIDType, ForeignKey('reports.id', ondelete='CASCADE'), nullable=False,
+        index=True)
 
     def __str__(self):
         attrs = ['id', 'report_id', 'average', 'peak']
@@ -68,7 +82,8 @@ class AudioReport(GhostBase):
     average = Column(Numeric)
     peak = Column(Numeric)
     report_id = Column(
-        UUIDType, ForeignKey('reports.id', ondelete='CASCADE'), nullable=False)
+        UUIDType, ForeignKey('reports.id', ondelete='CASCADE'), nullable=False,
+        index=True)
 
     def __str__(self):
         attrs = ['id', 'report_id', 'average', 'peak']
@@ -87,7 +102,8 @@ class LocationReport(GhostBase):
     latitude = Column(Numeric)
     longitude = Column(Numeric)
     report_id = Column(
-        UUIDType, ForeignKey('reports.id', ondelete='CASCADE'), nullable=False)
+        UUIDType, ForeignKey('reports.id', ondelete='CASCADE'), nullable=False,
+        index=True)
     speed = Column(Numeric)
     vertical_accuracy = Column(Numeric)
 
@@ -113,7 +129,7 @@ class PlacemarkReport(GhostBase):
     inland_water = Column(String)
     location_report_id = Column(
         UUIDType, ForeignKey('location_reports.id', ondelete='CASCADE'),
-        nullable=False)
+        nullable=False, index=True)
     neighborhood = Column(String)
     postal_code = Column(String)
     region = Column(String)
@@ -144,7 +160,8 @@ class WeatherReport(GhostBase):
     pressure_mb = Column(Numeric)
     relative_humidity = Column(String)
     report_id = Column(
-        UUIDType, ForeignKey('reports.id', ondelete='CASCADE'), nullable=False)
+        UUIDType, ForeignKey('reports.id', ondelete='CASCADE'), nullable=False,
+        index=True)
     station_id = Column(String)
     temperature_celsius = Column(Numeric)
     temperature_fahrenheit = Column(Numeric)
@@ -168,3 +185,53 @@ class WeatherReport(GhostBase):
             'relative_humidity', 'precipitation_in', 'precipitation_mm',
             'dewpoint_celsius', 'visibility_mi', 'visibility_km', 'uv']
         super(WeatherReport, self).__str__(attrs)
+
+
+# Eager loading for each of the children that iter_reports() can include
+_includes = {
+    'altitude': lambda: selectinload(Report.altitude_report),
+    'audio': lambda: selectinload(Report.audio_report),
+    'location': lambda: selectinload(Report.location_report),
+    'placemark': lambda: selectinload(Report.location_report).selectinload(
+        LocationReport.placemark),
+    'responses': lambda: selectinload(Report.responses),
+    'weather': lambda: selectinload(Report.weather_report)
+}
+
+
+def iter_reports(start=None, end=None, include=(), batch_size=1000):
+    '''
+    Yield the reports created at or after start and before end, in the order
+    they were created, with the children named in include already loaded.
+
+    The reports are read through a server-side cursor batch_size at a time,
+    and the children in include are loaded with one SELECT ... IN query per
+    child per batch, instead of one query per report. Reports that are no
+    longer referenced are dropped from the session, so memory use depends on
+    batch_size rather than on the number of reports.
+
+    PARAMETERS
+    ----------
+    start       : datetime
+                  the earliest creation time to include, or None for no limit.
+    end         : datetime
+                  the creation time to stop before, or None for no limit.
+    include     : iterable
+                  any of 'altitude', 'audio', 'location', 'placemark',
+                  'responses', and 'weather'. Children that aren't included
+                  are loaded lazily, with a query each, if they're accessed.
+    batch_size  : int
+                  the number of reports to read at a time.
+    '''
+    unknown = set(include) - set(_includes)
+    if unknown:
+        raise ValueError('Cannot include {0}; choose from {1}'.format(
+            ', '.join(sorted(unknown)), ', '.join(sorted(_includes))))
+    query = session.query(Report)
+    if start is not None:
+        query = query.filter(Report.created_at >= start)
+    if end is not None:
+        query = query.filter(Report.created_at < end)
+    query = query.options(*[_includes[child]() for child in include])
+    return iter(query.order_by(Report.created_at, Report.id).yield_per(
+        batch_size).execution_options(stream_results=True))
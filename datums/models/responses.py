@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from base import GhostBase, ResponseClassLegacyAccessor
-from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Column, ForeignKey, Index
 from sqlalchemy import Boolean, Float, Integer, String
 from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import backref, relationship
@@ -22,6 +22,10 @@ class Response(GhostBase):
     report_id = Column(UUIDType, ForeignKey('reports.id', ondelete='CASCADE'))
     type = Column(String)
 
+    # A report has at most one response to each question
+    __table_args__ = (Index('ix_responses_report_id_question_id',
+                            'report_id', 'question_id', unique=True),)
+
     __mapper_args__ = {
         'polymorphic_on': type
     }
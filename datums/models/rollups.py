@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+import base
+import datetime
+import warnings
+from base import GhostBase, metadata, session
+from sqlalchemy import Column, ForeignKey
+from sqlalchemy import Date, Float, Integer, String
+from sqlalchemy import any_, cast, func, literal, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql import literal_column
+
+
+__all__ = ['DailyReport', 'DailyResponse', 'DailyAnswer', 'refresh_rollups',
+           'refresh_range', 'rebuild_rollups']
+
+
+class DailyReport(GhostBase):
+
+    '''The number of reports created on a day, and their steps, audio levels,
+    and weather.'''
+
+    __tablename__ = 'daily_reports'
+
+    day = Column(Date, primary_key=True)
+    reports = Column(Integer, nullable=False)
+    steps = Column(Integer)
+    average_audio = Column(Float)
+    peak_audio = Column(Float)
+    min_temperature_celsius = Column(Float)
+    mean_temperature_celsius = Column(Float)
+    max_temperature_celsius = Column(Float)
+    min_temperature_fahrenheit = Column(Float)
+    mean_temperature_fahrenheit = Column(Float)
+    max_temperature_fahrenheit = Column(Float)
+
+    def __str__(self):
+        attrs = ['day', 'reports', 'steps', 'average_audio', 'peak_audio',
+                 'mean_temperature_celsius', 'mean_temperature_fahrenheit']
+        super(DailyReport, self).__str__(attrs)
+
+
+class DailyResponse(GhostBase):
+
+    '''The number, mean, minimum, and maximum of the numeric responses to a
+    question in the reports created on a day.'''
+
+    __tablename__ = 'daily_responses'
+
+    day = Column(Date, primary_key=True)
+    question_id = Column(Integer, ForeignKey(
+        'questions.id', ondelete='CASCADE'), primary_key=True)
+    responses = Column(Integer, nullable=False)
+    mean = Column(Float)
+    min = Column(Float)
+    max = Column(Float)
+
+    def __str__(self):
+        attrs = ['day', 'question_id', 'responses', 'mean', 'min', 'max']
+        super(DailyResponse, self).__str__(attrs)
+
+
+class DailyAnswer(GhostBase):
+
+    '''The number of times an answer was given to a boolean, multi, people,
+    or tokens question in the reports created on a day.'''
+
+    __tablename__ = 'daily_answers'
+
+    day = Column(Date, primary_key=True)
+    question_id = Column(Integer, ForeignKey(
+        'questions.id', ondelete='CASCADE'), primary_key=True)
+    answer = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False)
+
+    def __str__(self):
+        attrs = ['day', 'question_id', 'answer', 'count']
+        super(DailyAnswer, self).__str__(attrs)
+
+
+# The days whose reports have been added, updated, or deleted since the
+# rollups were last refreshed
+touched = set()
+
+# Key of the advisory lock that serializes refreshes, so that two processes
+# refreshing the same day don't both insert its rows
+_lock_key = 0x646174756d73
+
+
+def touch(created_at):
+    '''Mark the day of created_at to be refreshed by the next call to
+    refresh_rollups().
+    '''
+    if created_at is not None:
+        touched.add(created_at.date())
+
+
+def _rollups(criteria):
+    '''Return the INSERT ... SELECT statements that compute the rollups for
+    the reports that meet criteria.
+    '''
+    reports = metadata.tables['reports']
+    audio = metadata.tables['audio_reports']
+    weather = metadata.tables['weather_reports']
+    responses = metadata.tables['responses']
+    day = cast(reports.c.created_at, Date)
+    statements = []
+
+    daily_reports = [
+        ('day', day), ('reports', func.count(reports.c.id)),
+        ('steps', func.sum(reports.c.steps)),
+        ('average_audio', func.avg(audio.c.average)),
+        ('peak_audio', func.max(audio.c.peak))]
+    for unit in ('celsius', 'fahrenheit'):
+        temperature = weather.c['temperature_{0}'.format(unit)]
+        daily_reports.extend([
+            ('min_temperature_{0}'.format(unit), func.min(temperature)),
+            ('mean_temperature_{0}'.format(unit), func.avg(temperature)),
+            ('max_temperature_{0}'.format(unit), func.max(temperature))])
+    statements.append(DailyReport.__table__.insert().from_select(
+        [name for name, _ in daily_reports],
+        select([value for _, value in daily_reports]).select_from(
+            reports.outerjoin(audio, audio.c.report_id == reports.c.id)
+            .outerjoin(weather, weather.c.report_id == reports.c.id)).where(
+                criteria).group_by(day)))
+
+    joined = responses.join(reports, responses.c.report_id == reports.c.id)
+    value = responses.c.numeric_response
+    statements.append(DailyResponse.__table__.insert().from_select(
+        ['day', 'question_id', 'responses', 'mean', 'min', 'max'],
+        select([day, responses.c.question_id, func.count(value),
+                func.avg(value), func.min(value), func.max(value)])
+        .select_from(joined).where(criteria).where(value.isnot(None))
+        .group_by(day, responses.c.question_id)))
+
+    value = cast(responses.c.boolean_response, String)
+    statements.append(DailyAnswer.__table__.insert().from_select(
+        ['day', 'question_id', 'answer', 'count'],
+        select([day, responses.c.question_id, value, func.count()])
+        .select_from(joined).where(criteria).where(value.isnot(None))
+        .group_by(day, responses.c.question_id, value)))
+    # Only one of the array columns is set for any response, and a function
+    # in FROM can refer to the tables before it
+    answers = func.unnest(func.coalesce(
+        responses.c.multi_response, responses.c.people_response,
+        responses.c.tokens_response)).alias('answer')
+    value = literal_column('answer')
+    statements.append(DailyAnswer.__table__.insert().from_select(
+        ['day', 'question_id', 'answer', 'count'],
+        select([day, responses.c.question_id, value, func.count()])
+        .select_from(joined.join(answers, literal_column('true')))
+        .where(criteria).where(value.isnot(None))
+        .group_by(day, responses.c.question_id, value)))
+    return statements
+
+
+def _refresh(days):
+    '''Replace the rollups for days, or for every day if days is None, and
+    commit.
+    '''
+    session.execute(select([func.pg_advisory_xact_lock(_lock_key)]))
+    reports = metadata.tables['reports']
+    criteria = reports.c.created_at.isnot(None)
+    tables = [DailyReport.__table__, DailyResponse.__table__,
+              DailyAnswer.__table__]
+    if days is None:
+        for table in tables:
+            session.execute(table.delete())
+    else:
+        day_array = postgresql.ARRAY(Date)
+        days_literal = cast(literal(days, day_array), day_array)
+        for table in tables:
+            session.execute(table.delete().where(
+                table.c.day == any_(days_literal)))
+        # The range lets the index on created_at narrow the reports down
+        # before each one's day is compared
+        criteria &= (reports.c.created_at >= min(days)) & (
+            reports.c.created_at < max(days) + datetime.timedelta(days=1)) & (
+            cast(reports.c.created_at, Date) == any_(days_literal))
+    for statement in _rollups(criteria):
+        session.execute(statement)
+    base._commit()
+
+
+def refresh_rollups(days=None):
+    '''
+    Recompute the rollups for the days in days, or for the days touched by
+    the pipeline since the last refresh if days is None, and return the
+    number of days refreshed. Requires PostgreSQL; on other databases, the
+    rollups are left as they are.
+    '''
+    if days is None:
+        days = set(touched)
+        touched.difference_update(days)
+    days = sorted(set(days))
+    if not days:
+        return 0
+    if not base._is_postgresql():
+        warnings.warn('''
+            Rollups are only maintained on PostgreSQL.
+            The rollups for {0} days have not been refreshed.
+            '''.format(len(days)))
+        return 0
+    _refresh(days)
+    return len(days)
+
+
+def refresh_range(start, end):
+    '''Recompute the rollups for every day from the day of start through the
+    day before end (or the day of end, if end isn't at midnight), and return
+    the number of days refreshed.
+    '''
+    last = (end - datetime.timedelta(microseconds=1)).date()
+    return refresh_rollups(
+        start.date() + datetime.timedelta(days=i)
+        for i in xrange((last - start.date()).days + 1))
+
+
+def rebuild_rollups():
+    '''Recompute the rollups for every day from scratch. Requires
+    PostgreSQL.
+    '''
+    touched.clear()
+    _refresh(None)
@@ -1,13 +1,144 @@
 # -*- coding: utf-8 -*-
 
 import codec
-import json
+import collections
+import io
 import mappers
-import uuid
+import multiprocessing.pool
+import reader
+import transform
 import warnings
-from datums import models
+from datums import models, queries, stats
+from sqlalchemy import Column, MetaData, Table, select
+from sqlalchemy.dialects import postgresql
+from transform import content_hash
 
-__all__ = ['codec', 'mappers']
+__all__ = ['codec', 'ingest', 'mappers', 'reader', 'transform']
+
+
+def _batches(iterable, size):
+    '''Yield lists of at most size items from iterable. If size is None, yield
+    all of the items in a single list.
+    '''
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if size and len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def changed_snapshots(snapshots, counts, batch_size=500):
+    '''Yield the snapshots that are new or whose content hash differs from
+    the one stored with their report, comparing each batch of batch_size
+    snapshots with a single query. counts['unchanged'], counts['changed'], and
+    counts['new'] are incremented for every snapshot.
+
+    The days the changed snapshots' reports were stored under are marked to
+    have their rollups refreshed, since an update can move a report to
+    another day.
+    '''
+    for batch in _batches(snapshots, batch_size):
+        ids = [mappers._key_type_mapper['uniqueIdentifier'](
+            str(snapshot['uniqueIdentifier'])) for snapshot in batch]
+        stored = dict((id_, (hash_, created_at))
+                      for id_, hash_, created_at in models.session.query(
+            models.Report.id, models.Report.content_hash,
+            models.Report.created_at).filter(models.Report.id.in_(ids)))
+        for id_, snapshot in zip(ids, batch):
+            if id_ not in stored:
+                counts['new'] += 1
+            elif stored[id_][0] != content_hash(snapshot):
+                counts['changed'] += 1
+                models.rollups.touch(stored[id_][1])
+            else:
+                counts['unchanged'] += 1
+                continue
+            yield snapshot
+
+
+def touch_stored(snapshots, batch_size=500):
+    '''Yield the snapshots, marking the days their reports were stored under
+    to have their rollups refreshed, since an update can move a report to
+    another day. The reports for each batch of batch_size snapshots are
+    looked up with a single query.
+    '''
+    for batch in _batches(snapshots, batch_size):
+        ids = [mappers._key_type_mapper['uniqueIdentifier'](
+            str(snapshot['uniqueIdentifier'])) for snapshot in batch]
+        for created_at, in models.session.query(
+                models.Report.created_at).filter(models.Report.id.in_(ids)):
+            models.rollups.touch(created_at)
+        for snapshot in batch:
+            yield snapshot
+
+
+class KnownReports(object):
+
+    '''The ids of the reports that are known to exist in the database.
+
+    Ids are stored as 16-byte strings to keep the set compact. Either load()
+    every id at once at the start of a run, or prefetch() the ids for each
+    batch of snapshots with a single IN query. Reports added during the run
+    should be add()ed so that they're recognized later in the run.
+    '''
+
+    def __init__(self):
+        self.ids = set()
+        self.loaded = False
+
+    def load(self):
+        '''Load the id of every report in the database.
+        '''
+        self.ids.update(id_.bytes for id_, in models.session.query(
+            models.Report.id).yield_per(10000))
+        self.loaded = True
+
+    def prefetch(self, ids):
+        '''Look up the ids that aren't known yet with a single query, unless
+        every id has already been loaded.
+        '''
+        ids = [id_ for id_ in ids if id_.bytes not in self.ids]
+        if ids and not self.loaded:
+            self.ids.update(id_.bytes for id_, in models.session.query(
+                models.Report.id).filter(models.Report.id.in_(ids)))
+
+    def add(self, id_):
+        self.ids.add(id_.bytes)
+
+    def __contains__(self, id_):
+        return id_.bytes in self.ids
+
+
+def new_snapshots(snapshots, counts, known_reports=None, batch_size=500):
+    '''Yield the snapshots whose reports don't exist yet, prefetching the
+    existing report ids for each batch of batch_size snapshots with a single
+    query. counts['existing'] and counts['new'] are incremented for every
+    snapshot.
+    '''
+    if known_reports is None:
+        known_reports = KnownReports()
+    for batch in _batches(snapshots, batch_size):
+        ids = [mappers._key_type_mapper['uniqueIdentifier'](
+            str(snapshot['uniqueIdentifier'])) for snapshot in batch]
+        known_reports.prefetch(ids)
+        for id_, snapshot in zip(ids, batch):
+            if id_ in known_reports:
+                counts['existing'] += 1
+                continue
+            counts['new'] += 1
+            known_reports.add(id_)
+            yield snapshot
+
+
+def _touch(snapshot):
+    '''Mark the day the snapshot's report was created, so that its rollups
+    are recomputed by the next models.refresh_rollups().
+    '''
+    if snapshot.get('date'):
+        models.rollups.touch(mappers.parse_timestamp(snapshot['date']))
 
 
 class QuestionPipeline(object):
@@ -19,13 +150,17 @@ class QuestionPipeline(object):
                               'prompt': self.question['prompt']}
 
     def add(self):
-        models.Question.get_or_create(**self.question_dict)
+        question = models.Question.get_or_create(**self.question_dict)
+        codec.question_cache.add(
+            question.id, question.type, self.question_dict['prompt'])
 
     def update(self):
         models.Question.update(**self.question_dict)
+        codec.question_cache.invalidate(self.question_dict['prompt'])
 
     def delete(self):
         models.Question.delete(**self.question_dict)
+        codec.question_cache.invalidate(self.question_dict['prompt'])
 
 
 class ResponsePipeline(object):
@@ -53,38 +188,19 @@ class ReportPipeline(object):
     def __init__(self, report):
         self.report = report
 
+    @stats.timed('map')
     def _report(self, action, key_mapper=mappers._report_key_mapper):
         '''Return the dictionary of **kwargs with the correct datums attribute
         names and data types for the top level of the report, and return the
         nested levels separately.
         '''
-        _top_level = [
-            k for k, v in self.report.items() if not isinstance(v, dict)]
-        _nested_level = [
-            k for k, v in self.report.items() if isinstance(v, dict)]
-        top_level_dict = {}
+        top_level_dict = mappers.get_translator(key_mapper)(self.report)
         nested_levels_dict = {}
-        for key in _top_level:
-            try:
-                if key == 'date' or key == 'timestamp':
-                    item = mappers._key_type_mapper[key](
-                        str(self.report[key]), **{'ignoretz': True})
-                else:
-                    item = mappers._key_type_mapper[key](str(
-                        self.report[key]) if key != 'draft' else self.report[key])
-            except KeyError:
-                item = self.report[key]
-            finally:
-                try:
-                    top_level_dict[key_mapper[key]] = item
-                except KeyError:
-                    warnings.warn('''
-                        {0} is not currently supported by datums and will be ignored.
-                        Would you consider submitting an issue to add support?
-                        https://www.github.com/thejunglejane/datums/issues
-                        '''.format(key))
-        for key in _nested_level:
-            nested_levels_dict[key] = self.report[key]
+        create = getattr(action, '__name__', None) == 'get_or_create'
+        for key, value in self.report.items():
+            if not isinstance(value, dict):
+                continue
+            nested_levels_dict[key] = dict(value)
             # Add the parent report ID
             nested_levels_dict[key][
                 'reportUniqueIdentifier'] = mappers._key_type_mapper[
@@ -94,12 +210,15 @@ class ReportPipeline(object):
                 nested_levels_dict[key][
                     'locationUniqueIdentifier'] = nested_levels_dict[key].pop(
                         'reportUniqueIdentifier')
-            # Create UUID for altitude report if there is not one and the action
-            # is get_or_create, else delete the altitude report from the nested
-            # levels and warn that it will not be updated
+            # Derive a UUID for altitude report if there is not one and the
+            # action is get_or_create, else delete the altitude report from the
+            # nested levels and warn that it will not be updated
             if 'uniqueIdentifier' not in nested_levels_dict[key]:
-                if action.__func__.func_name == 'get_or_create':
-                    nested_levels_dict[key]['uniqueIdentifier'] = uuid.uuid4()
+                if create:
+                    nested_levels_dict[key][
+                        'uniqueIdentifier'] = mappers.nested_report_id(
+                            mappers._key_type_mapper['uniqueIdentifier'](
+                                str(self.report['uniqueIdentifier'])), key)
                 else:
                     del nested_levels_dict[key]
                     warnings.warn('''
@@ -113,27 +232,18 @@ class ReportPipeline(object):
         top_level, nested_levels = self._report(action, key_mapper)
         action(**top_level)
         for nested_level in nested_levels:
-            try:
-                key_mapper = mappers._report_key_mapper[nested_level]
-            except KeyError:
-                key_mapper = mappers._report_key_mapper[
-                    'location'][nested_level]
             ReportPipeline(nested_levels[nested_level]).add(
-                mappers._model_type_mapper[
-                    nested_level].get_or_create, key_mapper)
+                mappers._model_type_mapper[nested_level].get_or_create,
+                mappers._level_key_mapper(nested_level))
 
     def update(self, action=models.Report.update,
                key_mapper=mappers._report_key_mapper):
         top_level, nested_levels = self._report(action, key_mapper)
         action(**top_level)
         for nested_level in nested_levels:
-            try:
-                key_mapper = mappers._report_key_mapper[nested_level]
-            except KeyError:
-                key_mapper = mappers._report_key_mapper[
-                    'location'][nested_level]
             ReportPipeline(nested_levels[nested_level]).update(
-                mappers._model_type_mapper[nested_level].update, key_mapper)
+                mappers._model_type_mapper[nested_level].update,
+                mappers._level_key_mapper(nested_level))
 
     def delete(self):
         models.Report.delete(**{'id': mappers._key_type_mapper[
@@ -144,21 +254,348 @@ class SnapshotPipeline(object):
 
     def __init__(self, snapshot):
         self.snapshot = snapshot
+        self.content_hash = content_hash(self.snapshot)
 
         self.report = self.snapshot.copy()
         self.responses = self.report.pop('responses')
 
         _ = self.report.pop('photoSet', None)  # TODO (jsa): add support
 
-    def add(self):
-        ReportPipeline(self.report).add()
+    def _hashed_report(self):
+        return dict(self.report, contentHash=self.content_hash)
+
+    def _write_responses(self, action):
+        '''Add or update the snapshot's responses. On PostgreSQL, they're all
+        written with a single statement.
+        '''
+        if not models.base._is_postgresql():
+            for response in self.responses:
+                getattr(ResponsePipeline(response, self.report), action)()
+            return
+        rows = []
         for response in self.responses:
-            ResponsePipeline(response, self.report).add()
+            accessor, ids = codec.get_response_accessor(response, self.report)
+            rows.append(accessor.row_from_legacy_response(response, **ids))
+        models.base.upsert_responses(rows, overwrite=(action == 'update'))
+
+    # The report and responses are committed together, so that a report that
+    # exists always has all of its responses; new_snapshots() relies on it
 
+    @queries.counted
+    def add(self):
+        with models.base.unit_of_work():
+            ReportPipeline(self._hashed_report()).add()
+            self._write_responses('add')
+        _touch(self.snapshot)
+
+    @queries.counted
     def update(self):
-        ReportPipeline(self.report).update()
-        for response in self.responses:
-            ResponsePipeline(response, self.report).update()
+        with models.base.unit_of_work():
+            ReportPipeline(self._hashed_report()).update()
+            self._write_responses('update')
+        _touch(self.snapshot)
 
+    @queries.counted
     def delete(self):
         ReportPipeline(self.report).delete()
+        _touch(self.snapshot)
+
+
+class SnapshotBatchPipeline(object):
+
+    '''Add, update, or delete snapshots with one commit per batch of
+    batch_size snapshots, instead of one commit per row.
+
+    Each snapshot is written inside its own SAVEPOINT, so a snapshot that
+    fails is rolled back and reported without losing the rest of its batch.
+    add(), update(), and delete() return a list of (uniqueIdentifier,
+    exception) tuples for the snapshots that failed.
+    '''
+
+    def __init__(self, snapshots, batch_size=500):
+        self.snapshots = snapshots
+        self.batch_size = batch_size
+
+    def _run(self, action):
+        failed = []
+        for batch in _batches(self.snapshots, self.batch_size):
+            with models.base.unit_of_work():
+                for snapshot in batch:
+                    try:
+                        with models.base.savepoint():
+                            getattr(SnapshotPipeline(snapshot), action)()
+                    except Exception as e:
+                        failed.append((snapshot.get('uniqueIdentifier'), e))
+                        warnings.warn('''
+                            Could not {0} the snapshot {1}: {2!r}
+                            The snapshot has been rolled back.
+                            '''.format(
+                                action, snapshot.get('uniqueIdentifier'), e))
+        return failed
+
+    def add(self):
+        return self._run('add')
+
+    def update(self):
+        return self._run('update')
+
+    def delete(self):
+        return self._run('delete')
+
+
+class ConcurrentSnapshotPipeline(object):
+
+    '''Add, update, or delete snapshots with up to concurrency snapshots in
+    flight at once, so that the time spent waiting on the database for one
+    snapshot overlaps with the others.
+
+    Each snapshot is written by a single thread with its own session, so its
+    report is always written before its responses. Snapshots are handed to
+    the threads concurrency * 4 at a time, so a streamed file is never read
+    into memory all at once. add(), update(), and delete() return a list of
+    (uniqueIdentifier, exception) tuples for the snapshots that failed.
+    '''
+
+    def __init__(self, snapshots, concurrency=4):
+        self.snapshots = snapshots
+        self.concurrency = concurrency
+
+    def _process(self, args):
+        action, snapshot = args
+        try:
+            getattr(SnapshotPipeline(snapshot), action)()
+        except Exception as e:
+            models.session.rollback()
+            warnings.warn('''
+                Could not {0} the snapshot {1}: {2!r}
+                '''.format(action, snapshot.get('uniqueIdentifier'), e))
+            return snapshot.get('uniqueIdentifier'), e
+        finally:
+            # Return the thread's connection to the engine's pool
+            models.session.remove()
+
+    def _run(self, action):
+        failed = []
+        pool = multiprocessing.pool.ThreadPool(self.concurrency)
+        try:
+            for batch in _batches(self.snapshots, self.concurrency * 4):
+                failed.extend(result for result in pool.map(
+                    self._process, [(action, s) for s in batch]) if result)
+        finally:
+            pool.close()
+            pool.join()
+        return failed
+
+    def add(self):
+        return self._run('add')
+
+    def update(self):
+        return self._run('update')
+
+    def delete(self):
+        return self._run('delete')
+
+
+class BulkSnapshotPipeline(object):
+
+    '''Add many snapshots at once with a few multi-row INSERTs per table,
+    instead of a get_or_create round trip for every report and response, or
+    delete them with one DELETE per batch.
+
+    Snapshots are processed in batches of batch_size; if batch_size is None,
+    all of the snapshots are processed in a single batch. The rows for each
+    batch come from transform.rows(). Reports and responses that already
+    exist in the database are skipped when adding.
+    '''
+
+    # Upper bound on the number of bind parameters in a single INSERT
+    _max_parameters = 30000
+
+    def __init__(self, snapshots, batch_size=None):
+        self.snapshots = snapshots
+        self.batch_size = batch_size
+
+    def _rows(self, snapshots):
+        '''Return an ordered dictionary mapping each table to the list of rows
+        that the snapshots contain for that table.
+        '''
+        rows = collections.OrderedDict()
+        for table, table_rows in transform.rows(
+                snapshots, codec.question_cache.get_type).items():
+            if table == models.Response.__tablename__:
+                table_rows = [self._response_row(row) for row in table_rows]
+            elif table == models.Report.__tablename__:
+                for row in table_rows:
+                    models.rollups.touch(row.get('created_at'))
+            rows[models.base.metadata.tables[table]] = table_rows
+        return rows
+
+    def _response_row(self, row):
+        '''Return the response row from transform with the id of its question
+        in place of its prompt.
+        '''
+        row = dict(row)
+        row['question_id'] = codec.question_cache.get(
+            row.pop('question_prompt'))[0]
+        return row
+
+    def _new_rows(self, table, rows):
+        '''Return the rows that do not already exist in the database, or
+        earlier in the batch, using a single query against the table.
+        '''
+        if table is models.Response.__table__:
+            key = (lambda row: (row['report_id'], row['question_id']))
+            existing = set(models.session.query(
+                table.c.report_id, table.c.question_id).filter(
+                    table.c.report_id.in_(
+                        set(row['report_id'] for row in rows))))
+        else:
+            key = (lambda row: row['id'])
+            existing = set(id_ for id_, in models.session.query(
+                table.c.id).filter(table.c.id.in_(
+                    set(row['id'] for row in rows))))
+        new_rows = []
+        for row in rows:
+            if key(row) not in existing:
+                existing.add(key(row))
+                new_rows.append(row)
+        return new_rows
+
+    def _insert(self, table, rows):
+        '''Insert the rows into the table with multi-row INSERT statements.
+        '''
+        # Every row in a multi-row INSERT must have the same columns
+        columns = set()
+        for row in rows:
+            columns.update(row)
+        rows = [dict((column, row.get(column)) for column in columns)
+                for row in rows]
+        size = max(1, self._max_parameters // len(columns))
+        for i in xrange(0, len(rows), size):
+            models.session.execute(table.insert().values(rows[i:i + size]))
+
+    def add(self):
+        for batch in _batches(self.snapshots, self.batch_size):
+            for table, rows in self._rows(batch).items():
+                rows = self._new_rows(table, rows) if rows else rows
+                if rows:
+                    self._insert(table, rows)
+            models.session.commit()
+
+    def delete(self):
+        '''Delete the reports for each batch of snapshots with a single
+        DELETE statement, and return the number of reports deleted. Nested
+        reports and responses are deleted with them. The days the deleted
+        reports were stored under are marked to have their rollups refreshed.
+        '''
+        deleted = 0
+        for batch in _batches(self.snapshots, self.batch_size):
+            created = models.Report.delete_many((
+                mappers._key_type_mapper['uniqueIdentifier'](
+                    str(snapshot['uniqueIdentifier'])) for snapshot in batch),
+                returning='created_at')
+            deleted += len(created)
+            for created_at in created:
+                models.rollups.touch(created_at)
+        return deleted
+
+
+def _copy_array_element(value):
+    '''Return value as an element of an array literal, quoted only where
+    PostgreSQL would quote it, so that arrays written to text columns read
+    the same as they do after an INSERT.
+    '''
+    if value is None:
+        return 'NULL'
+    value = value.encode('utf-8') if isinstance(
+        value, unicode) else str(value)
+    if value and value.upper() != 'NULL' and not any(
+            c in value for c in '{}," \\\t\n\r\v\f'):
+        return value
+    return '"{0}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def _copy_value(value):
+    '''Return value in COPY's text format.
+    '''
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        value = 't' if value else 'f'
+    elif isinstance(value, list):
+        value = '{' + ','.join(_copy_array_element(v) for v in value) + '}'
+    elif isinstance(value, float):
+        value = repr(value)
+    elif isinstance(value, unicode):
+        value = value.encode('utf-8')
+    elif hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return value.replace('\\', '\\\\').replace('\t', '\\t').replace(
+        '\n', '\\n').replace('\r', '\\r')
+
+
+class CopySnapshotPipeline(BulkSnapshotPipeline):
+
+    '''Add many snapshots at once by streaming the rows for each table into a
+    temporary staging table with COPY FROM STDIN, and merging the staging
+    table into the real table with a single INSERT ... SELECT.
+
+    Rows that already exist are skipped by the merge, with ON CONFLICT DO
+    NOTHING on the id of reports and the report and question of responses. Each
+    batch of batch_size snapshots is committed on its own, and its staging
+    tables are dropped when it's committed. Requires PostgreSQL; on other
+    databases, add() falls back to multi-row INSERTs.
+    '''
+
+    def _copy(self, table, rows):
+        '''Copy the rows into a new staging table for table, and return the
+        staging table.
+        '''
+        columns = sorted(set(column for row in rows for column in row))
+        staging = Table(
+            'staging_{0}'.format(table.name), MetaData(),
+            *[Column(column, table.c[column].type) for column in columns],
+            prefixes=['TEMPORARY'], postgresql_on_commit='DROP')
+        connection = models.session.connection()
+        staging.create(connection)
+        buf = io.BytesIO()
+        for row in rows:
+            buf.write('\t'.join(_copy_value(row.get(column))
+                                for column in columns))
+            buf.write('\n')
+        buf.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert('COPY {0} ({1}) FROM STDIN'.format(
+                staging.name, ', '.join(columns)), buf)
+        finally:
+            cursor.close()
+        return staging
+
+    def _merge(self, table, staging):
+        '''Insert the rows in the staging table that aren't in table yet.
+        '''
+        columns = [column.name for column in staging.c]
+        if table is models.Response.__table__:
+            key = ['report_id', 'question_id']
+        else:
+            key = ['id']
+        models.session.execute(postgresql.insert(table).from_select(
+            columns, select([staging.c[column] for column in columns]).distinct(
+                *[staging.c[column] for column in key])).on_conflict_do_nothing(
+                    index_elements=key))
+
+    def add(self):
+        if not models.base._is_postgresql():
+            warnings.warn('''
+                COPY is only supported on PostgreSQL.
+                The snapshots will be added with multi-row INSERTs instead.
+                ''')
+            return super(CopySnapshotPipeline, self).add()
+        for batch in _batches(self.snapshots, self.batch_size):
+            for table, rows in self._rows(batch).items():
+                if rows:
+                    self._merge(table, self._copy(table, rows))
+            models.session.commit()
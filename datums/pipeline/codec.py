@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 
-from datums import models
+from datums import models, stats
 
 
 def human_to_boolean(human):
@@ -54,20 +54,90 @@ note_accessor = models.base.ResponseClassLegacyAccessor(
     (lambda x: [i.get('text') for i in x.get('textResponses', [])]))
 
 
+# Dictionary mapping response type to response class, column, and accessor
+# mapper
+response_mapper = {0: token_accessor, 1: multi_accessor,
+                   2: boolean_accessor, 3: location_accessor,
+                   4: people_accessor, 5: numeric_accessor,
+                   6: note_accessor}
+
+
+class QuestionCache(object):
+
+    '''Cache mapping question prompts to (question ID, response type, response
+    accessor) tuples, so that the questions table isn't queried for every
+    response.
+
+    load() reads every question with a single query; after that, prompts that
+    aren't cached are assumed not to exist. Call invalidate() if questions may
+    have been changed by another process.
+    '''
+
+    def __init__(self):
+        self._questions = {}
+        self._loaded = False
+
+    def load(self):
+        '''Load every question in the database into the cache.
+        '''
+        self._questions = {}
+        for question_id, response_type, prompt in models.session.query(
+                models.Question.id, models.Question.type,
+                models.Question.prompt):
+            self.add(question_id, response_type, prompt)
+        self._loaded = True
+
+    def add(self, question_id, response_type, prompt):
+        '''Add or replace the cached question for the prompt.
+        '''
+        self._questions[prompt] = (
+            question_id, response_type, response_mapper.get(response_type))
+
+    @stats.timed('lookup')
+    def get(self, prompt):
+        '''Return the (question ID, response type, response accessor) tuple for
+        the prompt, or None if there is no question with that prompt.
+        '''
+        try:
+            return self._questions[prompt]
+        except KeyError:
+            if self._loaded:
+                return None
+        question = models.session.query(
+            models.Question.id, models.Question.type).filter(
+                models.Question.prompt == prompt).first()
+        if question is None:
+            return None
+        self.add(question[0], question[1], prompt)
+        return self._questions[prompt]
+
+    def get_type(self, prompt):
+        '''Return the response type for the prompt, or None if there is no
+        question with that prompt.
+        '''
+        question = self.get(prompt)
+        return question[1] if question is not None else None
+
+    def invalidate(self, prompt=None):
+        '''Remove the prompt from the cache, or clear the cache entirely if no
+        prompt is specified. Invalidated prompts are looked up again the next
+        time they are needed.
+        '''
+        if prompt is None:
+            self._questions = {}
+        else:
+            self._questions.pop(prompt, None)
+        self._loaded = False
+
+question_cache = QuestionCache()
+
+
 def get_response_accessor(response, report):
     # Determine the question ID and response type based on the prompt
-    question_id, response_type = models.session.query(
-        models.Question.id, models.Question.type).filter(
-            models.Question.prompt == response['questionPrompt']).first()
+    question_id, response_type, accessor = question_cache.get(
+        response['questionPrompt'])
 
     ids = {'question_id': question_id,  # set the question ID
            'report_id': report['uniqueIdentifier']}  # set the report ID
 
-    # Dictionary mapping response type to response class, column, and accessor
-    # mapper
-    response_mapper = {0: token_accessor, 1: multi_accessor,
-                       2: boolean_accessor, 3: location_accessor,
-                       4: people_accessor, 5: numeric_accessor,
-                       6: note_accessor}
-
-    return response_mapper[response_type], ids
+    return accessor, ids
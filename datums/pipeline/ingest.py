@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+import collections
+import datetime
+import hashlib
+import multiprocessing
+import os
+from datums import models
+from datums import pipeline
+from datums import queries
+from datums import stats
+from datums.pipeline import reader
+
+
+def add_questions(path):
+    '''Add the questions in the Reporter export file at path.
+    '''
+    for question in reader.iter_questions(path):
+        pipeline.QuestionPipeline(question).add()
+
+
+def _sha1(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def fingerprint(path):
+    '''Return the manifest entry for the file at path as it is now.
+    '''
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size,
+            'mtime': stat.st_mtime, 'sha1': _sha1(path)}
+
+
+def is_unchanged(path):
+    '''Return True if the file at path has been ingested before and hasn't
+    changed since.
+
+    A file whose size and modification time match its manifest entry is
+    unchanged without being read. If only the modification time differs, the
+    file is hashed, and if the contents are the same the manifest entry is
+    refreshed so that the next check doesn't need to hash it again.
+    '''
+    entry = models.session.query(models.IngestedFile).get(
+        os.path.abspath(path))
+    if entry is None:
+        return False
+    stat = os.stat(path)
+    if entry.size != stat.st_size:
+        return False
+    if entry.mtime == stat.st_mtime:
+        return True
+    if entry.sha1 != _sha1(path):
+        return False
+    entry.mtime = stat.st_mtime
+    models.session.commit()
+    return True
+
+
+def record_file(entry):
+    '''Add or replace the manifest entry for a file that was ingested
+    successfully. entry is the file's fingerprint() from before it was read.
+    '''
+    models.session.merge(models.IngestedFile(
+        ingested_at=datetime.datetime.now(), **entry))
+    models.session.commit()
+
+
+def forget_file(path):
+    '''Remove the manifest entry for the file at path, if there is one.
+    '''
+    models.session.query(models.IngestedFile).filter(
+        models.IngestedFile.path == os.path.abspath(path)).delete(
+            synchronize_session=False)
+    models.session.commit()
+
+
+_counts = ('files', 'snapshots', 'skipped', 'existing', 'unchanged',
+           'changed', 'new', 'deleted')
+
+
+def _summary(files=0, snapshots=0, skipped=0):
+    summary = dict.fromkeys(_counts, 0)
+    summary.update({'files': files, 'snapshots': snapshots,
+                    'skipped': skipped, 'failed': [], 'errors': []})
+    return summary
+
+
+def _merge(summary, other):
+    '''Add the counts and failures in the other summary to summary, and the
+    statistics and flagged operations collected by a worker process to this
+    process's.
+    '''
+    if 'stats' in other:
+        stats.merge(other.pop('stats'))
+    if 'flagged' in other:
+        queries.flagged.extend(other.pop('flagged'))
+    for key in _counts:
+        summary[key] += other[key]
+    for key in ('failed', 'errors'):
+        summary[key].extend(other[key])
+    return summary
+
+
+def process_file(path, action, bulk=False, batch_size=None, manifest=False,
+                 changed_only=False, concurrency=1, copy=False,
+                 known_reports=None):
+    '''Add, update, or delete the snapshots in the Reporter export file at
+    path, depending on action, and return a summary of the snapshots
+    processed. The rollups for the days of the snapshots are refreshed once
+    the whole file has been processed.
+
+    PARAMETERS
+    ----------
+    path        : str
+                  the path to the export file.
+    action      : str
+                  'add', 'update', or 'delete'.
+    bulk        : bool
+                  add the snapshots with a BulkSnapshotPipeline. Only used if
+                  action is 'add'.
+    batch_size  : int
+                  the number of snapshots to commit at a time, or to insert or
+                  delete at a time if bulk or copy is True or action is
+                  'delete'. If
+                  None, every row is committed individually (or the whole file
+                  is inserted or deleted at once).
+    manifest    : bool
+                  record the file in the manifest if every snapshot was added
+                  or updated successfully, or remove it from the manifest if
+                  action is 'delete'.
+    changed_only: bool
+                  when adding, skip the snapshots whose reports already exist
+                  and count the snapshots that are existing and new. When
+                  updating, only update the snapshots whose content hash
+                  differs from the one stored with their report, and count
+                  the snapshots that are unchanged, changed, and new.
+    concurrency : int
+                  the number of snapshots to add or update at once with a
+                  ConcurrentSnapshotPipeline. Not used with bulk or
+                  batch_size.
+    copy        : bool
+                  add the snapshots with a CopySnapshotPipeline. Only used if
+                  action is 'add'.
+    known_reports: pipeline.KnownReports
+                  the reports known to exist, shared across files. Only used
+                  if action is 'add' and changed_only is True.
+    '''
+    summary = _summary(files=1)
+    # Fingerprint the file before reading it, so that a file that changes
+    # while it's being read is processed again next time
+    entry = fingerprint(path) if manifest and action != 'delete' else None
+
+    def counted(snapshots):
+        for snapshot in snapshots:
+            summary['snapshots'] += 1
+            yield snapshot
+
+    snapshots = counted(reader.iter_snapshots(path))
+    counts = collections.Counter()
+    if changed_only and action == 'update':
+        snapshots = pipeline.changed_snapshots(
+            snapshots, counts, batch_size or 500)
+    elif action == 'update':
+        snapshots = pipeline.touch_stored(snapshots, batch_size or 500)
+    elif changed_only and action == 'add' and not (bulk or copy):
+        snapshots = pipeline.new_snapshots(
+            snapshots, counts, known_reports, batch_size or 500)
+    if action == 'delete':
+        summary['deleted'] = pipeline.BulkSnapshotPipeline(
+            snapshots, batch_size).delete()
+    elif copy and action == 'add':
+        pipeline.CopySnapshotPipeline(snapshots, batch_size).add()
+    elif bulk and action == 'add':
+        pipeline.BulkSnapshotPipeline(snapshots, batch_size).add()
+    elif batch_size or concurrency > 1:
+        if batch_size:
+            snapshot_pipeline = pipeline.SnapshotBatchPipeline(
+                snapshots, batch_size)
+        else:
+            snapshot_pipeline = pipeline.ConcurrentSnapshotPipeline(
+                snapshots, concurrency)
+        failed = getattr(snapshot_pipeline, action)()
+        summary['failed'] = [(str(uid), repr(e)) for uid, e in failed]
+    else:
+        for snapshot in snapshots:
+            getattr(pipeline.SnapshotPipeline(snapshot), action)()
+    summary.update(counts)
+    # Recompute the rollups for the days the file's snapshots were in
+    models.refresh_rollups()
+    if manifest and action == 'delete':
+        forget_file(path)
+    elif manifest and not summary['failed']:
+        record_file(entry)
+    return summary
+
+
+def _init_worker(url):
+    # The engine's connection pool can't be shared with the parent process,
+    # so connect again to the same database
+    models.base.bind_engine(url)
+    # Only report the statistics collected in this process
+    stats.reset()
+
+
+def _process_file_in_worker(args):
+    path = args[0]
+    try:
+        summary = process_file(*args)
+    except Exception as e:
+        models.session.rollback()
+        summary = _summary(files=1)
+        summary['errors'].append((path, repr(e)))
+    if stats.enabled:
+        summary['stats'] = stats.as_dict()
+        stats.reset()
+    if queries.flagged:
+        summary['flagged'] = list(queries.flagged)
+        del queries.flagged[:]
+    return summary
+
+
+def process_files(paths, action, bulk=False, batch_size=None, workers=1,
+                  manifest=False, changed_only=False, concurrency=1,
+                  copy=False):
+    '''Add, update, or delete the snapshots in each of the Reporter export
+    files in paths, and return one summary for all of the files.
+
+    If manifest is True, files that are unchanged since they were last added
+    or updated are skipped, and every file that's processed successfully is
+    recorded in (or, when deleting, removed from) the manifest. If
+    changed_only is True, only the snapshots that are new are added, and only
+    the snapshots whose contents changed are updated. When adding several
+    files in one process, the ids of the existing reports are loaded once for
+    the whole run.
+
+    If workers is greater than 1, the files are spread across that many
+    processes, each with its own database engine. A file that fails in a
+    worker is reported in the summary's errors instead of stopping the run.
+    When adding, the questions in every file are added before any snapshots
+    so that all responses can find their questions.
+    '''
+    summary = _summary()
+    if manifest and action != 'delete':
+        changed = [path for path in paths if not is_unchanged(path)]
+        summary['skipped'] = len(paths) - len(changed)
+        paths = changed
+    if action == 'add':
+        for path in paths:
+            add_questions(path)
+    args = [(path, action, bulk, batch_size, manifest, changed_only,
+             concurrency, copy) for path in paths]
+    if workers <= 1 or len(paths) <= 1:
+        known_reports = pipeline.KnownReports()
+        if (changed_only and action == 'add' and not (bulk or copy) and
+                len(paths) > 1):
+            # One query for the whole run instead of one per batch
+            known_reports.load()
+        for arg in args:
+            _merge(summary, process_file(*arg, known_reports=known_reports))
+        return summary
+    # The workers connect to the same database as this process, whether it
+    # came from DATABASE_URI or bind_engine()
+    url = str(models.base.get_engine().url)
+    # Don't let the workers inherit any open connections
+    models.session.remove()
+    models.base.engine.dispose()
+    pool = multiprocessing.Pool(
+        min(workers, len(paths)), _init_worker, (url,))
+    try:
+        for result in pool.imap_unordered(_process_file_in_worker, args):
+            _merge(summary, result)
+    finally:
+        pool.close()
+        pool.join()
+    return summary
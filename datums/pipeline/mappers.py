@@ -1,10 +1,40 @@
 # -*- coding: utf-8 -*-
 
+import collections
+import datetime
+import re
 import uuid
+import warnings
 from dateutil.parser import parse
 from datums import models
 
 
+# The layout Reporter uses for dates and timestamps, e.g.
+# 2016-01-24T21:40:26-0500, optionally with fractional seconds
+_timestamp_pattern = re.compile(
+    r'(\d{4})-(\d\d)-(\d\d)T(\d\d):(\d\d):(\d\d)(?:\.(\d{1,6})\d*)?'
+    r'(?:Z|[+-]\d\d(?::?\d\d)?)?$')
+
+
+def parse_timestamp(timestr, ignoretz=True):
+    '''Parse a Reporter date or timestamp string into a datetime.
+
+    Strings in Reporter's ISO-8601 layout are parsed directly, dropping the UTC
+    offset; anything else falls back to dateutil.parser.parse. The result is
+    the same as dateutil.parser.parse(timestr, ignoretz=True).
+    '''
+    match = _timestamp_pattern.match(timestr) if ignoretz else None
+    if match is None:
+        return parse(timestr, ignoretz=ignoretz)
+    year, month, day, hour, minute, second, fraction = match.groups()
+    try:
+        return datetime.datetime(
+            int(year), int(month), int(day), int(hour), int(minute),
+            int(second), int(fraction.ljust(6, '0')) if fraction else 0)
+    except ValueError:
+        return parse(timestr, ignoretz=ignoretz)
+
+
 _model_type_mapper = {
     'altitude': models.AltitudeReport,
     'audio': models.AudioReport,
@@ -15,9 +45,9 @@ _model_type_mapper = {
 }
 
 _key_type_mapper = {
-    'date': parse,
+    'date': parse_timestamp,
     'draft': bool,
-    'timestamp': parse,
+    'timestamp': parse_timestamp,
     'uniqueIdentifier': uuid.UUID
 }
 
@@ -43,6 +73,7 @@ _report_key_mapper = {
     'background': 'background',
     'battery': 'battery',
     'connection': 'connection',
+    'contentHash': 'content_hash',  # added
     'date': 'created_at',
     'draft': 'draft',
     'location': {
@@ -105,3 +136,102 @@ _report_key_mapper = {
         'windMPH': 'wind_mph'
     }
 }
+
+
+# Number of times each key that datums does not support has been seen
+unsupported_keys = collections.Counter()
+
+
+def _level_key_mapper(level):
+    '''Return the key mapper for a level of a report, e.g. 'report',
+    'location', or 'placemark'.
+    '''
+    if level == 'report':
+        return _report_key_mapper
+    try:
+        return _report_key_mapper[level]
+    except KeyError:
+        return _report_key_mapper['location'][level]
+
+
+def nested_report_id(parent_id, level):
+    '''Return the id for a nested report without a uniqueIdentifier, i.e. an
+    altitude report written before May 2015. The id is derived from the id of
+    its parent report and its level, so every loader gives the report the
+    same id every time it's added.
+    '''
+    return uuid.uuid5(parent_id, str(level))
+
+
+def _converter(key):
+    '''Return the function that converts a Reporter value for key to the type
+    of the datums attribute, or None if the value can be used as is.
+    '''
+    if key not in _key_type_mapper:
+        return None
+    convert = _key_type_mapper[key]
+    if key == 'date' or key == 'timestamp':
+        return (lambda value: convert(str(value), **{'ignoretz': True}))
+    if key == 'draft':
+        return convert
+    return (lambda value: convert(str(value)))
+
+
+def _unsupported(key):
+    unsupported_keys[key] += 1
+    if unsupported_keys[key] == 1:
+        warnings.warn('''
+            {0} is not currently supported by datums and will be ignored.
+            Would you consider submitting an issue to add support?
+            https://www.github.com/thejunglejane/datums/issues
+            '''.format(key))
+
+
+class Translator(object):
+
+    '''Translates the top level of a raw Reporter dictionary into **kwargs for
+    a datums model.
+
+    The key mapper is compiled once into a flat dictionary mapping each
+    Reporter key to the datums attribute name and type conversion for that
+    key. Keys that datums does not support are counted in unsupported_keys,
+    and a warning is only issued the first time each one is seen.
+    '''
+
+    def __init__(self, key_mapper):
+        self.key_mapper = key_mapper
+        self.fields = dict((key, (attribute, _converter(key)))
+                           for key, attribute in key_mapper.items()
+                           if not isinstance(attribute, dict))
+
+    def __call__(self, report):
+        kwargs = {}
+        for key, value in report.iteritems():
+            if isinstance(value, dict):
+                continue
+            try:
+                attribute, convert = self.fields[key]
+            except KeyError:
+                _unsupported(key)
+                continue
+            kwargs[attribute] = value if convert is None else convert(value)
+        return kwargs
+
+
+# One translator for each model, compiled at import time
+translators = dict((level, Translator(_level_key_mapper(level)))
+                   for level in _model_type_mapper)
+_translators_by_key_mapper = dict(
+    (id(translator.key_mapper), translator)
+    for translator in translators.values())
+
+
+def get_translator(key_mapper):
+    '''Return the translator compiled from key_mapper.
+    '''
+    try:
+        return _translators_by_key_mapper[id(key_mapper)]
+    except KeyError:
+        translator = Translator(key_mapper)
+        _translators_by_key_mapper[id(key_mapper)] = translator
+        return translator
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+'''Incremental reader for Reporter export files.
+
+json.load reads an entire export into memory before a single snapshot can be
+processed. The functions in this module decode one element of the top-level
+'questions' or 'snapshots' array at a time instead, so memory use depends on
+the size of a snapshot rather than the size of the file.
+'''
+
+import io
+import json
+import re
+from datums import stats
+
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r'[ \t\n\r]*')
+
+
+class _Scanner(object):
+
+    '''Buffered scanner over a file object containing JSON text.'''
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = u''
+        self.index = 0
+        self.eof = False
+
+    def _read(self):
+        '''Append the next chunk of the file to the unconsumed part of the
+        buffer. Return False if the end of the file has been reached.
+        '''
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.index:] + chunk
+        self.index = 0
+        return True
+
+    def peek(self):
+        '''Return the next non-whitespace character without consuming it, or an
+        empty string at the end of the file.
+        '''
+        while True:
+            self.index = _whitespace.match(self.buffer, self.index).end()
+            if self.index < len(self.buffer):
+                return self.buffer[self.index]
+            if not self._read():
+                return ''
+
+    def expect(self, characters):
+        '''Consume and return the next non-whitespace character, which must be
+        one of characters.
+        '''
+        c = self.peek()
+        if not c or c not in characters:
+            raise ValueError('Expected one of {0!r} at position {1}, found '
+                             '{2!r}'.format(characters, self.index, c))
+        self.index += 1
+        return c
+
+    @stats.timed('read')
+    def value(self):
+        '''Decode and return the next JSON value.
+        '''
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.index)
+            except ValueError:
+                # The value may continue in the next chunk
+                if not self._read():
+                    raise
+                continue
+            # A number at the end of the buffer may be truncated
+            if end == len(self.buffer) and not self.eof and self._read():
+                continue
+            self.index = end
+            return value
+
+
+def _iter_array(f, key, chunk_size=65536):
+    '''Yield the elements of the array stored under key in the top-level object
+    of the JSON file object f, one at a time. Other keys are skipped without
+    keeping their values in memory.
+    '''
+    scanner = _Scanner(f, chunk_size)
+    scanner.expect('{')
+    if scanner.peek() == '}':
+        return
+    while True:
+        name = scanner.value()
+        scanner.expect(':')
+        if scanner.peek() == '[':
+            scanner.expect('[')
+            if scanner.peek() == ']':
+                scanner.expect(']')
+            else:
+                while True:
+                    element = scanner.value()
+                    if name == key:
+                        yield element
+                    if scanner.expect(',]') == ']':
+                        break
+        else:
+            scanner.value()
+        if name == key or scanner.expect(',}') == '}':
+            return
+
+
+def iter_questions(path, chunk_size=65536):
+    '''Yield the questions in the Reporter export file at path one at a time.
+    '''
+    with io.open(path, 'r', encoding='utf-8') as f:
+        for question in _iter_array(f, 'questions', chunk_size):
+            yield question
+
+
+def iter_snapshots(path, chunk_size=65536):
+    '''Yield the snapshots in the Reporter export file at path one at a time.
+    '''
+    with io.open(path, 'r', encoding='utf-8') as f:
+        for snapshot in _iter_array(f, 'snapshots', chunk_size):
+            stats.count('snapshots')
+            yield snapshot
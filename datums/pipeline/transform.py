@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+'''Turn Reporter snapshots into rows for the datums tables without touching
+the database.
+
+The functions in this module never read or write the session and never
+modify the snapshots they are given, so a snapshot always produces the same
+rows. Snapshots can be transformed in any number of processes, and their rows
+cached, before they are handed to a loader such as BulkSnapshotPipeline.
+
+Rows are dictionaries of column values, grouped by table name in the order
+the tables must be loaded. Question ids only exist in the database, so
+response rows have the question_prompt of their question instead of a
+question_id; the loader looks the ids up. Nested reports without a
+uniqueIdentifier, i.e. altitude reports written before May 2015, are given an
+id derived from their parent report's id, so they get the same id every time
+they're transformed.
+'''
+
+import collections
+import hashlib
+import itertools
+import json
+import warnings
+import codec
+import mappers
+import reader
+from datums import stats
+
+
+# Tables in the order that their rows must be loaded
+TABLES = [mappers._model_type_mapper[level].__tablename__ for level in (
+    'report', 'altitude', 'audio', 'location', 'placemark', 'weather')] + [
+        'responses']
+
+
+def content_hash(snapshot):
+    '''Return the SHA-1 of the raw snapshot. The hash only depends on the
+    snapshot's contents, not on the order of its keys.
+    '''
+    return hashlib.sha1(json.dumps(
+        snapshot, sort_keys=True, separators=(',', ':'),
+        default=str)).hexdigest()
+
+
+def empty_rows():
+    '''Return an ordered dictionary mapping each table name to an empty list
+    of rows.
+    '''
+    return collections.OrderedDict((table, []) for table in TABLES)
+
+
+def _report_rows(report, level, rows, parent_id=None):
+    '''Append the row for report, a level of a snapshot, and the rows for
+    the reports nested in it to rows.
+    '''
+    row = mappers.translators[level](report)
+    if parent_id is not None:
+        row['location_report_id' if level == 'placemark' else
+            'report_id'] = parent_id
+        if 'id' not in row:
+            row['id'] = mappers.nested_report_id(parent_id, level)
+    rows[mappers._model_type_mapper[level].__tablename__].append(row)
+    for key, value in report.iteritems():
+        if isinstance(value, dict):
+            _report_rows(value, key, rows, row['id'])
+
+
+@stats.timed('map')
+def _map_report(report, rows):
+    '''Append the rows for report, the top level of a snapshot, and the
+    reports nested in it to rows.
+    '''
+    _report_rows(report, 'report', rows)
+
+
+def snapshot_rows(snapshot, question_type, rows=None):
+    '''Return the rows for the snapshot, appended to rows if it's given.
+
+    PARAMETERS
+    ----------
+    snapshot     : dict
+                   the raw snapshot, as read from a Reporter export file.
+    question_type: function
+                   returns the questionType of a prompt, or None if there is
+                   no question with that prompt. Responses to unknown
+                   questions are ignored.
+    rows         : dict
+                   the dictionary of rows from empty_rows() to append to.
+    '''
+    if rows is None:
+        rows = empty_rows()
+    report = dict((key, value) for key, value in snapshot.iteritems()
+                  if key not in ('responses', 'photoSet'))
+    report['contentHash'] = content_hash(snapshot)
+    _map_report(report, rows)
+    report_id = rows['reports'][-1]['id']
+    for response in snapshot.get('responses', []):
+        prompt = response['questionPrompt']
+        accessor = codec.response_mapper.get(question_type(prompt))
+        if accessor is None:
+            warnings.warn('''
+                No question found for the prompt {0}.
+                The response in {1} will be ignored.
+                '''.format(prompt, report_id))
+            continue
+        rows['responses'].append(accessor.row_from_legacy_response(
+            response, question_prompt=prompt, report_id=report_id))
+    return rows
+
+
+def rows(snapshots, question_type):
+    '''Return the rows for all of the snapshots.
+    '''
+    all_rows = empty_rows()
+    for snapshot in snapshots:
+        snapshot_rows(snapshot, question_type, all_rows)
+    return all_rows
+
+
+def question_types(path):
+    '''Return a dictionary mapping the prompt of each question in the Reporter
+    export file at path to its questionType.
+    '''
+    return dict((question['prompt'], question['questionType'])
+                for question in reader.iter_questions(path))
+
+
+def iter_file_rows(path, batch_size=500):
+    '''Yield the rows for each batch of batch_size snapshots in the Reporter
+    export file at path. Responses are matched to the questions in the same
+    file.
+    '''
+    question_type = question_types(path).get
+    snapshots = reader.iter_snapshots(path)
+    while True:
+        batch = list(itertools.islice(snapshots, batch_size))
+        if not batch:
+            return
+        yield rows(batch, question_type)
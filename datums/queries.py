@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+'''Count the statements that pipeline operations send to the database.
+
+QueryCounter counts the statements, SELECTs, and commits made inside a with
+block, and how long the database took to run them. watch() counts every
+SnapshotPipeline add(), update(), and delete() this way, and warns about the
+operations that issue more than a threshold of statements for their snapshot,
+which is usually a sign of a query per row (N+1) creeping back in.
+
+Statements are counted for every engine in the process, but only those made
+by the thread that entered the block, so operations running in different
+threads at once are counted separately.
+'''
+
+import functools
+import threading
+import time
+import warnings
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# The QueryCounters that are active in each thread
+_local = threading.local()
+# Guards the one-time registration of the event listeners
+_lock = threading.Lock()
+_listening = False
+
+
+def _active():
+    '''Return the list of QueryCounters active in the current thread.
+    '''
+    try:
+        return _local.counters
+    except AttributeError:
+        _local.counters = []
+        return _local.counters
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if _active():
+        # A connection is only used by one thread at a time
+        conn.info.setdefault('datums_query_starts', []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    counters = _active()
+    starts = conn.info.get('datums_query_starts')
+    if not counters or not starts:
+        return
+    seconds = time.time() - starts.pop()
+    select = statement.lstrip()[:6].upper() == 'SELECT'
+    for counter in counters:
+        counter.seconds += seconds
+        counter.statements += 1
+        if select:
+            counter.selects += 1
+
+
+def _commit(conn):
+    for counter in _active():
+        counter.commits += 1
+
+
+def _listen():
+    '''Register the event listeners on every engine, once. Adding and
+    removing listeners isn't safe while other threads are executing
+    statements, so they're never removed.
+    '''
+    global _listening
+    with _lock:
+        if _listening:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'commit', _commit)
+        _listening = True
+
+
+class QueryCounter(object):
+
+    '''Context manager that counts the statements executed and the commits
+    made by the current thread inside the block, and the time spent executing
+    the statements.
+    '''
+
+    def __init__(self):
+        self.statements = 0
+        self.selects = 0
+        self.commits = 0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        _listen()
+        _active().append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _active().remove(self)
+
+    def as_dict(self):
+        return {'statements': self.statements, 'selects': self.selects,
+                'commits': self.commits, 'seconds': self.seconds}
+
+
+# The maximum number of statements per operation, or None if operations
+# aren't being watched
+threshold = None
+# (operation, uniqueIdentifier, QueryCounter.as_dict()) for each operation
+# that issued more than threshold statements
+flagged = []
+
+
+def watch(max_statements):
+    '''Start counting the statements of every SnapshotPipeline operation, and
+    flag the operations that issue more than max_statements.
+    '''
+    global threshold
+    threshold = max_statements
+
+
+def unwatch():
+    '''Stop counting statements, and clear the flagged operations.
+    '''
+    global threshold
+    threshold = None
+    del flagged[:]
+
+
+def counted(f):
+    '''Decorator for SnapshotPipeline operations that counts their statements
+    while watch() is in effect.
+    '''
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        if threshold is None:
+            return f(self, *args, **kwargs)
+        with QueryCounter() as counter:
+            result = f(self, *args, **kwargs)
+        if counter.statements > threshold:
+            uid = self.snapshot.get('uniqueIdentifier')
+            flagged.append((f.__name__, uid, counter.as_dict()))
+            warnings.warn('''
+                {0} of the snapshot {1} issued {2} statements ({3} SELECTs,
+                {4} commits), more than the {5} allowed.
+                '''.format(f.__name__, uid, counter.statements,
+                           counter.selects, counter.commits, threshold))
+        return result
+    return wrapper
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+'''Timing and throughput statistics for the pipeline.
+
+Statistics are only collected between enable() and disable(). While they're
+disabled, the functions decorated with timed() do a single extra check per
+call and no SQLAlchemy or warnings hooks are installed.
+
+Stages
+------
+read    : decoding snapshots from export files
+map     : translating reports into datums attributes (ReportPipeline._report,
+          or transform.snapshot_rows() for --bulk, --copy, and --dry-run)
+lookup  : finding the question and accessor for responses
+execute : waiting on the database for statements
+commit  : committing sessions, including any flush that the commit triggers
+
+Time spent in a flush is counted towards both execute and commit. The
+statistics can be collected from several threads at once, e.g. with
+--concurrency.
+'''
+
+import collections
+import functools
+import threading
+import time
+import warnings
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+
+enabled = False
+
+_seconds = collections.Counter()
+_calls = collections.Counter()
+_counts = collections.Counter()
+_rows = collections.Counter()
+_started = None
+_showwarning = None
+# Guards the counters, which are updated from every thread
+_lock = threading.Lock()
+
+
+def timed(stage):
+    '''Decorator that adds the time spent in the function to stage.
+    '''
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return f(*args, **kwargs)
+            start = time.time()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                seconds = time.time() - start
+                with _lock:
+                    _seconds[stage] += seconds
+                    _calls[stage] += 1
+        return wrapper
+    return decorator
+
+
+def count(key, n=1):
+    '''Add n to the count for key, e.g. 'snapshots'.
+    '''
+    if enabled:
+        with _lock:
+            _counts[key] += n
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info.setdefault('datums_stats_start', []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    seconds = time.time() - conn.info['datums_stats_start'].pop()
+    compiled = getattr(context, 'compiled', None)
+    table = getattr(getattr(compiled, 'statement', None), 'table', None)
+    with _lock:
+        _seconds['execute'] += seconds
+        _calls['execute'] += 1
+        if table is not None and cursor.rowcount > 0:
+            _rows[table.name] += cursor.rowcount
+
+
+def _before_commit(session):
+    session.info['datums_stats_commit'] = time.time()
+
+
+def _after_commit(session):
+    start = session.info.pop('datums_stats_commit', None)
+    if start is not None:
+        seconds = time.time() - start
+        with _lock:
+            _seconds['commit'] += seconds
+            _calls['commit'] += 1
+
+
+def _after_soft_rollback(session, previous_transaction):
+    session.info.pop('datums_stats_commit', None)
+
+
+_listeners = [
+    (Engine, 'before_cursor_execute', _before_cursor_execute),
+    (Engine, 'after_cursor_execute', _after_cursor_execute),
+    (Session, 'before_commit', _before_commit),
+    (Session, 'after_commit', _after_commit),
+    (Session, 'after_soft_rollback', _after_soft_rollback)]
+
+
+def _warning(*args, **kwargs):
+    with _lock:
+        _counts['warnings'] += 1
+    return _showwarning(*args, **kwargs)
+
+
+def enable():
+    '''Start collecting statistics.
+    '''
+    global enabled, _started, _showwarning
+    if enabled:
+        return
+    for target, name, listener in _listeners:
+        event.listen(target, name, listener)
+    _showwarning = warnings.showwarning
+    warnings.showwarning = _warning
+    _started = time.time()
+    enabled = True
+
+
+def disable():
+    '''Stop collecting statistics. The statistics collected so far are kept.
+    '''
+    global enabled
+    if not enabled:
+        return
+    for target, name, listener in _listeners:
+        event.remove(target, name, listener)
+    warnings.showwarning = _showwarning
+    enabled = False
+
+
+def reset():
+    '''Clear the statistics collected so far.
+    '''
+    global _started
+    with _lock:
+        for counter in (_seconds, _calls, _counts, _rows):
+            counter.clear()
+    _started = time.time() if enabled else None
+
+
+def as_dict():
+    '''Return the statistics collected so far as a dictionary with the
+    seconds and calls for each stage, the counts of snapshots and warnings,
+    the rows written to each table, and the elapsed time since enable().
+    '''
+    with _lock:
+        return {'elapsed': time.time() - _started if _started else 0.0,
+                'seconds': dict(_seconds), 'calls': dict(_calls),
+                'counts': dict(_counts), 'rows': dict(_rows)}
+
+
+def merge(other):
+    '''Add the statistics in other, a dictionary from as_dict(), e.g. from a
+    worker process. The elapsed time is not merged.
+    '''
+    with _lock:
+        for counter, key in ((_seconds, 'seconds'), (_calls, 'calls'),
+                             (_counts, 'counts'), (_rows, 'rows')):
+            counter.update(other[key])
@@ -13,7 +13,8 @@ setup(
     version = __version__,
     scripts = ['bin/datums'],
     install_requires = [
-        'alembic', 'sqlalchemy', 'sqlalchemy-utils', 'python-dateutil'],
+        'alembic', 'sqlalchemy>=1.2', 'sqlalchemy-utils', 'python-dateutil'],
+    extras_require = {'analytics': ['numpy']},
     tests_require = ['mock'],
     description = 'A PostgreSQL pipeline for Reporter.',
     author = 'Jane Stewart Adams',
@@ -1 +1,3 @@
-__all__ = ['test_codec', 'test_models', 'test_pipeline']
\ No newline at end of file
+__all__ = ['test_analytics', 'test_codec', 'test_ingest', 'test_mappers',
+           'test_models', 'test_pipeline', 'test_queries', 'test_reader',
+           'test_stats', 'test_transform']
\ No newline at end of file
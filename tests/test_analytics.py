@@ -0,0 +1,205 @@
+import datetime
+import mock
+import unittest
+import uuid
+import warnings
+from datums import analytics, models
+from sqlalchemy.dialects import postgresql
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class TestLoadSeries(unittest.TestCase):
+
+    '''load_series() against an in-memory SQLite database.
+    '''
+
+    _tables = [models.Report.__table__, models.AudioReport.__table__,
+               models.Question.__table__]
+
+    def setUp(self):
+        # SQLite stores the Numeric columns as floats
+        warnings.simplefilter('ignore')
+        self.engine = models.base.engine
+        self.bind = models.base.session_maker.kw.get('bind')
+        models.base.bind_engine('sqlite://')
+        models.base.metadata.create_all(models.base.engine, self._tables)
+        # The ARRAY columns of responses can't be created in SQLite
+        models.session.execute('''
+            CREATE TABLE responses (
+                id INTEGER PRIMARY KEY, question_id INTEGER, report_id BLOB,
+                type VARCHAR, boolean_response BOOLEAN,
+                numeric_response FLOAT)''')
+        models.session.add_all([
+            models.Question(id=1, type=5, prompt='How anxious are you?'),
+            models.Question(id=2, type=2, prompt='Are you working?'),
+            models.Question(id=3, type=0, prompt='What are you doing?'),
+            models.Question(id=4, type=5, prompt='How tired are you?')])
+        self.report_ids = [uuid.uuid4() for _ in range(4)]
+        for i, report_id in enumerate(self.report_ids):
+            models.session.add(models.Report(
+                id=report_id, steps=i * 10,
+                created_at=datetime.datetime(2016, 1, 4 - i, 12)))
+        models.session.add(models.AudioReport(
+            id=uuid.uuid4(), report_id=self.report_ids[0], average=-50))
+        for row in [
+                {'question_id': 1, 'report_id': self.report_ids[0],
+                 'type': 'numeric', 'numeric_response': 2.0},
+                {'question_id': 1, 'report_id': self.report_ids[2],
+                 'type': 'numeric', 'numeric_response': 3.0},
+                {'question_id': 2, 'report_id': self.report_ids[1],
+                 'type': 'boolean', 'boolean_response': True},
+                {'question_id': 3, 'report_id': self.report_ids[1],
+                 'type': 'tokens'}]:
+            models.session.execute(models.Response.__table__.insert(), row)
+        models.session.commit()
+
+    def tearDown(self):
+        warnings.resetwarnings()
+        models.session.remove()
+        models.base.engine = self.engine
+        models.session.configure(bind=self.bind)
+        delattr(self, 'engine')
+        delattr(self, 'bind')
+        delattr(self, 'report_ids')
+
+    def test_load_series(self):
+        '''Does load_series() return the creation times in order with a
+        float64 array for each column and prompt, NaN where there's no value?
+        '''
+        timestamps, values = analytics.load_series(
+            ['steps', 'audio.average'],
+            ['How anxious are you?', 'Are you working?'])
+        self.assertEquals(timestamps.dtype, numpy.dtype('datetime64[us]'))
+        self.assertListEqual(timestamps.tolist(), [
+            datetime.datetime(2016, 1, 1 + i, 12) for i in range(4)])
+        self.assertItemsEqual(values.keys(), [
+            'steps', 'audio.average', 'How anxious are you?',
+            'Are you working?'])
+        self.assertEquals(values['steps'].dtype, numpy.float64)
+        numpy.testing.assert_array_equal(
+            values['steps'], [30.0, 20.0, 10.0, 0.0])
+        numpy.testing.assert_array_equal(
+            values['audio.average'], [numpy.nan] * 3 + [-50.0])
+        numpy.testing.assert_array_equal(
+            values['How anxious are you?'], [numpy.nan, 3.0, numpy.nan, 2.0])
+        numpy.testing.assert_array_equal(
+            values['Are you working?'], [numpy.nan, numpy.nan, 1.0,
+                                         numpy.nan])
+
+    def test_load_series_range(self):
+        '''Does load_series() only load the reports created at or after start
+        and before end?
+        '''
+        timestamps, values = analytics.load_series(
+            ['steps'], start=datetime.datetime(2016, 1, 2, 12),
+            end=datetime.datetime(2016, 1, 4))
+        self.assertListEqual(timestamps.tolist(), [
+            datetime.datetime(2016, 1, 2, 12),
+            datetime.datetime(2016, 1, 3, 12)])
+        numpy.testing.assert_array_equal(values['steps'], [20.0, 10.0])
+
+    def test_load_series_empty(self):
+        '''Does load_series() return empty arrays when there are no reports in
+        the range?
+        '''
+        timestamps, values = analytics.load_series(
+            ['steps'], start=datetime.datetime(2017, 1, 1))
+        self.assertEquals(len(timestamps), 0)
+        self.assertEquals(len(values['steps']), 0)
+
+    def test_load_series_no_responses(self):
+        '''Does load_series() load NaN for every report for a question that
+        has no responses yet?
+        '''
+        timestamps, values = analytics.load_series(
+            prompts=['How tired are you?'])
+        numpy.testing.assert_array_equal(
+            values['How tired are you?'], [numpy.nan] * 4)
+
+    def test_load_series_not_numeric(self):
+        '''Does load_series() raise a ValueError for unknown columns, unknown
+        prompts, and questions whose responses aren't numeric?
+        '''
+        self.assertRaises(ValueError, analytics.load_series, ['audio.foo'])
+        self.assertRaises(ValueError, analytics.load_series, ['foo.steps'])
+        self.assertRaises(ValueError, analytics.load_series,
+                          prompts=['What are you doing?'])
+        self.assertRaises(ValueError, analytics.load_series,
+                          prompts=['Who are you with?'])
+
+
+@mock.patch.object(models.session, 'execute')
+class TestAggregates(unittest.TestCase):
+
+    def _sql(self, mock_session_execute):
+        return str(mock_session_execute.call_args[0][0].compile(
+            dialect=postgresql.dialect()))
+
+    def test_summarize(self, mock_session_execute):
+        '''Does summarize() aggregate the numeric responses by period with
+        date_trunc() and percentile_cont() in a single query?
+        '''
+        period = datetime.datetime(2016, 1, 4)
+        mock_session_execute.side_effect = [
+            [(1, 'How anxious are you?', 5)],
+            [(period, 3, 2.0, 1.0, 3.0, 1.5, 2.5)]]
+        self.assertListEqual(analytics.summarize(
+            'How anxious are you?', 'week', percentiles=[0.25, 0.75]), [{
+                'period': period, 'count': 3, 'mean': 2.0, 'min': 1.0,
+                'max': 3.0, 'percentiles': {0.25: 1.5, 0.75: 2.5}}])
+        self.assertEquals(mock_session_execute.call_count, 2)
+        sql = self._sql(mock_session_execute)
+        self.assertIn('date_trunc(', sql)
+        self.assertIn('GROUP BY date_trunc(', sql)
+        self.assertEquals(sql.count('WITHIN GROUP (ORDER BY '
+                                    'responses.numeric_response)'), 2)
+
+    def test_summarize_not_numeric(self, mock_session_execute):
+        '''Does summarize() raise a ValueError for an unknown interval, an
+        unknown prompt, and a question whose responses aren't numeric?
+        '''
+        mock_session_execute.return_value = [
+            (2, 'Are you working?', 2)]
+        self.assertRaises(ValueError, analytics.summarize,
+                          'Are you working?', 'year')
+        self.assertRaises(ValueError, analytics.summarize,
+                          'How anxious are you?')
+        self.assertRaises(ValueError, analytics.summarize,
+                          'Are you working?')
+
+    def test_count_answers(self, mock_session_execute):
+        '''Does count_answers() count each element of the array responses
+        with unnest(), grouping the counts by period?
+        '''
+        periods = [datetime.datetime(2016, 1, 1), datetime.datetime(2016, 2, 1)]
+        mock_session_execute.side_effect = [
+            [(3, 'What are you doing?', 0)],
+            [(periods[0], 'coding', 2), (periods[0], 'tea', 1),
+             (periods[1], 'tea', 4)]]
+        self.assertListEqual(analytics.count_answers(
+            'What are you doing?', 'month'), [
+                {'period': periods[0], 'counts': {'coding': 2, 'tea': 1}},
+                {'period': periods[1], 'counts': {'tea': 4}}])
+        sql = self._sql(mock_session_execute)
+        self.assertIn('unnest(responses.tokens_response) AS answer', sql)
+        self.assertIn('GROUP BY date_trunc(', sql)
+
+    def test_count_answers_boolean(self, mock_session_execute):
+        '''Does count_answers() count boolean responses by value, and only
+        those created in the range?
+        '''
+        mock_session_execute.side_effect = [
+            [(2, 'Are you working?', 2)], []]
+        self.assertListEqual(analytics.count_answers(
+            'Are you working?', start=datetime.datetime(2016, 1, 1),
+            end=datetime.datetime(2016, 2, 1)), [])
+        sql = self._sql(mock_session_execute)
+        self.assertNotIn('unnest', sql)
+        self.assertIn('responses.boolean_response, count(*)', sql)
+        self.assertIn('reports.created_at >= ', sql)
+        self.assertIn('reports.created_at < ', sql)
@@ -13,6 +13,7 @@ class TestModelsBase(unittest.TestCase):
                          'numericResponse': '0'}
         self.report = {
             'uniqueIdentifier': '1B7AADBF-C137-4F35-A099-D73ACE534CFC'}
+        codec.question_cache.invalidate()
 
     def tearDown(self):
         del self.response
@@ -63,3 +64,67 @@ class TestModelsBase(unittest.TestCase):
         self.assertIsInstance(mapper, models.base.ResponseClassLegacyAccessor)
         self.assertDictEqual(ids, {
             'question_id': 1, 'report_id': self.report['uniqueIdentifier']})
+
+    @mock.patch.object(query.Query, 'first')
+    @mock.patch.object(query.Query, 'filter', return_value=query.Query(
+        models.Question))
+    @mock.patch.object(
+        models.session, 'query', return_value=query.Query(models.Question))
+    def test_get_response_accessor_cached(
+            self, mock_session_query, mock_query_filter, mock_query_first):
+        '''Does get_response_accessor() only query the question for a prompt
+        the first time that prompt is seen?
+        '''
+        mock_query_first.return_value = (1, 5)
+        codec.get_response_accessor(self.response, self.report)
+        mapper, ids = codec.get_response_accessor(self.response, self.report)
+        self.assertEquals(mock_session_query.call_count, 1)
+        self.assertEqual(mapper, codec.numeric_accessor)
+        self.assertEquals(ids['question_id'], 1)
+
+
+class TestQuestionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = codec.QuestionCache()
+
+    def tearDown(self):
+        del self.cache
+
+    @mock.patch.object(models.session, 'query')
+    def test_load(self, mock_session_query):
+        '''Does load() cache every question with one query, and then treat
+        unknown prompts as missing without querying again?
+        '''
+        mock_session_query.return_value = [(1, 5, 'foo'), (2, 2, 'bar')]
+        self.cache.load()
+        self.assertEqual(self.cache.get('foo'), (1, 5, codec.numeric_accessor))
+        self.assertEqual(self.cache.get('bar'), (2, 2, codec.boolean_accessor))
+        self.assertIsNone(self.cache.get('baz'))
+        self.assertEquals(mock_session_query.call_count, 1)
+
+    @mock.patch.object(query.Query, 'first', return_value=None)
+    @mock.patch.object(query.Query, 'filter', return_value=query.Query(
+        models.Question))
+    @mock.patch.object(
+        models.session, 'query', return_value=query.Query(models.Question))
+    def test_get_does_not_exist(
+            self, mock_session_query, mock_query_filter, mock_query_first):
+        '''Does get() return None if there is no question with the prompt?
+        '''
+        self.assertIsNone(self.cache.get('foo'))
+        self.assertTrue(mock_query_first.called)
+
+    @mock.patch.object(models.session, 'query')
+    def test_invalidate(self, mock_session_query):
+        '''Does invalidate() remove a single prompt, or every prompt, from the
+        cache so that it is looked up again?
+        '''
+        mock_session_query.return_value = [(1, 5, 'foo'), (2, 2, 'bar')]
+        self.cache.load()
+        self.cache.invalidate('foo')
+        self.assertNotIn('foo', self.cache._questions)
+        self.assertIn('bar', self.cache._questions)
+        self.assertFalse(self.cache._loaded)
+        self.cache.invalidate()
+        self.assertDictEqual(self.cache._questions, {})
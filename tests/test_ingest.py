@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+
+import mock
+import os
+import tempfile
+import unittest
+import uuid
+from datums import models
+from datums import pipeline
+from datums import queries
+from datums import stats
+from datums.pipeline import ingest, reader
+
+
+@mock.patch.object(reader, 'iter_snapshots')
+class TestProcessFile(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshots = [{'uniqueIdentifier': uuid.uuid4(), 'responses': []}
+                          for _ in range(3)]
+
+    def tearDown(self):
+        delattr(self, 'snapshots')
+
+    @mock.patch.object(pipeline.SnapshotPipeline, 'add')
+    def test_process_file_add(self, mock_add, mock_iter_snapshots):
+        '''Does process_file() add every snapshot in the file and count them?
+        '''
+        mock_iter_snapshots.return_value = iter(self.snapshots)
+        summary = ingest.process_file('foo.json', 'add')
+        mock_iter_snapshots.assert_called_once_with('foo.json')
+        self.assertEquals(mock_add.call_count, 3)
+        self.assertDictEqual(summary, {
+            'files': 1, 'snapshots': 3, 'skipped': 0, 'existing': 0,
+            'unchanged': 0, 'changed': 0, 'new': 0, 'deleted': 0,
+            'failed': [], 'errors': []})
+
+    @mock.patch.object(models, 'refresh_rollups')
+    @mock.patch.object(pipeline, 'touch_stored')
+    @mock.patch.object(pipeline.SnapshotPipeline, 'update')
+    def test_process_file_refresh_rollups(
+            self, mock_update, mock_touch_stored, mock_refresh_rollups,
+            mock_iter_snapshots):
+        '''Does process_file() mark the days the updated reports were stored
+        under, and refresh the rollups once for the whole file?
+        '''
+        mock_iter_snapshots.return_value = iter(self.snapshots)
+        mock_touch_stored.side_effect = (lambda snapshots, batch_size:
+                                         snapshots)
+        ingest.process_file('foo.json', 'update')
+        self.assertEquals(mock_touch_stored.call_count, 1)
+        self.assertEquals(mock_update.call_count, 3)
+        mock_refresh_rollups.assert_called_once_with()
+
+    @mock.patch.object(pipeline.BulkSnapshotPipeline, 'add')
+    def test_process_file_bulk(self, mock_bulk_add, mock_iter_snapshots):
+        '''Does process_file() use a BulkSnapshotPipeline when bulk is True?
+        '''
+        mock_iter_snapshots.return_value = iter(self.snapshots)
+        ingest.process_file('foo.json', 'add', bulk=True)
+        self.assertEquals(mock_bulk_add.call_count, 1)
+
+    @mock.patch.object(pipeline.SnapshotBatchPipeline, 'update')
+    def test_process_file_batch_failed(
+            self, mock_batch_update, mock_iter_snapshots):
+        '''Does process_file() use a SnapshotBatchPipeline when batch_size is
+        specified, and report the snapshots that failed?
+        '''
+        mock_iter_snapshots.return_value = iter(self.snapshots)
+        mock_batch_update.return_value = [('foo', ValueError('bar'))]
+        summary = ingest.process_file('foo.json', 'update', batch_size=10)
+        self.assertListEqual(
+            summary['failed'], [('foo', "ValueError('bar',)")])
+
+    @mock.patch.object(pipeline.ConcurrentSnapshotPipeline, 'add')
+    def test_process_file_concurrency(self, mock_concurrent_add,
+                                      mock_iter_snapshots):
+        '''Does process_file() use a ConcurrentSnapshotPipeline when
+        concurrency is greater than 1, and report the snapshots that failed?
+        '''
+        mock_iter_snapshots.return_value = iter(self.snapshots)
+        mock_concurrent_add.return_value = [('foo', ValueError('bar'))]
+        summary = ingest.process_file('foo.json', 'add', concurrency=4)
+        self.assertEquals(mock_concurrent_add.call_count, 1)
+        self.assertListEqual(
+            summary['failed'], [('foo', "ValueError('bar',)")])
+
+    @mock.patch.object(pipeline.BulkSnapshotPipeline, 'delete')
+    def test_process_file_delete(self, mock_bulk_delete, mock_iter_snapshots):
+        '''Does process_file() delete the snapshots in the file with a
+        BulkSnapshotPipeline and count the reports deleted?
+        '''
+        mock_iter_snapshots.return_value = iter(self.snapshots)
+        mock_bulk_delete.return_value = 3
+        summary = ingest.process_file('foo.json', 'delete')
+        self.assertEquals(mock_bulk_delete.call_count, 1)
+        self.assertEquals(summary['deleted'], 3)
+
+    @mock.patch.object(pipeline, 'changed_snapshots')
+    @mock.patch.object(pipeline.SnapshotPipeline, 'update')
+    def test_process_file_changed_only(self, mock_update,
+                                       mock_changed_snapshots,
+                                       mock_iter_snapshots):
+        '''Does process_file() only update the changed snapshots if
+        changed_only is True, and count the unchanged, changed, and new
+        snapshots?
+        '''
+        mock_iter_snapshots.return_value = iter(self.snapshots)
+
+        def changed_snapshots(snapshots, counts, batch_size):
+            for snapshot in snapshots:
+                counts['unchanged'] += 1
+            counts.update({'unchanged': -1, 'changed': 1})
+            yield snapshot
+        mock_changed_snapshots.side_effect = changed_snapshots
+        summary = ingest.process_file(
+            'foo.json', 'update', changed_only=True)
+        self.assertEquals(mock_update.call_count, 1)
+        self.assertEquals(summary['snapshots'], 3)
+        self.assertEquals(summary['unchanged'], 2)
+        self.assertEquals(summary['changed'], 1)
+
+    @mock.patch.object(pipeline, 'new_snapshots')
+    @mock.patch.object(pipeline.SnapshotPipeline, 'add')
+    def test_process_file_add_new_only(self, mock_add, mock_new_snapshots,
+                                       mock_iter_snapshots):
+        '''Does process_file() only add the snapshots whose reports don't
+        exist yet if changed_only is True, using the known reports it's given?
+        '''
+        mock_iter_snapshots.return_value = iter(self.snapshots)
+        known_reports = pipeline.KnownReports()
+
+        def new_snapshots(snapshots, counts, known, batch_size):
+            self.assertIs(known, known_reports)
+            snapshots = list(snapshots)
+            counts.update({'existing': 2, 'new': 1})
+            return iter(snapshots[:1])
+        mock_new_snapshots.side_effect = new_snapshots
+        summary = ingest.process_file('foo.json', 'add', changed_only=True,
+                                      known_reports=known_reports)
+        self.assertEquals(mock_add.call_count, 1)
+        self.assertEquals(summary['existing'], 2)
+        self.assertEquals(summary['new'], 1)
+
+    @mock.patch.object(ingest, 'record_file')
+    @mock.patch.object(ingest, 'fingerprint')
+    @mock.patch.object(pipeline.SnapshotPipeline, 'add')
+    def test_process_file_manifest(self, mock_add, mock_fingerprint,
+                                   mock_record_file, mock_iter_snapshots):
+        '''Does process_file() record the file's fingerprint from before it
+        was read if manifest is True?
+        '''
+        mock_iter_snapshots.return_value = iter(self.snapshots)
+        mock_fingerprint.return_value = {'path': '/foo.json'}
+        ingest.process_file('foo.json', 'add', manifest=True)
+        mock_fingerprint.assert_called_once_with('foo.json')
+        mock_record_file.assert_called_once_with({'path': '/foo.json'})
+
+    @mock.patch.object(ingest, 'record_file')
+    @mock.patch.object(ingest, 'fingerprint')
+    @mock.patch.object(pipeline.SnapshotBatchPipeline, 'add')
+    def test_process_file_manifest_failed(
+            self, mock_batch_add, mock_fingerprint, mock_record_file,
+            mock_iter_snapshots):
+        '''Does process_file() leave the file out of the manifest if any
+        snapshot failed?
+        '''
+        mock_iter_snapshots.return_value = iter(self.snapshots)
+        mock_batch_add.return_value = [('foo', ValueError('bar'))]
+        ingest.process_file('foo.json', 'add', batch_size=10, manifest=True)
+        mock_record_file.assert_not_called()
+
+    @mock.patch.object(models, 'refresh_rollups')
+    @mock.patch.object(ingest, 'forget_file')
+    @mock.patch.object(ingest, 'fingerprint')
+    @mock.patch.object(pipeline.BulkSnapshotPipeline, 'delete')
+    def test_process_file_manifest_delete(
+            self, mock_bulk_delete, mock_fingerprint, mock_forget_file,
+            mock_refresh_rollups, mock_iter_snapshots):
+        '''Does process_file() remove a deleted file from the manifest?
+        '''
+        mock_iter_snapshots.return_value = iter(self.snapshots)
+        mock_bulk_delete.return_value = 3
+        ingest.process_file('foo.json', 'delete', manifest=True)
+        self.assertEquals(mock_bulk_delete.call_count, 1)
+        mock_fingerprint.assert_not_called()
+        mock_forget_file.assert_called_once_with('foo.json')
+
+
+@mock.patch.object(models.session, 'commit')
+@mock.patch.object(models.session, 'query')
+class TestManifest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            f.write('{"snapshots": []}')
+        self.entry = models.IngestedFile(**ingest.fingerprint(self.path))
+
+    def tearDown(self):
+        os.remove(self.path)
+        del self.path, self.entry
+
+    def test_fingerprint(self, mock_query, mock_commit):
+        '''Does fingerprint() return the absolute path, size, modification
+        time, and SHA-1 of the file?
+        '''
+        self.assertDictEqual(ingest.fingerprint(self.path), {
+            'path': os.path.abspath(self.path), 'size': 17,
+            'mtime': os.stat(self.path).st_mtime,
+            'sha1': 'a7d4aadf7d85ad5b04f5ed0e8bab6855cfe56b2c'})
+
+    def test_is_unchanged_new(self, mock_query, mock_commit):
+        '''Does is_unchanged() return False for a file that isn't in the
+        manifest?
+        '''
+        mock_query.return_value.get.return_value = None
+        self.assertFalse(ingest.is_unchanged(self.path))
+        mock_query.return_value.get.assert_called_once_with(
+            os.path.abspath(self.path))
+
+    @mock.patch.object(ingest, '_sha1')
+    def test_is_unchanged_stat(self, mock_sha1, mock_query, mock_commit):
+        '''Does is_unchanged() return True without reading the file if its
+        size and modification time match the manifest?
+        '''
+        mock_query.return_value.get.return_value = self.entry
+        self.assertTrue(ingest.is_unchanged(self.path))
+        mock_sha1.assert_not_called()
+
+    def test_is_unchanged_touched(self, mock_query, mock_commit):
+        '''Does is_unchanged() return True and refresh the modification time
+        if the file was touched without changing its contents?
+        '''
+        self.entry.mtime -= 60
+        mock_query.return_value.get.return_value = self.entry
+        self.assertTrue(ingest.is_unchanged(self.path))
+        self.assertEquals(self.entry.mtime, os.stat(self.path).st_mtime)
+        self.assertTrue(mock_commit.called)
+
+    def test_is_unchanged_modified(self, mock_query, mock_commit):
+        '''Does is_unchanged() return False if the file's contents changed?
+        '''
+        with open(self.path, 'w') as f:
+            f.write('{"snapshots": [{}]}')
+        mock_query.return_value.get.return_value = self.entry
+        self.assertFalse(ingest.is_unchanged(self.path))
+        self.entry.size = os.stat(self.path).st_size
+        self.entry.mtime -= 60
+        self.assertFalse(ingest.is_unchanged(self.path))
+
+
+class TestProcessFiles(unittest.TestCase):
+
+    @mock.patch.object(ingest, 'process_file')
+    @mock.patch.object(ingest, 'add_questions')
+    def test_process_files_add(self, mock_add_questions, mock_process_file):
+        '''Does process_files() add the questions in every file before any
+        snapshots, and merge the summaries for each file?
+        '''
+        calls = []
+        mock_add_questions.side_effect = (lambda path: calls.append('q'))
+
+        def process_file(*args, **kwargs):
+            calls.append('s')
+            summary = ingest._summary(files=1, snapshots=2)
+            summary['failed'].append(('foo', 'bar'))
+            return summary
+        mock_process_file.side_effect = process_file
+        summary = ingest.process_files(['a.json', 'b.json'], 'add')
+        self.assertListEqual(calls, ['q', 'q', 's', 's'])
+        self.assertDictEqual(summary, {
+            'files': 2, 'snapshots': 4, 'skipped': 0, 'existing': 0,
+            'unchanged': 0, 'changed': 0, 'new': 0, 'deleted': 0,
+            'errors': [],
+            'failed': [('foo', 'bar'), ('foo', 'bar')]})
+
+    @mock.patch.object(ingest, 'process_file')
+    @mock.patch.object(ingest, 'add_questions')
+    def test_process_files_delete(
+            self, mock_add_questions, mock_process_file):
+        '''Does process_files() skip the questions when deleting?
+        '''
+        mock_process_file.return_value = ingest._summary(files=1)
+        ingest.process_files(['a.json'], 'delete')
+        mock_add_questions.assert_not_called()
+        mock_process_file.assert_called_once_with(
+            'a.json', 'delete', False, None, False, False, 1, False,
+            known_reports=mock.ANY)
+
+    @mock.patch.object(ingest, 'process_file')
+    @mock.patch.object(ingest, 'add_questions')
+    @mock.patch.object(ingest, 'is_unchanged')
+    def test_process_files_manifest(
+            self, mock_is_unchanged, mock_add_questions, mock_process_file):
+        '''Does process_files() skip the files that are unchanged since they
+        were last ingested if manifest is True?
+        '''
+        mock_is_unchanged.side_effect = (lambda path: path == 'a.json')
+        mock_process_file.return_value = ingest._summary(files=1)
+        summary = ingest.process_files(
+            ['a.json', 'b.json'], 'add', manifest=True)
+        mock_add_questions.assert_called_once_with('b.json')
+        mock_process_file.assert_called_once_with(
+            'b.json', 'add', False, None, True, False, 1, False,
+            known_reports=mock.ANY)
+        self.assertEquals(summary['skipped'], 1)
+        self.assertEquals(summary['files'], 1)
+
+    @mock.patch.object(ingest.multiprocessing, 'Pool')
+    def test_process_files_workers_engine(self, mock_pool):
+        '''Do the worker processes connect to the database this process is
+        bound to, even if it's not the one in DATABASE_URI?
+        '''
+        self.addCleanup(models.session.configure,
+                        bind=models.base.session_maker.kw.get('bind'))
+        self.addCleanup(setattr, models.base, 'engine', models.base.engine)
+        models.base.bind_engine('sqlite:///foo.db')
+        mock_pool.return_value.imap_unordered.return_value = [
+            ingest._summary(files=1), ingest._summary(files=1)]
+        summary = ingest.process_files(
+            ['a.json', 'b.json'], 'delete', workers=2)
+        mock_pool.assert_called_once_with(
+            2, ingest._init_worker, ('sqlite:///foo.db',))
+        self.assertEquals(summary['files'], 2)
+        with mock.patch.object(models.base, 'bind_engine') as mock_bind:
+            ingest._init_worker('sqlite:///foo.db')
+        mock_bind.assert_called_once_with('sqlite:///foo.db')
+
+    @mock.patch.object(stats, 'enabled', True)
+    @mock.patch.object(ingest, 'process_file')
+    def test_process_file_in_worker_stats(self, mock_process_file):
+        '''Does a worker return the statistics it collected for the file with
+        the summary, and does merging the summary add them to this process?
+        '''
+        mock_process_file.return_value = ingest._summary(files=1)
+        stats.reset()
+        stats.count('snapshots', 3)
+        summary = ingest._process_file_in_worker(('a.json', 'add'))
+        self.assertEquals(summary['stats']['counts'], {'snapshots': 3})
+        self.assertDictEqual(stats.as_dict()['counts'], {})
+        ingest._merge(ingest._summary(), summary)
+        self.assertNotIn('stats', summary)
+        self.assertDictEqual(stats.as_dict()['counts'], {'snapshots': 3})
+        stats.reset()
+
+    @mock.patch.object(ingest, 'process_file')
+    def test_process_file_in_worker_flagged(self, mock_process_file):
+        '''Does a worker return the operations it flagged for using too many
+        statements, and does merging the summary add them to this process?
+        '''
+        self.addCleanup(queries.unwatch)
+        flagged = ('add', 'foo', {'statements': 9, 'selects': 2,
+                                  'commits': 1, 'seconds': 0.1})
+        mock_process_file.return_value = ingest._summary(files=1)
+        queries.flagged.append(flagged)
+        summary = ingest._process_file_in_worker(('a.json', 'add'))
+        self.assertListEqual(summary['flagged'], [flagged])
+        self.assertListEqual(queries.flagged, [])
+        ingest._merge(ingest._summary(), summary)
+        self.assertNotIn('flagged', summary)
+        self.assertListEqual(queries.flagged, [flagged])
+
+    @mock.patch.object(models.session, 'rollback')
+    @mock.patch.object(ingest, 'process_file')
+    def test_process_file_in_worker_error(
+            self, mock_process_file, mock_rollback):
+        '''Does a file that fails in a worker get reported in the summary's
+        errors instead of raising?
+        '''
+        mock_process_file.side_effect = ValueError('foo')
+        summary = ingest._process_file_in_worker(
+            ('a.json', 'add', False, None))
+        self.assertListEqual(
+            summary['errors'], [('a.json', "ValueError('foo',)")])
+        self.assertEquals(summary['files'], 1)
+        self.assertTrue(mock_rollback.called)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import unittest
+import uuid
+import warnings
+from datums import models
+from datums.pipeline import mappers
+
+
+class TestTranslator(unittest.TestCase):
+
+    def setUp(self):
+        self.report = {'uniqueIdentifier': str(uuid.uuid4()).upper(),
+                       'date': '2016-01-24T21:40:26-0500', 'draft': 0,
+                       'battery': 0.89, 'steps': 12,
+                       'audio': {'avg': -59.8, 'peak': -57}}
+        mappers.unsupported_keys.clear()
+
+    def tearDown(self):
+        del self.report
+        mappers.unsupported_keys.clear()
+
+    def test_translators(self):
+        '''Is there a translator for every model in _model_type_mapper, compiled
+        from the key mapper for that level of a report?
+        '''
+        self.assertSetEqual(set(mappers.translators),
+                            set(mappers._model_type_mapper))
+        self.assertIs(mappers.translators['report'].key_mapper,
+                      mappers._report_key_mapper)
+        self.assertIs(mappers.translators['placemark'].key_mapper,
+                      mappers._report_key_mapper['location']['placemark'])
+        for level, translator in mappers.translators.items():
+            self.assertIs(mappers.get_translator(translator.key_mapper),
+                          translator)
+
+    def test_translator_report(self):
+        '''Does the translator turn the top level of a report into **kwargs
+        with the datums attribute names and types, ignoring nested levels?
+        '''
+        kwargs = mappers.translators['report'](self.report)
+        self.assertDictEqual(kwargs, {
+            'id': uuid.UUID(self.report['uniqueIdentifier']),
+            'created_at': datetime.datetime(2016, 1, 24, 21, 40, 26),
+            'draft': False, 'battery': 0.89, 'steps': 12})
+        models.Report(**kwargs)
+
+    def test_translator_unsupported_keys(self):
+        '''Does the translator count unsupported keys, warning only the first
+        time each one is seen?
+        '''
+        self.report['foo'] = 'bar'
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            for _ in range(3):
+                kwargs = mappers.translators['report'](self.report)
+            self.assertEquals(len(w), 1)
+        self.assertNotIn('foo', kwargs)
+        self.assertEquals(mappers.unsupported_keys['foo'], 3)
+
+    def test_get_translator_custom_key_mapper(self):
+        '''Does get_translator() compile a key mapper it hasn't seen before,
+        and only once?
+        '''
+        key_mapper = {'avg': 'average', 'peak': 'peak'}
+        translator = mappers.get_translator(key_mapper)
+        self.assertIs(mappers.get_translator(key_mapper), translator)
+        self.assertDictEqual(translator(self.report['audio']),
+                             {'average': -59.8, 'peak': -57})
+
+
+class TestParseTimestamp(unittest.TestCase):
+
+    def test_parse_timestamp_matches_dateutil(self):
+        '''Does parse_timestamp() return the same datetime as
+        dateutil.parser.parse with ignoretz=True?
+        '''
+        for timestr in ['2016-01-24T21:40:26-0500', '2015-05-01T00:00:00+0100',
+                        '2016-02-29T23:59:59-05:00', '2016-01-24T21:40:26Z',
+                        '2016-01-24T21:40:26', '2016-01-24T21:40:26.5-0500',
+                        '2016-01-24T21:40:26.123456789+0000',
+                        '2016-01-24T21:40:26+05']:
+            self.assertEqual(mappers.parse_timestamp(timestr),
+                             mappers.parse(timestr, ignoretz=True))
+
+    def test_parse_timestamp_fallback(self):
+        '''Does parse_timestamp() fall back to dateutil.parser.parse for other
+        layouts?
+        '''
+        for timestr in ['Jan 24 2016 9:40 PM', '2016-01-24 21:40:26',
+                        '24/01/2016']:
+            self.assertEqual(mappers.parse_timestamp(timestr),
+                             mappers.parse(timestr, ignoretz=True))
+        with self.assertRaises(ValueError):
+            mappers.parse_timestamp('2016-02-30T21:40:26-0500')
@@ -1,12 +1,30 @@
 # -*- coding: utf-8 -*-
 
+import datetime
 import mock
+import os
 import random
 import unittest
+import uuid
+import warnings
 from datums import models
+from datums import queries
+from datums.pipeline import codec
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.orm import query
 
 
+def _compile(statement):
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+# A legacy response with a value for every response type
+_legacy_response = {
+    'tokens': [{'text': 'coding'}], 'answeredOptions': ['Yes'],
+    'locationResponse': {'text': 'Home', 'foursquareVenueId': 'foo'},
+    'numericResponse': '1', 'textResponses': [{'text': 'note'}]}
+
+
 class TestModelsBase(unittest.TestCase):
 
     def setUp(self):
@@ -15,15 +33,49 @@ class TestModelsBase(unittest.TestCase):
     def tearDown(self):
         del self.GhostBaseInstance
 
+    @mock.patch.object(models.base, 'create_engine')
+    def test_get_engine_lazy(self, mock_create_engine):
+        '''Does get_engine() create the engine only once, and does a session
+        without a bind get bound to it the first time it needs one?
+        '''
+        with mock.patch.object(models.base, 'engine', None):
+            session = models.base.session_maker()
+            self.assertIsNone(session.bind)
+            mock_create_engine.assert_not_called()
+            self.assertIs(
+                models.base.get_engine(), mock_create_engine.return_value)
+            models.base.get_engine()
+            self.assertIsNone(session.bind)
+            self.assertIs(
+                session.get_bind(), mock_create_engine.return_value)
+            mock_create_engine.assert_called_once_with(
+                os.environ['DATABASE_URI'])
+
     @mock.patch.object(models.base.metadata, 'create_all')
     def test_database_setup(self, mock_create_all):
-        models.base.database_setup(models.engine)
-        mock_create_all.assert_called_once_with(models.engine)
+        models.base.database_setup(models.get_engine())
+        mock_create_all.assert_called_once_with(models.get_engine())
 
     @mock.patch.object(models.base.metadata, 'drop_all')
     def test_database_teardown(self, mock_drop_all):
-        models.base.database_teardown(models.engine)
-        mock_drop_all.assert_called_once_with(models.engine)
+        models.base.database_teardown(models.get_engine())
+        mock_drop_all.assert_called_once_with(models.get_engine())
+
+    def test_lookup_indexes(self):
+        '''Are the columns the pipeline looks rows up by indexed, and are
+        question prompts and the responses to each question in a report
+        unique?
+        '''
+        indexes = dict((tuple(c.name for c in index.columns), index.unique)
+                       for table in models.base.metadata.sorted_tables
+                       for index in table.indexes)
+        self.assertTrue(indexes[('prompt',)])
+        self.assertTrue(indexes[('report_id', 'question_id')])
+        self.assertFalse(indexes[('created_at',)])
+        self.assertFalse(indexes[('location_report_id',)])
+        for model in (models.AltitudeReport, models.AudioReport,
+                      models.LocationReport, models.WeatherReport):
+            self.assertTrue(model.__table__.c.report_id.index)
 
     @mock.patch.object(models.session, 'commit')
     @mock.patch.object(models.session, 'add')
@@ -39,7 +91,58 @@ class TestModelsBase(unittest.TestCase):
         mock_session_add.assert_called_once_with(obj)
         self.assertTrue(mock_session_commit.called)
 
+    @mock.patch.object(models.session, 'flush')
+    @mock.patch.object(models.session, 'commit')
+    @mock.patch.object(models.session, 'add')
+    def test_action_and_commit_unit_of_work(
+            self, mock_session_add, mock_session_commit, mock_session_flush):
+        '''Does the _action_and_commit() method flush instead of commit the
+        session inside a unit_of_work(), and commit once at the end?
+        '''
+        obj = models.Report()
+        with models.base.unit_of_work():
+            models.base._action_and_commit(obj, mock_session_add)
+            models.base._action_and_commit(obj, mock_session_add)
+            self.assertEquals(mock_session_flush.call_count, 2)
+            mock_session_commit.assert_not_called()
+        mock_session_commit.assert_called_once_with()
+        self.assertNotIn('unit_of_work', models.session.info)
+
+    @mock.patch.object(models.session, 'rollback')
+    @mock.patch.object(models.session, 'commit')
+    def test_unit_of_work_nested(
+            self, mock_session_commit, mock_session_rollback):
+        '''Does a unit_of_work() inside another one leave committing and
+        rolling back to the outer one?
+        '''
+        with models.base.unit_of_work():
+            with models.base.unit_of_work():
+                pass
+            mock_session_commit.assert_not_called()
+            with self.assertRaises(ValueError):
+                with models.base.unit_of_work():
+                    raise ValueError
+            mock_session_rollback.assert_not_called()
+            self.assertTrue(models.session.info.get('unit_of_work'))
+        mock_session_commit.assert_called_once_with()
+        self.assertNotIn('unit_of_work', models.session.info)
+
+    @mock.patch.object(models.session, 'rollback')
+    @mock.patch.object(models.session, 'commit')
+    def test_unit_of_work_rollback(
+            self, mock_session_commit, mock_session_rollback):
+        '''Does unit_of_work() roll back the session and re-raise if the block
+        raises?
+        '''
+        with self.assertRaises(ValueError):
+            with models.base.unit_of_work():
+                raise ValueError
+        mock_session_commit.assert_not_called()
+        self.assertTrue(mock_session_rollback.called)
+        self.assertNotIn('unit_of_work', models.session.info)
 
+
+@mock.patch.object(models.base, '_is_postgresql', new=(lambda: False))
 @mock.patch.object(query.Query, 'first')
 @mock.patch.object(query.Query, 'filter_by', return_value=query.Query(
     models.Report))
@@ -107,6 +210,8 @@ class TestGhostBase(unittest.TestCase):
         existing instance of the class and add it to the session?
         '''
         _ = models.Report
+        # update() sets id on the class itself; put the column back afterwards
+        self.addCleanup(setattr, _, 'id', _.__dict__['id'])
         mock_query_first.return_value = _
         self.GhostBaseInstance.update(**{'id': 'bar'})
         self.assertTrue(hasattr(_, 'id'))
@@ -147,6 +252,248 @@ class TestGhostBase(unittest.TestCase):
         mock_action_commit.assert_not_called()
 
 
+@mock.patch.object(models.base, '_is_postgresql', new=(lambda: True))
+@mock.patch.object(models.session, 'commit')
+@mock.patch.object(models.session, 'execute')
+@mock.patch.object(models.session, 'query')
+class TestGhostBasePostgreSQL(unittest.TestCase):
+
+    def setUp(self):
+        self.id = uuid.uuid4()
+
+    def tearDown(self):
+        del self.id
+
+    def test_get_or_create(
+            self, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Does the get_or_create() method issue a single INSERT ... ON
+        CONFLICT DO NOTHING statement, without querying, if an id is specified?
+        '''
+        q = models.Report.get_or_create(**{'id': self.id, 'steps': 1})
+        self.assertIsInstance(q, models.Report)
+        self.assertEquals(q.steps, 1)
+        mock_session_query.assert_not_called()
+        self.assertEquals(mock_session_execute.call_count, 1)
+        self.assertIn('ON CONFLICT (id) DO NOTHING',
+                      _compile(mock_session_execute.call_args[0][0]))
+        mock_session_commit.assert_called_once_with()
+
+    def test_update(
+            self, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Does the update() method issue a single INSERT ... ON CONFLICT DO
+        UPDATE statement that sets every column but the id?
+        '''
+        models.Report.update(**{'id': self.id, 'steps': 1, 'battery': 0.5})
+        mock_session_query.assert_not_called()
+        self.assertEquals(mock_session_execute.call_count, 1)
+        sql = _compile(mock_session_execute.call_args[0][0])
+        self.assertIn('ON CONFLICT (id) DO UPDATE SET', sql)
+        self.assertIn('steps = excluded.steps', sql)
+        self.assertIn('battery = excluded.battery', sql)
+        self.assertNotIn('id = excluded.id', sql)
+        mock_session_commit.assert_called_once_with()
+
+    @mock.patch.object(models.session, 'add')
+    def test_question_get_or_create(
+            self, mock_session_add, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Does the get_or_create() method on Question insert the question
+        with ON CONFLICT (prompt) DO NOTHING and look it up by prompt only,
+        leaving a question whose type hasn't changed alone?
+        '''
+        question = models.Question(id=1, type=5, prompt='Are you working?')
+        mock_filter_by = mock_session_query.return_value.filter_by
+        mock_filter_by.return_value.first.return_value = question
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertIs(models.Question.get_or_create(
+                type=5, prompt='Are you working?'), question)
+        self.assertListEqual(caught, [])
+        self.assertIn('ON CONFLICT (prompt) DO NOTHING',
+                      _compile(mock_session_execute.call_args[0][0]))
+        mock_filter_by.assert_called_once_with(prompt='Are you working?')
+        mock_session_add.assert_not_called()
+
+    @mock.patch.object(models.session, 'add')
+    def test_question_get_or_create_type_changed(
+            self, mock_session_add, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Does the get_or_create() method on Question replace the type of a
+        stored question whose type has changed, with a warning, instead of
+        violating the unique prompt?
+        '''
+        question = models.Question(id=1, type=5, prompt='Are you working?')
+        mock_session_query.return_value.filter_by.return_value.first\
+            .return_value = question
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertIs(models.Question.get_or_create(
+                type=2, prompt='Are you working?'), question)
+        self.assertEquals(len(caught), 1)
+        self.assertEquals(question.id, 1)
+        self.assertEquals(question.type, 2)
+        mock_session_add.assert_called_once_with(question)
+
+    def test_delete_many(
+            self, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Does the delete_many() method issue a single DELETE ... WHERE id =
+        ANY(...) statement with the ids in one array parameter?
+        '''
+        mock_session_execute.return_value.rowcount = 2
+        self.assertEquals(
+            models.Report.delete_many([self.id, uuid.uuid4()]), 2)
+        mock_session_query.assert_not_called()
+        self.assertEquals(mock_session_execute.call_count, 1)
+        self.assertEquals(
+            _compile(mock_session_execute.call_args[0][0]),
+            'DELETE FROM reports WHERE reports.id = '
+            'ANY (CAST(%(param_1)s AS UUID[]))')
+        mock_session_commit.assert_called_once_with()
+
+    def test_delete_many_empty(
+            self, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Does the delete_many() method do nothing if there are no ids?
+        '''
+        self.assertEquals(models.Report.delete_many(iter([])), 0)
+        mock_session_execute.assert_not_called()
+
+    def test_delete_many_returning(
+            self, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Does the delete_many() method return the values of the returning
+        column for the deleted records from the same DELETE statement?
+        '''
+        created_at = datetime.datetime(2016, 1, 24, 9)
+        mock_session_execute.return_value = [(created_at,), (created_at,)]
+        self.assertListEqual(models.Report.delete_many(
+            [self.id, uuid.uuid4()], returning='created_at'),
+            [created_at, created_at])
+        self.assertEquals(mock_session_execute.call_count, 1)
+        self.assertEquals(
+            _compile(mock_session_execute.call_args[0][0]),
+            'DELETE FROM reports WHERE reports.id = '
+            'ANY (CAST(%(param_1)s AS UUID[])) RETURNING reports.created_at')
+        mock_session_commit.assert_called_once_with()
+        self.assertListEqual(models.Report.delete_many(
+            [], returning='created_at'), [])
+
+    def test_delete_range(
+            self, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Does the delete_range() method on Report issue a single DELETE
+        statement for the reports created from start up to end?
+        '''
+        mock_session_execute.return_value.rowcount = 3
+        self.assertEquals(models.Report.delete_range(
+            datetime.datetime(2016, 1, 1), datetime.datetime(2016, 2, 1)), 3)
+        self.assertEquals(
+            _compile(mock_session_execute.call_args[0][0]),
+            'DELETE FROM reports WHERE reports.created_at >= '
+            '%(created_at_1)s AND reports.created_at < %(created_at_2)s')
+        mock_session_commit.assert_called_once_with()
+
+    def test_legacy_response_get_or_create(
+            self, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Does get_or_create_from_legacy_response() issue a single statement
+        that fills in empty value columns of an existing response, or inserts
+        a new one?
+        '''
+        accessor = models.base.LocationResponseClassLegacyAccessor(
+            models.LocationResponse, 'location_response',
+            (lambda x: x['text']), 'venue_id', (lambda x: x['venue']))
+        accessor.get_or_create_from_legacy_response(
+            {'text': 'Home', 'venue': 'foo'},
+            **{'question_id': 1, 'report_id': self.id})
+        mock_session_query.assert_not_called()
+        self.assertEquals(mock_session_execute.call_count, 1)
+        sql = _compile(mock_session_execute.call_args[0][0])
+        self.assertTrue(sql.startswith('INSERT INTO responses'))
+        self.assertIn('ON CONFLICT (report_id, question_id) DO UPDATE', sql)
+        self.assertIn('location_response = coalesce(', sql)
+        self.assertIn('venue_id = coalesce(', sql)
+        mock_session_commit.assert_called_once_with()
+
+    def test_legacy_response_update(
+            self, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Does update() on a ResponseClassLegacyAccessor issue a single
+        statement that overwrites the type and value columns of an existing
+        response, or inserts a new one?
+        '''
+        accessor = models.base.ResponseClassLegacyAccessor(
+            models.NumericResponse, 'numeric_response', (lambda x: x['foo']))
+        accessor.update({'foo': 1.0}, **{'question_id': 1,
+                                          'report_id': self.id})
+        mock_session_query.assert_not_called()
+        self.assertEquals(mock_session_execute.call_count, 1)
+        sql = _compile(mock_session_execute.call_args[0][0])
+        self.assertTrue(sql.startswith('INSERT INTO responses'))
+        self.assertIn('ON CONFLICT (report_id, question_id) DO UPDATE SET '
+                      'type = excluded.type', sql)
+        self.assertIn('numeric_response = excluded.numeric_response', sql)
+        mock_session_commit.assert_called_once_with()
+
+    def test_legacy_response_statements_per_type(
+            self, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Do adding and updating a response of each type take one statement
+        and one commit, with the value columns set in the INSERT?
+        '''
+        for response_type, accessor in codec.response_mapper.items():
+            for method in (accessor.get_or_create_from_legacy_response,
+                           accessor.update):
+                mock_session_execute.reset_mock()
+                mock_session_commit.reset_mock()
+                method(_legacy_response,
+                       **{'question_id': 1, 'report_id': self.id})
+                self.assertEquals(mock_session_execute.call_count, 1)
+                self.assertEquals(mock_session_commit.call_count, 1)
+                statement = mock_session_execute.call_args[0][0]
+                self.assertIn(accessor.column, statement.parameters[0])
+        mock_session_query.assert_not_called()
+
+    def test_upsert_responses(
+            self, mock_session_query, mock_session_execute,
+            mock_session_commit):
+        '''Does upsert_responses() write responses of different types with a
+        single statement, keeping one row for each question and report?
+        '''
+        ids = {'question_id': 1, 'report_id': self.id}
+        rows = [codec.numeric_accessor.row_from_legacy_response(
+            {'numericResponse': '1'}, **ids),
+            codec.numeric_accessor.row_from_legacy_response(
+                {'numericResponse': '2'}, **ids),
+            codec.boolean_accessor.row_from_legacy_response(
+                {'answeredOptions': ['No']},
+                **{'question_id': 2, 'report_id': self.id})]
+        models.base.upsert_responses(rows)
+        self.assertEquals(mock_session_execute.call_count, 1)
+        statement = mock_session_execute.call_args[0][0]
+        self.assertListEqual(
+            [(row['question_id'], row['numeric_response'])
+             for row in statement.parameters], [(1, 1.0), (2, None)])
+        sql = _compile(statement)
+        self.assertIn('numeric_response = coalesce(', sql)
+        self.assertIn('boolean_response = coalesce(', sql)
+        self.assertIn('WHERE responses.type = excluded.type', sql)
+        self.assertNotIn('type = excluded.type,', sql)
+        models.base.upsert_responses(rows, overwrite=True)
+        statement = mock_session_execute.call_args[0][0]
+        self.assertEquals(statement.parameters[1]['numeric_response'], 2.0)
+        self.assertIsNone(statement.parameters[1]['boolean_response'])
+        sql = _compile(statement)
+        self.assertIn('type = excluded.type', sql)
+        self.assertIn('note_response = excluded.note_response', sql)
+        self.assertNotIn('WHERE', sql)
+        mock_session_commit.assert_called_with()
+
+
+@mock.patch.object(models.base, '_is_postgresql', new=(lambda: False))
 @mock.patch.object(models.base, '_action_and_commit')
 class TestResponseClassLegacyAccessor(unittest.TestCase):
 
@@ -213,3 +560,189 @@ class TestResponseClassLegacyAccessor(unittest.TestCase):
         self.LegacyInstance.delete(self.test_response)
         self.assertTrue(mock_get_instance.called)
         mock_action_commit.assert_not_called()
+
+    @mock.patch.object(models.base.ResponseClassLegacyAccessor, '_get_instance')
+    def test_get_or_create_does_not_exist(
+            self, mock_get_instance, mock_action_commit):
+        '''Does get_or_create_from_legacy_response() add a new response of
+        each type with its value columns already set, with a single commit?
+        '''
+        mock_get_instance.return_value = None
+        for accessor in codec.response_mapper.values():
+            mock_action_commit.reset_mock()
+            accessor.get_or_create_from_legacy_response(
+                _legacy_response, **{'question_id': 1, 'report_id': 'foo'})
+            mock_action_commit.assert_called_once_with(
+                mock.ANY, models.session.add)
+            response = mock_action_commit.call_args[0][0]
+            self.assertIsInstance(response, accessor.response_class)
+            self.assertEquals(getattr(response, accessor.column),
+                              accessor.accessor(_legacy_response))
+        self.assertEquals(response.question_id, 1)
+
+    def test_row_from_legacy_response(self, mock_action_commit):
+        '''Does the row_from_legacy_response() method return the column values
+        for the response, including the polymorphic type?
+        '''
+        row = self.LegacyInstance.row_from_legacy_response(
+            self.test_response, **{'question_id': 1, 'report_id': 'foo'})
+        self.assertDictEqual(row, {
+            'question_id': 1, 'report_id': 'foo', 'foo_response': 'bar',
+            'type': self.mock_response.__mapper__.polymorphic_identity})
+        mock_action_commit.assert_not_called()
+
+
+class TestIterReports(unittest.TestCase):
+
+    '''Queries made by iter_reports() against an in-memory SQLite database.
+    '''
+
+    _tables = [models.Report.__table__, models.AltitudeReport.__table__,
+               models.LocationReport.__table__,
+               models.PlacemarkReport.__table__]
+
+    def setUp(self):
+        # SQLite stores the Numeric columns as floats
+        warnings.simplefilter('ignore')
+        self.engine = models.base.engine
+        self.bind = models.base.session_maker.kw.get('bind')
+        models.base.bind_engine('sqlite://')
+        models.base.metadata.create_all(models.base.engine, self._tables)
+        for i in range(5):
+            report = models.Report(
+                id=uuid.uuid4(), steps=i,
+                created_at=datetime.datetime(2016, 1, 1 + i))
+            location = models.LocationReport(
+                id=uuid.uuid4(), report_id=report.id)
+            models.session.add_all([report, location, models.AltitudeReport(
+                id=uuid.uuid4(), report_id=report.id),
+                models.PlacemarkReport(
+                    id=uuid.uuid4(), location_report_id=location.id)])
+        models.session.commit()
+        models.session.expunge_all()
+
+    def tearDown(self):
+        warnings.resetwarnings()
+        models.session.remove()
+        models.base.engine = self.engine
+        models.session.configure(bind=self.bind)
+        delattr(self, 'engine')
+        delattr(self, 'bind')
+
+    def test_iter_reports(self):
+        '''Does iter_reports() yield the reports in the range in the order
+        they were created?
+        '''
+        reports = list(models.iter_reports(
+            datetime.datetime(2016, 1, 2), datetime.datetime(2016, 1, 5)))
+        self.assertListEqual([r.steps for r in reports], [1, 2, 3])
+
+    def test_iter_reports_include(self):
+        '''Does iter_reports() load the included children with one query per
+        child per batch, so that walking the reports takes no more queries?
+        '''
+        with queries.QueryCounter() as counter:
+            for report in models.iter_reports(
+                    include=['altitude', 'placemark'], batch_size=2):
+                self.assertEquals(len(report.altitude_report), 1)
+                self.assertEquals(
+                    len(report.location_report[0].placemark), 1)
+        # One query for the reports, and one for each of the altitude,
+        # location, and placemark reports in each of the three batches
+        self.assertEquals(counter.statements, 10)
+
+    def test_iter_reports_include_unknown(self):
+        '''Does iter_reports() refuse to include unknown children?
+        '''
+        self.assertRaises(ValueError, models.iter_reports, include=['foo'])
+
+
+@mock.patch.object(models.base, '_is_postgresql', new=(lambda: True))
+@mock.patch.object(models.session, 'commit')
+@mock.patch.object(models.session, 'execute')
+class TestRollups(unittest.TestCase):
+
+    def tearDown(self):
+        models.rollups.touched.clear()
+
+    def test_refresh_rollups(self, mock_session_execute, mock_session_commit):
+        '''Does refresh_rollups() replace the rollups for only the days given,
+        with one DELETE and INSERT ... SELECT per rollup table, and commit
+        once?
+        '''
+        days = [datetime.date(2016, 1, 3), datetime.date(2016, 1, 1)]
+        self.assertEquals(models.refresh_rollups(days + days[:1]), 2)
+        statements = [_compile(call[0][0])
+                      for call in mock_session_execute.call_args_list]
+        self.assertEquals(len(statements), 8)
+        self.assertIn('pg_advisory_xact_lock', statements[0])
+        for table, sql in zip(['daily_reports', 'daily_responses',
+                               'daily_answers'], statements[1:4]):
+            self.assertEquals(
+                sql, 'DELETE FROM {0} WHERE {0}.day = '
+                'ANY (CAST(%(param_1)s AS DATE[]))'.format(table))
+        for sql in statements[4:]:
+            self.assertTrue(sql.startswith('INSERT INTO daily_'))
+            self.assertIn('reports.created_at >= %(created_at_1)s', sql)
+            self.assertIn('GROUP BY CAST(reports.created_at AS DATE)', sql)
+        self.assertIn('unnest(coalesce(responses.multi_response',
+                      statements[7])
+        params = mock_session_execute.call_args[0][0].compile().params
+        self.assertEquals(params['created_at_1'], datetime.date(2016, 1, 1))
+        self.assertEquals(params['created_at_2'], datetime.date(2016, 1, 4))
+        mock_session_commit.assert_called_once_with()
+
+    def test_refresh_rollups_touched(
+            self, mock_session_execute, mock_session_commit):
+        '''Does refresh_rollups() refresh the days touched since the last
+        refresh, and do nothing if no days were touched?
+        '''
+        models.rollups.touch(datetime.datetime(2016, 1, 1, 23, 59))
+        models.rollups.touch(datetime.datetime(2016, 1, 1, 1))
+        models.rollups.touch(None)
+        self.assertEquals(models.refresh_rollups(), 1)
+        self.assertSetEqual(models.rollups.touched, set())
+        mock_session_execute.reset_mock()
+        self.assertEquals(models.refresh_rollups(), 0)
+        mock_session_execute.assert_not_called()
+
+    def test_refresh_range(self, mock_session_execute, mock_session_commit):
+        '''Does refresh_range() refresh every day from start up to, but not
+        including, end?
+        '''
+        with mock.patch.object(models.rollups, '_refresh') as mock_refresh:
+            self.assertEquals(models.refresh_range(
+                datetime.datetime(2016, 1, 30, 12),
+                datetime.datetime(2016, 2, 2)), 3)
+            mock_refresh.assert_called_once_with([
+                datetime.date(2016, 1, 30), datetime.date(2016, 1, 31),
+                datetime.date(2016, 2, 1)])
+
+    def test_rebuild_rollups(self, mock_session_execute, mock_session_commit):
+        '''Does rebuild_rollups() empty the rollup tables and recompute them
+        for every report?
+        '''
+        models.rollups.touch(datetime.datetime(2016, 1, 1))
+        models.rebuild_rollups()
+        statements = [_compile(call[0][0])
+                      for call in mock_session_execute.call_args_list]
+        self.assertListEqual(statements[1:4], [
+            'DELETE FROM daily_reports', 'DELETE FROM daily_responses',
+            'DELETE FROM daily_answers'])
+        for sql in statements[4:]:
+            self.assertNotIn('ANY', sql)
+        self.assertSetEqual(models.rollups.touched, set())
+
+    def test_refresh_rollups_not_postgresql(
+            self, mock_session_execute, mock_session_commit):
+        '''Does refresh_rollups() warn and leave the rollups alone on
+        databases other than PostgreSQL?
+        '''
+        with mock.patch.object(models.base, '_is_postgresql',
+                               new=(lambda: False)):
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter('always')
+                self.assertEquals(
+                    models.refresh_rollups([datetime.date(2016, 1, 1)]), 0)
+                self.assertEquals(len(w), 1)
+        mock_session_execute.assert_not_called()
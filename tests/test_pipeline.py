@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 
+import collections
+import copy
 import datetime
 import mock
 import random
+import threading
+import time
 import unittest
 import uuid
 import warnings
@@ -10,10 +14,135 @@ from dateutil.parser import parse
 from dateutil.tz import tzoffset
 from datums import models
 from datums import pipeline
-from datums.pipeline import mappers, codec
+from datums.pipeline import mappers, codec, transform
 from sqlalchemy.orm import query
 
 
+class TestBatches(unittest.TestCase):
+
+    def test_batches(self):
+        '''Does _batches() split an iterable into lists of at most size items,
+        or a single list if size is None?
+        '''
+        self.assertListEqual(
+            list(pipeline._batches(iter(range(5)), 2)), [[0, 1], [2, 3], [4]])
+        self.assertListEqual(
+            list(pipeline._batches(range(5), None)), [[0, 1, 2, 3, 4]])
+        self.assertListEqual(list(pipeline._batches([], 2)), [])
+
+
+class TestContentHash(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshots = [{'uniqueIdentifier': str(uuid.uuid4()),
+                           'steps': i, 'responses': []} for i in range(3)]
+
+    def tearDown(self):
+        delattr(self, 'snapshots')
+
+    def test_content_hash(self):
+        '''Does content_hash() depend on the contents of the snapshot, but not
+        on the order of its keys?
+        '''
+        snapshot = {'uniqueIdentifier': uuid.uuid4(), 'steps': 10,
+                    'audio': {'avg': -59.8, 'peak': -57}}
+        reordered = {'audio': {'peak': -57, 'avg': -59.8}, 'steps': 10,
+                     'uniqueIdentifier': snapshot['uniqueIdentifier']}
+        self.assertEquals(len(pipeline.content_hash(snapshot)), 40)
+        self.assertEquals(pipeline.content_hash(snapshot),
+                          pipeline.content_hash(reordered))
+        reordered['audio']['peak'] = -56
+        self.assertNotEqual(pipeline.content_hash(snapshot),
+                            pipeline.content_hash(reordered))
+
+    @mock.patch.object(models.session, 'query')
+    def test_changed_snapshots(self, mock_query):
+        '''Does changed_snapshots() yield only the new and changed snapshots,
+        with one query per batch, and count each kind?
+        '''
+        self.addCleanup(models.rollups.touched.clear)
+        unchanged, changed, new = self.snapshots
+        mock_query.return_value.filter.return_value = [
+            (uuid.UUID(unchanged['uniqueIdentifier']),
+             pipeline.content_hash(unchanged),
+             datetime.datetime(2016, 1, 23, 9)),
+            (uuid.UUID(changed['uniqueIdentifier']), 'foo',
+             datetime.datetime(2016, 1, 24, 9))]
+        counts = collections.Counter()
+        self.assertListEqual(list(pipeline.changed_snapshots(
+            self.snapshots, counts)), [changed, new])
+        self.assertEquals(mock_query.call_count, 1)
+        self.assertDictEqual(counts, {'unchanged': 1, 'changed': 1, 'new': 1})
+        self.assertSetEqual(models.rollups.touched,
+                            set([datetime.date(2016, 1, 24)]))
+
+    @mock.patch.object(models.session, 'query')
+    def test_touch_stored(self, mock_query):
+        '''Does touch_stored() yield every snapshot and mark the days their
+        reports were stored under, with one query per batch?
+        '''
+        self.addCleanup(models.rollups.touched.clear)
+        mock_query.return_value.filter.return_value = [
+            (datetime.datetime(2016, 1, 24, 9),)]
+        self.assertListEqual(list(pipeline.touch_stored(
+            self.snapshots, 2)), self.snapshots)
+        self.assertEquals(mock_query.call_count, 2)
+        self.assertSetEqual(models.rollups.touched,
+                            set([datetime.date(2016, 1, 24)]))
+
+
+@mock.patch.object(models.session, 'query')
+class TestKnownReports(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshots = [{'uniqueIdentifier': str(uuid.uuid4()),
+                           'responses': []} for _ in range(5)]
+        self.ids = [uuid.UUID(snapshot['uniqueIdentifier'])
+                    for snapshot in self.snapshots]
+
+    def tearDown(self):
+        delattr(self, 'snapshots')
+        delattr(self, 'ids')
+
+    def test_known_reports_prefetch(self, mock_query):
+        '''Does the prefetch() method on KnownReports objects only query for
+        the ids that aren't already known?
+        '''
+        known_reports = pipeline.KnownReports()
+        known_reports.add(self.ids[0])
+        mock_query.return_value.filter.return_value = [(self.ids[1],)]
+        known_reports.prefetch(self.ids[:3])
+        self.assertEquals(mock_query.call_count, 1)
+        self.assertListEqual([id_ in known_reports for id_ in self.ids[:3]],
+                             [True, True, False])
+        known_reports.prefetch(self.ids[:2])
+        self.assertEquals(mock_query.call_count, 1)
+
+    def test_known_reports_load(self, mock_query):
+        '''Does the load() method on KnownReports objects load every id at
+        once, so that prefetch() never queries?
+        '''
+        mock_query.return_value.yield_per.return_value = [(self.ids[0],)]
+        known_reports = pipeline.KnownReports()
+        known_reports.load()
+        known_reports.prefetch(self.ids)
+        self.assertEquals(mock_query.call_count, 1)
+        self.assertIn(self.ids[0], known_reports)
+        self.assertNotIn(self.ids[1], known_reports)
+
+    def test_new_snapshots(self, mock_query):
+        '''Does new_snapshots() yield only the snapshots whose reports don't
+        exist, with one query per batch, and skip repeated snapshots?
+        '''
+        mock_query.return_value.filter.return_value = [(self.ids[0],)]
+        counts = collections.Counter()
+        snapshots = self.snapshots + [self.snapshots[1]]
+        self.assertListEqual(list(pipeline.new_snapshots(
+            snapshots, counts, batch_size=3)), self.snapshots[1:])
+        self.assertEquals(mock_query.call_count, 2)
+        self.assertDictEqual(counts, {'existing': 2, 'new': 4})
+
+
 class TestQuestionPipeline(unittest.TestCase):
 
     def setUp(self):
@@ -41,21 +170,39 @@ class TestQuestionPipeline(unittest.TestCase):
         pipeline.QuestionPipeline(self.question).add()
         mock_get_create.assert_called_once_with(**self.question_dict)
 
+    @mock.patch.object(codec, 'question_cache')
+    @mock.patch.object(models.Question, 'get_or_create')
+    def test_question_pipeline_add_caches_question(
+            self, mock_get_create, mock_cache):
+        '''Does the add() method on QuestionPipeline objects add the question
+        to codec.question_cache?
+        '''
+        mock_get_create.return_value = models.Question(
+            id=1, type=5, prompt=self.question['prompt'])
+        pipeline.QuestionPipeline(self.question).add()
+        mock_cache.add.assert_called_once_with(1, 5, self.question['prompt'])
+
+    @mock.patch.object(codec, 'question_cache')
     @mock.patch.object(models.Question, 'update')
-    def test_question_pipeline_update(self, mock_update):
+    def test_question_pipeline_update(self, mock_update, mock_cache):
         '''Does the update() method on QuestionPipeline objects call
-        models.Question.update with the question_dict attribute?
+        models.Question.update with the question_dict attribute and invalidate
+        the cached question?
         '''
         pipeline.QuestionPipeline(self.question).update()
         mock_update.assert_called_once_with(**self.question_dict)
+        mock_cache.invalidate.assert_called_once_with(self.question['prompt'])
 
+    @mock.patch.object(codec, 'question_cache')
     @mock.patch.object(models.Question, 'delete')
-    def test_question_pipeline_delete(self, mock_delete):
+    def test_question_pipeline_delete(self, mock_delete, mock_cache):
         '''Does the delete() method on QuestionPipeline objects call
-        models.Question.delete with the question_dict attribute?
+        models.Question.delete with the question_dict attribute and invalidate
+        the cached question?
         '''
         pipeline.QuestionPipeline(self.question).delete()
         mock_delete.assert_called_once_with(**self.question_dict)
+        mock_cache.invalidate.assert_called_once_with(self.question['prompt'])
 
 
 @mock.patch.object(codec, 'get_response_accessor')
@@ -146,6 +293,18 @@ class TestReportPipeline(unittest.TestCase):
         self.assertTrue(hasattr(r, 'report'))
         self.assertDictEqual(r.report, self.report)
 
+    def test_report_pipeline_report_does_not_modify_report(self):
+        '''Does the _report() method on ReportPipeline objects leave the nested
+        levels of the report as they were, so that the content hash of the
+        snapshot is the same the next time it's added?
+        '''
+        report = copy.deepcopy(self.report)
+        content_hash = pipeline.content_hash(self.report)
+        pipeline.ReportPipeline(self.report)._report(
+            models.Report.get_or_create)
+        self.assertDictEqual(self.report, report)
+        self.assertEquals(pipeline.content_hash(self.report), content_hash)
+
     def test_report_pipeline_report_add(self):
         '''Does the _report() method on ReportPipeline objects return a
         dictionary of top-level report attributes mapped to the correct datums
@@ -184,12 +343,27 @@ class TestReportPipeline(unittest.TestCase):
                                  'floorsDescended', 'pressure',
                                  'reportUniqueIdentifier']))
 
+    def test_report_pipeline_report_add_altitude_same_uuid(self):
+        '''Is a nested AltitudeReport without a uniqueIdentifier given the same
+        id by _report() as by transform, so that mixing loaders doesn't add it
+        twice?
+        '''
+        self.report['uniqueIdentifier'] = str(self.report['uniqueIdentifier'])
+        self.report['altitude'] = {'floorsAscended': 0}
+        _, nested_level = pipeline.ReportPipeline(self.report)._report(
+            models.Report.get_or_create)
+        rows = transform.snapshot_rows(
+            dict(self.report, responses=[]), lambda prompt: None)
+        self.assertEquals(nested_level['altitude']['uniqueIdentifier'],
+                          rows['altitude_reports'][0]['id'])
+
     def test_report_pipeline_report_attr_not_supported(self):
         '''Does the _report() method on ReportPipeline objects generate a
         warning if there is an attribute in the report that is not yet
         supported (i.e., not yet in mappers._report_key_mapper)?
         '''
         r = {'foo': 'bar'}
+        mappers.unsupported_keys.clear()
         with warnings.catch_warnings(record=True) as w:
             warnings.simplefilter('always')
             pipeline.ReportPipeline(r)._report(models.Report.get_or_create)
@@ -318,6 +492,7 @@ class TestSnapshotPipeline(unittest.TestCase):
         self.assertDictEqual(s.report, self.report)
         self.assertListEqual(s.responses, self.responses)
 
+    @mock.patch.object(models.base, '_is_postgresql', new=(lambda: False))
     @mock.patch.object(codec, 'get_response_accessor')
     @mock.patch.object(pipeline.ResponsePipeline, 'add')
     @mock.patch.object(pipeline.ReportPipeline, 'add')
@@ -334,6 +509,7 @@ class TestSnapshotPipeline(unittest.TestCase):
         self.assertTrue(mock_report_add.call_count, 1)
         self.assertEquals(mock_response_add.call_count, 2)
 
+    @mock.patch.object(models.base, '_is_postgresql', new=(lambda: False))
     @mock.patch.object(codec, 'get_response_accessor')
     @mock.patch.object(pipeline.ResponsePipeline, 'update')
     @mock.patch.object(pipeline.ReportPipeline, 'update')
@@ -350,6 +526,76 @@ class TestSnapshotPipeline(unittest.TestCase):
         self.assertTrue(mock_report_update.call_count, 1)
         self.assertEquals(mock_response_update.call_count, 2)
 
+    @mock.patch.object(models.base, '_is_postgresql', new=(lambda: True))
+    @mock.patch.object(models.base, 'upsert_responses')
+    @mock.patch.object(codec, 'get_response_accessor')
+    @mock.patch.object(pipeline.ResponsePipeline, 'add')
+    @mock.patch.object(pipeline.ReportPipeline, 'add')
+    def test_snapshot_pipeline_add_postgresql(
+            self, mock_report_add, mock_response_add, mock_get_accessor,
+            mock_upsert_responses):
+        '''On PostgreSQL, does the add() method on SnapshotPipeline objects
+        write all of the snapshot's responses with a single call to
+        upsert_responses(), without overwriting existing responses?
+        '''
+        mock_get_accessor.return_value = (codec.numeric_accessor, self.ids)
+        pipeline.SnapshotPipeline(self.snapshot).add()
+        mock_response_add.assert_not_called()
+        rows = mock_upsert_responses.call_args[0][0]
+        self.assertEquals(len(rows), 2)
+        self.assertEquals(rows[0]['numeric_response'], 2.0)
+        self.assertEquals(
+            mock_upsert_responses.call_args[1], {'overwrite': False})
+
+    @mock.patch.object(models.base, '_is_postgresql', new=(lambda: True))
+    @mock.patch.object(models.base, 'upsert_responses')
+    @mock.patch.object(codec, 'get_response_accessor')
+    @mock.patch.object(pipeline.ReportPipeline, 'update')
+    def test_snapshot_pipeline_update_postgresql(
+            self, mock_report_update, mock_get_accessor,
+            mock_upsert_responses):
+        '''On PostgreSQL, does the update() method on SnapshotPipeline objects
+        overwrite all of the snapshot's responses with a single call to
+        upsert_responses()?
+        '''
+        mock_get_accessor.return_value = (codec.numeric_accessor, self.ids)
+        pipeline.SnapshotPipeline(self.snapshot).update()
+        self.assertEquals(mock_upsert_responses.call_count, 1)
+        self.assertEquals(
+            mock_upsert_responses.call_args[1], {'overwrite': True})
+
+    @mock.patch.object(models.session, 'rollback')
+    @mock.patch.object(models.session, 'commit')
+    @mock.patch.object(pipeline.SnapshotPipeline, '_write_responses')
+    @mock.patch.object(pipeline.ReportPipeline, 'add')
+    def test_snapshot_pipeline_add_atomic(
+            self, mock_report_add, mock_write_responses, mock_session_commit,
+            mock_session_rollback):
+        '''Does the add() method on SnapshotPipeline objects roll back the
+        report if its responses can't be written, so that a report is never
+        left without its responses?
+        '''
+        mock_write_responses.side_effect = ValueError
+        with self.assertRaises(ValueError):
+            pipeline.SnapshotPipeline(self.snapshot).add()
+        self.assertTrue(mock_report_add.called)
+        mock_session_commit.assert_not_called()
+        self.assertTrue(mock_session_rollback.called)
+
+    @mock.patch.object(pipeline, 'ReportPipeline')
+    def test_snapshot_pipeline_update_content_hash(self, mock_report):
+        '''Does the update() method on SnapshotPipeline objects store the
+        content hash of the raw snapshot with the report?
+        '''
+        s = pipeline.SnapshotPipeline({
+            'uniqueIdentifier': uuid.uuid4(), 'steps': 10, 'responses': []})
+        s.update()
+        self.assertEquals(s.content_hash, pipeline.content_hash(s.snapshot))
+        report = mock_report.call_args[0][0]
+        self.assertEquals(report['contentHash'], s.content_hash)
+        self.assertEquals(mappers.get_translator(mappers._report_key_mapper)(
+            report)['content_hash'], s.content_hash)
+
     @mock.patch.object(pipeline.ResponsePipeline, 'delete')
     @mock.patch.object(pipeline.ReportPipeline, 'delete')
     def test_snapshot_pipeline_delete(
@@ -361,3 +607,227 @@ class TestSnapshotPipeline(unittest.TestCase):
         pipeline.SnapshotPipeline(self.snapshot).delete()
         self.assertTrue(mock_report_delete.call_count, 1)
         mock_response_delete.assert_not_called()
+
+    @mock.patch.object(pipeline.ReportPipeline, 'delete')
+    def test_snapshot_pipeline_touches_day(self, mock_report_delete):
+        '''Does the delete() method on SnapshotPipeline objects mark the day
+        of the snapshot to have its rollups refreshed?
+        '''
+        self.addCleanup(models.rollups.touched.clear)
+        self.snapshot['date'] = '2016-01-02T23:59:30-0500'
+        pipeline.SnapshotPipeline(self.snapshot).delete()
+        self.assertSetEqual(models.rollups.touched,
+                            set([datetime.date(2016, 1, 2)]))
+
+
+@mock.patch.object(models.session, 'rollback')
+@mock.patch.object(models.session, 'commit')
+@mock.patch.object(models.session, 'begin_nested')
+class TestSnapshotBatchPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshots = [{'uniqueIdentifier': uuid.uuid4(), 'responses': []}
+                          for _ in range(5)]
+
+    def tearDown(self):
+        delattr(self, 'snapshots')
+
+    @mock.patch.object(pipeline.SnapshotPipeline, 'add')
+    def test_snapshot_batch_pipeline_add(
+            self, mock_add, mock_begin_nested, mock_commit, mock_rollback):
+        '''Does the add() method on SnapshotBatchPipeline objects add each
+        snapshot inside its own savepoint and commit once per batch?
+        '''
+        failed = pipeline.SnapshotBatchPipeline(self.snapshots, 2).add()
+        self.assertListEqual(failed, [])
+        self.assertEquals(mock_add.call_count, 5)
+        self.assertEquals(mock_begin_nested.call_count, 5)
+        # One commit per savepoint and one per batch
+        self.assertEquals(mock_commit.call_count, 5 + 3)
+        mock_rollback.assert_not_called()
+
+    @mock.patch.object(pipeline.SnapshotPipeline, 'update')
+    def test_snapshot_batch_pipeline_update_failure(
+            self, mock_update, mock_begin_nested, mock_commit, mock_rollback):
+        '''Does the update() method on SnapshotBatchPipeline objects roll back
+        and report a snapshot that fails, without rolling back the rest of the
+        batch?
+        '''
+        error = ValueError('foo')
+        mock_update.side_effect = [None, error, None, None, None]
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            failed = pipeline.SnapshotBatchPipeline(
+                self.snapshots, 500).update()
+            self.assertEquals(len(w), 1)
+        self.assertListEqual(
+            failed, [(self.snapshots[1]['uniqueIdentifier'], error)])
+        self.assertEquals(mock_rollback.call_count, 1)
+        self.assertEquals(mock_commit.call_count, 4 + 1)
+        self.assertFalse(models.session.info.get('unit_of_work'))
+
+    @mock.patch.object(pipeline.SnapshotPipeline, 'delete')
+    def test_snapshot_batch_pipeline_delete(
+            self, mock_delete, mock_begin_nested, mock_commit, mock_rollback):
+        '''Does the delete() method on SnapshotBatchPipeline objects delete
+        every snapshot?
+        '''
+        pipeline.SnapshotBatchPipeline(self.snapshots).delete()
+        self.assertEquals(mock_delete.call_count, 5)
+        self.assertEquals(mock_commit.call_count, 5 + 1)
+
+
+@mock.patch.object(models.session, 'remove')
+@mock.patch.object(models.session, 'rollback')
+class TestConcurrentSnapshotPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshots = [{'uniqueIdentifier': uuid.uuid4(), 'responses': []}
+                          for _ in range(20)]
+
+    def tearDown(self):
+        delattr(self, 'snapshots')
+
+    def test_concurrent_snapshot_pipeline_add(self, mock_rollback,
+                                              mock_remove):
+        '''Does the add() method on ConcurrentSnapshotPipeline objects add
+        every snapshot with at most concurrency snapshots in flight at once?
+        '''
+        lock = threading.Lock()
+        in_flight = collections.Counter()
+
+        def add(snapshot_pipeline):
+            with lock:
+                in_flight['now'] += 1
+                in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            time.sleep(0.01)
+            with lock:
+                in_flight['now'] -= 1
+                in_flight['added'] += 1
+        with mock.patch.object(pipeline.SnapshotPipeline, 'add', add):
+            failed = pipeline.ConcurrentSnapshotPipeline(
+                self.snapshots, 3).add()
+        self.assertListEqual(failed, [])
+        self.assertEquals(in_flight['added'], 20)
+        self.assertLessEqual(in_flight['max'], 3)
+        self.assertGreater(in_flight['max'], 1)
+        self.assertEquals(mock_remove.call_count, 20)
+        mock_rollback.assert_not_called()
+
+    @mock.patch.object(pipeline.SnapshotPipeline, 'update')
+    def test_concurrent_snapshot_pipeline_failed(
+            self, mock_update, mock_rollback, mock_remove):
+        '''Does the update() method on ConcurrentSnapshotPipeline objects roll
+        back and report the snapshots that failed without stopping the rest?
+        '''
+        e = ValueError('foo')
+        mock_update.side_effect = [None] * 5 + [e] + [None] * 14
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            failed = pipeline.ConcurrentSnapshotPipeline(
+                self.snapshots, 1).update()
+        self.assertListEqual(
+            failed, [(self.snapshots[5]['uniqueIdentifier'], e)])
+        self.assertEquals(mock_update.call_count, 20)
+        self.assertEquals(mock_rollback.call_count, 1)
+
+
+class TestBulkSnapshotPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshots = [{'uniqueIdentifier': str(uuid.uuid4()), 'audio': {
+            'uniqueIdentifier': str(uuid.uuid4()), 'avg': -59.8, 'peak': -57},
+            'battery': 0.89, 'responses': [
+                {'questionPrompt': 'How anxious are you?',
+                 'numericResponse': '1'},
+                {'questionPrompt': 'What is this?', 'numericResponse': '2'}]}
+            for _ in range(3)]
+        self.question_cache = codec.QuestionCache()
+        self.question_cache._loaded = True
+        self.question_cache.add(1, 5, 'How anxious are you?')
+
+    def tearDown(self):
+        delattr(self, 'snapshots')
+        delattr(self, 'question_cache')
+
+    def test_bulk_snapshot_pipeline_rows(self):
+        '''Does the _rows() method on BulkSnapshotPipeline objects return the
+        rows for each table, ignoring responses to unknown questions?
+        '''
+        with warnings.catch_warnings(record=True) as w, mock.patch.object(
+                codec, 'question_cache', self.question_cache):
+            warnings.simplefilter('always')
+            rows = pipeline.BulkSnapshotPipeline(self.snapshots)._rows(
+                self.snapshots)
+            self.assertEquals(len(w), 3)
+        self.assertEquals(len(rows[models.Report.__table__]), 3)
+        self.assertEquals(len(rows[models.AudioReport.__table__]), 3)
+        self.assertEquals(len(rows[models.WeatherReport.__table__]), 0)
+        self.assertDictEqual(rows[models.Response.__table__][0], {
+            'question_id': 1, 'type': 'numeric', 'numeric_response': 1.0,
+            'report_id': uuid.UUID(self.snapshots[0]['uniqueIdentifier'])})
+        self.assertEquals(rows[models.AudioReport.__table__][0]['report_id'],
+                          uuid.UUID(self.snapshots[0]['uniqueIdentifier']))
+
+    @mock.patch.object(models.session, 'commit')
+    @mock.patch.object(models.session, 'execute')
+    @mock.patch.object(pipeline.BulkSnapshotPipeline, '_new_rows')
+    def test_bulk_snapshot_pipeline_add(
+            self, mock_new_rows, mock_execute, mock_commit):
+        '''Does the add() method on BulkSnapshotPipeline objects issue one
+        INSERT per table with rows and commit once per batch?
+        '''
+        mock_new_rows.side_effect = (lambda table, rows: rows)
+        with warnings.catch_warnings(), mock.patch.object(
+                codec, 'question_cache', self.question_cache):
+            warnings.simplefilter('ignore')
+            pipeline.BulkSnapshotPipeline(self.snapshots, 2).add()
+        self.assertEquals(mock_execute.call_count, 6)
+        self.assertEquals(mock_commit.call_count, 2)
+
+    @mock.patch.object(models.Report, 'delete_many')
+    def test_bulk_snapshot_pipeline_delete(self, mock_delete_many):
+        '''Does the delete() method on BulkSnapshotPipeline objects delete the
+        reports for each batch with a single call to Report.delete_many(),
+        and mark the days the deleted reports were stored under?
+        '''
+        self.addCleanup(models.rollups.touched.clear)
+        mock_delete_many.side_effect = (lambda ids, returning: [
+            datetime.datetime(2016, 1, 24, 9)] * len(list(ids)))
+        self.assertEquals(
+            pipeline.BulkSnapshotPipeline(self.snapshots, 2).delete(), 3)
+        self.assertEquals(mock_delete_many.call_count, 2)
+        self.assertEquals(
+            mock_delete_many.call_args[1], {'returning': 'created_at'})
+        self.assertSetEqual(models.rollups.touched,
+                            set([datetime.date(2016, 1, 24)]))
+
+
+class TestCopySnapshotPipeline(unittest.TestCase):
+
+    def test_copy_value(self):
+        '''Does _copy_value() write values in COPY's text format, escaping
+        the delimiters and writing lists as array literals?
+        '''
+        self.assertEquals(pipeline._copy_value(None), '\\N')
+        self.assertEquals(pipeline._copy_value(True), 't')
+        self.assertEquals(pipeline._copy_value(0.1), '0.1')
+        self.assertEquals(pipeline._copy_value(
+            datetime.datetime(2016, 1, 24, 21, 40, 26)), '2016-01-24T21:40:26')
+        self.assertEquals(pipeline._copy_value(u'caf\xe9\ta\nb\\'),
+                          'caf\xc3\xa9\\ta\\nb\\\\')
+        self.assertEquals(pipeline._copy_value(
+            ['plain', 'two words', 'x"y', '', None]),
+            '{plain,"two words","x\\\\"y","",NULL}')
+
+    @mock.patch.object(models.base, '_is_postgresql', new=(lambda: False))
+    @mock.patch.object(pipeline.BulkSnapshotPipeline, 'add')
+    def test_copy_snapshot_pipeline_add_not_postgresql(self, mock_add):
+        '''Does the add() method on CopySnapshotPipeline objects fall back to
+        multi-row INSERTs on databases other than PostgreSQL?
+        '''
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            pipeline.CopySnapshotPipeline([]).add()
+            self.assertEquals(len(w), 1)
+        mock_add.assert_called_once_with()
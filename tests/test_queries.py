@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import uuid
+import warnings
+from datums import models
+from datums import pipeline
+from datums import queries
+from sqlalchemy import create_engine, text
+
+
+class TestQueryCounter(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        self.engine.execute('CREATE TABLE foo (id INTEGER)')
+
+    def tearDown(self):
+        del self.engine
+
+    def test_query_counter(self):
+        '''Does QueryCounter count the statements, SELECTs, and commits made
+        inside the block, and only inside the block?
+        '''
+        with queries.QueryCounter() as counter:
+            with self.engine.begin() as conn:
+                conn.execute(text('INSERT INTO foo (id) VALUES (1)'))
+                conn.execute(text('SELECT id FROM foo')).fetchall()
+        self.engine.execute(text('SELECT id FROM foo')).fetchall()
+        self.assertDictEqual(
+            dict(counter.as_dict(), seconds=0),
+            {'statements': 2, 'selects': 1, 'commits': 1, 'seconds': 0})
+        self.assertGreater(counter.seconds, 0)
+
+    def test_query_counter_threads(self):
+        '''Does each thread's QueryCounter count only the statements made by
+        that thread, while other threads are counting theirs?
+        '''
+        counts = {}
+
+        def run(n):
+            engine = create_engine('sqlite://')
+            with queries.QueryCounter() as counter:
+                for _ in range(n):
+                    engine.execute(text('SELECT 1')).fetchall()
+            counts[n] = counter.statements
+
+        threads = [threading.Thread(target=run, args=(n,))
+                   for n in range(20, 30)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertDictEqual(counts, dict((n, n) for n in range(20, 30)))
+
+
+class TestSnapshotPipelineQueries(unittest.TestCase):
+
+    '''Round trips for a snapshot with every kind of nested report, on the
+    ORM path that's used for databases other than PostgreSQL.
+    '''
+
+    _tables = [models.Report.__table__, models.AltitudeReport.__table__,
+               models.AudioReport.__table__, models.LocationReport.__table__,
+               models.PlacemarkReport.__table__,
+               models.WeatherReport.__table__]
+
+    def setUp(self):
+        self.engine = models.base.engine
+        self.bind = models.base.session_maker.kw.get('bind')
+        models.base.bind_engine('sqlite://')
+        models.base.metadata.create_all(models.base.engine, self._tables)
+        self.snapshot = {
+            'uniqueIdentifier': str(uuid.uuid4()), 'steps': 10,
+            'altitude': {'uniqueIdentifier': str(uuid.uuid4()),
+                         'floorsAscended': 1},
+            'audio': {'uniqueIdentifier': str(uuid.uuid4()), 'avg': -59.8},
+            'location': {'uniqueIdentifier': str(uuid.uuid4()),
+                         'latitude': 40.8, 'placemark': {
+                             'uniqueIdentifier': str(uuid.uuid4()),
+                             'country': 'United States'}},
+            'weather': {'uniqueIdentifier': str(uuid.uuid4()), 'uv': 1},
+            'responses': []}
+        warnings.simplefilter('ignore')
+
+    def tearDown(self):
+        warnings.resetwarnings()
+        queries.unwatch()
+        models.session.remove()
+        models.base.engine = self.engine
+        models.session.configure(bind=self.bind)
+        delattr(self, 'engine')
+        delattr(self, 'bind')
+        delattr(self, 'snapshot')
+
+    def test_add(self):
+        '''Does adding a snapshot take one SELECT and one INSERT for each of
+        its six reports, and a single commit?
+        '''
+        with queries.QueryCounter() as counter:
+            pipeline.SnapshotPipeline(self.snapshot).add()
+        self.assertEquals(counter.statements, 12)
+        self.assertEquals(counter.selects, 6)
+        self.assertEquals(counter.commits, 1)
+
+    def test_delete(self):
+        '''Does deleting a snapshot take one SELECT, one DELETE, and one
+        commit?
+        '''
+        pipeline.SnapshotPipeline(self.snapshot).add()
+        with queries.QueryCounter() as counter:
+            pipeline.SnapshotPipeline(self.snapshot).delete()
+        self.assertEquals(counter.selects, 1)
+        self.assertEquals(counter.commits, 1)
+
+    def test_watch(self):
+        '''Does watch() flag the operations that issue more than the allowed
+        number of statements?
+        '''
+        queries.watch(12)
+        pipeline.SnapshotPipeline(self.snapshot).add()
+        self.assertListEqual(queries.flagged, [])
+        queries.watch(5)
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            pipeline.SnapshotPipeline(self.snapshot).add()
+        operation, uid, counts = queries.flagged[0]
+        self.assertEquals(operation, 'add')
+        self.assertEquals(uid, self.snapshot['uniqueIdentifier'])
+        self.assertEquals(counts['statements'], 6)
+        self.assertTrue(any('more than the 5 allowed' in str(warning.message)
+                            for warning in w))
+        queries.unwatch()
+        self.assertListEqual(queries.flagged, [])
+
+    def test_watch_concurrent(self):
+        '''Does watch() count the operations of a ConcurrentSnapshotPipeline
+        without making any of its snapshots fail?
+        '''
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # Every thread has to see the same database
+        models.base.bind_engine('sqlite:///' + os.path.join(
+            directory, 'datums.db'))
+        models.base.metadata.create_all(models.base.engine, self._tables)
+        snapshots = [{'uniqueIdentifier': str(uuid.uuid4()), 'steps': 10,
+                      'audio': {'uniqueIdentifier': str(uuid.uuid4()),
+                                'avg': -59.8},
+                      'responses': []} for _ in range(50)]
+        queries.watch(3)
+        self.assertListEqual(pipeline.ConcurrentSnapshotPipeline(
+            iter(snapshots), 8).add(), [])
+        self.assertEquals(models.session.query(models.Report).count(), 50)
+        self.assertEquals(len(queries.flagged), 50)
+        self.assertTrue(all(counts['statements'] == 4
+                            for _, _, counts in queries.flagged))
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from datums.pipeline import reader
+
+
+class TestReader(unittest.TestCase):
+
+    def setUp(self):
+        self.export = {
+            'questions': [
+                {'questionType': 5, 'prompt': u'How anxious are you?'},
+                {'questionType': 0, 'prompt': u'Qué estás haciendo?'}],
+            'snapshots': [{'uniqueIdentifier': str(i), 'battery': 0.125 * i,
+                           'steps': 1000 * i, 'draft': False,
+                           'responses': [{'questionPrompt': 'foo',
+                                          'tokens': [{'text': u'café'}]}]}
+                          for i in range(5)]}
+        self.text = json.dumps(self.export, indent=2, ensure_ascii=False)
+
+    def tearDown(self):
+        del self.export
+        del self.text
+
+    def test_iter_array(self):
+        '''Does _iter_array() yield the same elements as json.load, regardless
+        of where the chunk boundaries fall?
+        '''
+        for chunk_size in (1, 3, 7, 64, 65536):
+            for key in ('questions', 'snapshots'):
+                self.assertListEqual(list(reader._iter_array(
+                    io.StringIO(self.text), key, chunk_size)),
+                    self.export[key])
+
+    def test_iter_array_skips_other_keys(self):
+        '''Does _iter_array() skip keys before and after the array, including
+        other arrays and scalars?
+        '''
+        text = u'{"version": 12, "other": [1, [2]], "snapshots": [1, 23], ' \
+            u'"questions": [{"a": [1, 2]}], "empty": []}'
+        self.assertListEqual(list(reader._iter_array(
+            io.StringIO(text), 'questions', 2)), [{'a': [1, 2]}])
+        self.assertListEqual(list(reader._iter_array(
+            io.StringIO(text), 'snapshots', 2)), [1, 23])
+        self.assertListEqual(list(reader._iter_array(
+            io.StringIO(text), 'empty', 2)), [])
+        self.assertListEqual(list(reader._iter_array(
+            io.StringIO(text), 'missing', 2)), [])
+        self.assertListEqual(list(reader._iter_array(
+            io.StringIO(u'{}'), 'snapshots')), [])
+
+    def test_iter_array_invalid(self):
+        '''Does _iter_array() raise a ValueError if the file is not a JSON
+        object?
+        '''
+        with self.assertRaises(ValueError):
+            list(reader._iter_array(io.StringIO(u'[1, 2]'), 'snapshots'))
+        with self.assertRaises(ValueError):
+            list(reader._iter_array(
+                io.StringIO(u'{"snapshots": [1, 2'), 'snapshots'))
+
+    def test_iter_questions_and_snapshots(self):
+        '''Do iter_questions() and iter_snapshots() read the questions and
+        snapshots from an export file?
+        '''
+        fd, path = tempfile.mkstemp(suffix='.json')
+        try:
+            with io.open(fd, 'w', encoding='utf-8') as f:
+                f.write(self.text)
+            self.assertListEqual(list(reader.iter_questions(path, 16)),
+                                 self.export['questions'])
+            self.assertListEqual(list(reader.iter_snapshots(path, 16)),
+                                 self.export['snapshots'])
+        finally:
+            os.remove(path)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import mock
+import threading
+import unittest
+import warnings
+from datums import stats
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self):
+        stats.reset()
+
+    def tearDown(self):
+        stats.disable()
+        stats.reset()
+
+    def test_timed_disabled(self):
+        '''Does a timed() function return its result without recording
+        anything while statistics are disabled?
+        '''
+        f = stats.timed('foo')(lambda x: x * 2)
+        self.assertEquals(f(2), 4)
+        self.assertDictEqual(stats.as_dict()['calls'], {})
+
+    def test_timed_enabled(self):
+        '''Does a timed() function add its time and calls to its stage while
+        statistics are enabled, even if it raises?
+        '''
+        @stats.timed('foo')
+        def f(x):
+            if x is None:
+                raise ValueError
+            return x
+        stats.enable()
+        f(1)
+        with self.assertRaises(ValueError):
+            f(None)
+        self.assertEquals(stats.as_dict()['calls'], {'foo': 2})
+        self.assertIn('foo', stats.as_dict()['seconds'])
+
+    def test_count(self):
+        '''Does count() only count while statistics are enabled?
+        '''
+        stats.count('snapshots')
+        stats.enable()
+        stats.count('snapshots', 3)
+        self.assertDictEqual(stats.as_dict()['counts'], {'snapshots': 3})
+
+    def test_warnings(self):
+        '''Are warnings counted while statistics are enabled, and still shown?
+        '''
+        stats.enable()
+        with mock.patch.object(stats, '_showwarning') as mock_showwarning:
+            warnings.showwarning('foo', UserWarning, 'bar.py', 1)
+            self.assertTrue(mock_showwarning.called)
+        stats.disable()
+        self.assertEquals(stats.as_dict()['counts'], {'warnings': 1})
+        self.assertIsNot(warnings.showwarning, stats._warning)
+
+    def test_threads(self):
+        '''Are the counts and calls from several threads at once all kept?
+        '''
+        f = stats.timed('foo')(lambda: stats.count('snapshots'))
+        stats.enable()
+
+        def run():
+            for _ in range(20000):
+                f()
+
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result = stats.as_dict()
+        self.assertEquals(result['counts'], {'snapshots': 160000})
+        self.assertEquals(result['calls'], {'foo': 160000})
+
+    def test_statements(self):
+        '''Are statements timed, and the rows they write counted per table,
+        only while statistics are enabled?
+        '''
+        engine = create_engine('sqlite://')
+        table = Table('foo', MetaData(), Column('id', Integer))
+        table.create(engine)
+        engine.execute(table.insert(), [{'id': 1}])
+        stats.enable()
+        engine.execute(table.insert(), [{'id': 2}, {'id': 3}])
+        engine.execute(table.select()).fetchall()
+        result = stats.as_dict()
+        self.assertDictEqual(result['rows'], {'foo': 2})
+        self.assertEquals(result['calls']['execute'], 2)
+        stats.disable()
+        engine.execute(table.insert(), [{'id': 4}])
+        self.assertDictEqual(stats.as_dict()['rows'], {'foo': 2})
+
+    def test_merge_and_reset(self):
+        '''Does merge() add the statistics from another process, and reset()
+        clear them?
+        '''
+        stats.enable()
+        stats.count('snapshots', 2)
+        stats.merge({'seconds': {'read': 1.5}, 'calls': {'read': 3},
+                     'counts': {'snapshots': 5}, 'rows': {'reports': 5},
+                     'elapsed': 10.0})
+        result = stats.as_dict()
+        self.assertDictEqual(result['counts'], {'snapshots': 7})
+        self.assertDictEqual(result['rows'], {'reports': 5})
+        self.assertEquals(result['seconds']['read'], 1.5)
+        self.assertLess(result['elapsed'], 10.0)
+        stats.reset()
+        self.assertDictEqual(stats.as_dict()['counts'], {})
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+import copy
+import json
+import os
+import tempfile
+import unittest
+import uuid
+import warnings
+from datums import stats
+from datums.pipeline import transform
+
+
+class TestTransform(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = {
+            'uniqueIdentifier': str(uuid.uuid4()), 'steps': 10,
+            'altitude': {'floorsAscended': 1},
+            'location': {'uniqueIdentifier': str(uuid.uuid4()),
+                         'latitude': 40.8, 'placemark': {
+                             'uniqueIdentifier': str(uuid.uuid4()),
+                             'country': 'United States'}},
+            'photoSet': {'photos': []},
+            'responses': [
+                {'questionPrompt': 'How anxious are you?',
+                 'numericResponse': '1'},
+                {'questionPrompt': 'What is this?', 'numericResponse': '2'}]}
+        self.question_type = {'How anxious are you?': 5}.get
+
+    def tearDown(self):
+        delattr(self, 'snapshot')
+        delattr(self, 'question_type')
+
+    def test_snapshot_rows(self):
+        '''Does snapshot_rows() return the rows for each table in load order,
+        with the parent ids set and responses to unknown questions ignored?
+        '''
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter('always')
+            rows = transform.snapshot_rows(self.snapshot, self.question_type)
+            self.assertEquals(len(w), 1)
+        self.assertListEqual(rows.keys(), transform.TABLES)
+        report_id = uuid.UUID(self.snapshot['uniqueIdentifier'])
+        self.assertDictEqual(rows['reports'][0], {
+            'id': report_id, 'steps': 10,
+            'content_hash': transform.content_hash(self.snapshot)})
+        self.assertEquals(rows['location_reports'][0]['report_id'], report_id)
+        self.assertEquals(
+            rows['placemark_reports'][0]['location_report_id'],
+            uuid.UUID(self.snapshot['location']['uniqueIdentifier']))
+        self.assertListEqual(rows['responses'], [{
+            'question_prompt': 'How anxious are you?', 'report_id': report_id,
+            'type': 'numeric', 'numeric_response': 1.0}])
+
+    def test_snapshot_rows_does_not_modify_snapshot(self):
+        '''Does snapshot_rows() leave the snapshot as it was?
+        '''
+        snapshot = copy.deepcopy(self.snapshot)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            transform.snapshot_rows(self.snapshot, self.question_type)
+        self.assertDictEqual(self.snapshot, snapshot)
+
+    def test_snapshot_rows_stats(self):
+        '''Does snapshot_rows() time the mapping of each snapshot's reports as
+        the map stage, once per snapshot?
+        '''
+        self.addCleanup(stats.reset)
+        self.addCleanup(stats.disable)
+        stats.enable()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            transform.rows([self.snapshot] * 2, self.question_type)
+        self.assertEquals(stats.as_dict()['calls'].get('map'), 2)
+
+    def test_snapshot_rows_altitude_no_uuid(self):
+        '''Is an altitude report without a uniqueIdentifier given the same id
+        every time its snapshot is transformed?
+        '''
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            ids = [transform.snapshot_rows(self.snapshot, self.question_type)[
+                'altitude_reports'][0]['id'] for _ in range(2)]
+        self.assertEquals(ids[0], ids[1])
+        self.assertNotEqual(ids[0], uuid.UUID(
+            self.snapshot['uniqueIdentifier']))
+
+    def test_iter_file_rows(self):
+        '''Does iter_file_rows() yield the rows for each batch of snapshots,
+        matching responses to the questions in the file?
+        '''
+        export = {'questions': [
+            {'questionType': 5, 'prompt': 'What is this?'}],
+            'snapshots': [self.snapshot] * 3}
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(export, f)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                batches = list(transform.iter_file_rows(path, 2))
+        finally:
+            os.remove(path)
+        self.assertListEqual([len(rows['reports']) for rows in batches],
+                             [2, 1])
+        self.assertListEqual(
+            [row['question_prompt'] for row in batches[0]['responses']],
+            ['What is this?', 'What is this?'])